@@ -1,12 +1,23 @@
 # agent_service/app.py
 import os
+import sys
+import asyncio
+import importlib
+import json
 import logging
-import uuid
+from typing import Optional
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from graph.agent_graph import llm_call
+from core.admission import limiter, AdmissionRejected
+from core.components import components
+from core import scheduler
+from core.shared_state import WORKERS, leases
+from core import tracing
+from core.metrics import registry
+from core.jobs import BatchJob, job_store, parse_items, BATCH_PARALLELISM
 # from slowapi import Limiter
 # from slowapi.util import get_remote_address
 
@@ -25,45 +36,229 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Heavy modules (google-adk, litellm, the agents, the vector store) are components: they are built
+# in the background after startup, or by the first request that needs them, so importing this
+# module stays cheap and the server is live immediately.
+def load_retriever():
+    from tools.retriever import get_retriever_service
+    return get_retriever_service()
+
+async def warm_models(model_client):
+    # Pool connections to Ollama and load the chat model before the first request
+    model_client.install_http_session()
+    model_client.model_pool.start_health_checks()
+    await model_client.warm_model()
+
+components.register("agents", lambda: importlib.import_module("graph.agent_graph"))
+components.register("model", lambda: importlib.import_module("graph.model_client"), warm=warm_models)
+# Open the vector store and load the embedding model before the first query needs it
+components.register("retriever", load_retriever, warm=lambda service: asyncio.to_thread(service.warm),
+                    required=False, retry=False)
+
+# Index the calendar (a large one is imported into SQLite) before the first meeting question
+components.register("calendar", lambda: importlib.import_module("tools.calendar_store").calendar_store,
+                    warm=lambda store: asyncio.to_thread(store.warm), required=False, retry=False)
+
+async def agent_graph():
+    return await components["agents"].aget()
+
+@app.on_event("startup")
+async def start_components():
+    components.start()
+
+@app.on_event("shutdown")
+async def close_clients():
+    await components.stop()
+    weather_providers = sys.modules.get("tools.weather_providers")
+    if weather_providers is not None:
+        await weather_providers.close_http_clients()
+    model_client = components.peek("model")
+    if model_client is not None:
+        await model_client.close_http_session()
+        await model_client.model_pool.stop_health_checks()
+
 # Request/Response Models
 class InputMessage(BaseModel):
     text: str
 
 class OutputMessage(BaseModel):
     reply: str
-
-user_sessions = {}  # In-memory storage for user sessions
+    usage: Optional[dict] = None  # tokens_in, tokens_out and prompt_estimate of the run
 
 def get_user_id(request: Request):
     # Simple way to identify a user (can be improved with authentication)
     return request.client.host
 
+def admission_error(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+
 @app.post("/chat", response_model=OutputMessage)
-def chat(input_msg: InputMessage, request: Request):
+async def chat(input_msg: InputMessage, request: Request):
     try:
         user_id = get_user_id(request)
-        if user_id not in user_sessions:
-            user_sessions[user_id] = str(uuid.uuid4())
-        session_id = user_sessions[user_id]
 
-        logging.info(f"Received message from user {user_id} (session {session_id}): {input_msg.text}")
-        reply = llm_call(content=input_msg.text, user_id=user_id, session_id=session_id)
-        return {"reply": reply}
+        logging.info(f"Received message from user {user_id}: {input_msg.text}")
+        agents = await agent_graph()
+        with tracing.trace("chat", user_id=user_id) as trace, \
+                scheduler.caller(user_id, "interactive", abandoned=request.is_disconnected):
+            async with limiter.slot():
+                reply = await agents.llm_call_async(content=input_msg.text, user_id=user_id)
+        # Model tokens this request cost, as reported by the model, plus the local prompt estimate
+        return {"reply": reply, "usage": trace.usage()}
+    except AdmissionRejected as e:
+        raise admission_error(e)
     except Exception as e:
         logging.exception("Chat processing failed.")
         raise HTTPException(status_code=500, detail="Unexpected server error.")
     
+def sse(message: dict) -> str:
+    return f"event: {message['type']}\ndata: {json.dumps(message, default=str)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(input_msg: InputMessage, request: Request):
+    user_id = get_user_id(request)
+
+    logging.info(f"Received streaming message from user {user_id}: {input_msg.text}")
+    try:
+        # Reject before the 200 response starts when the queue is already full
+        limiter.check()
+    except AdmissionRejected as e:
+        raise admission_error(e)
+
+    async def event_source():
+        try:
+            agents = await agent_graph()
+            with tracing.trace("chat_stream", user_id=user_id) as trace, \
+                    scheduler.caller(user_id, "interactive", abandoned=request.is_disconnected):
+                async with limiter.slot():
+                    async for message in agents.llm_stream(content=input_msg.text, user_id=user_id):
+                        if await request.is_disconnected():
+                            logging.info(f"Client {user_id} disconnected, stopping stream")
+                            break
+                        yield sse(message)
+                yield sse({"type": "usage", **trace.usage()})
+        except AdmissionRejected as e:
+            yield sse({"type": "error", "status": e.status_code, "detail": e.detail, "retry_after": e.retry_after})
+        except Exception:
+            logging.exception("Chat streaming failed.")
+            yield sse({"type": "error", "status": 500, "detail": "Unexpected server error."})
+        yield sse({"type": "done"})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/")
 def health():
+    # Liveness only; see /ready
     return {"status": "agent running"}
 
+@app.get("/ready")
+def ready():
+    status = components.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
 @app.get("/info")
 def info():
-    return {"status": "ok"}
+    # Reports on what is loaded without loading anything
+    details = {"status": "ok", "admission": limiter.stats(), "components": components.status()}
+    # Counters are per worker process; the pid tells which one answered
+    details["worker"] = {"pid": os.getpid(), "workers": WORKERS, "leases": leases.stats() if leases else None}
+    agents = components.peek("agents")
+    if agents is not None:
+        details.update(router=agents.router_stats.snapshot(), sessions=agents.session_manager.stats(),
+                       tools=agents.tool_memo.stats())
+    retriever = components.peek("retriever")
+    if retriever is not None:
+        details["retriever"] = retriever.stats()
+    model_client = components.peek("model")
+    if model_client is not None:
+        details["models"] = model_client.model_pool.stats()
+    return details
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    response_cache = (await agent_graph()).response_cache
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.stats()}
+
+@app.delete("/cache")
+async def clear_cache():
+    agents = await agent_graph()
+    if agents.response_cache is not None:
+        await agents.response_cache.clear()
+    agents.tool_memo.invalidate()
+    return {"status": "cleared"}
+
+async def read_batch_messages(request: Request):
+    """Batch messages come as a JSON body ({"messages": [...]} or a bare list) or as an uploaded JSONL file."""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None:
+            raise ValueError("Multipart batch requests need a 'file' field with JSONL content.")
+        lines = (await upload.read()).decode("utf-8").splitlines()
+        return [json.loads(line) for line in lines if line.strip()], form.get("parallelism")
+    body = await request.json()
+    if isinstance(body, dict):
+        return body.get("messages"), body.get("parallelism")
+    return body, None
+
+async def run_batch_item(job: BatchJob, text: str) -> str:
+    # Batch items wait for one of the batch run slots, without the interactive queue timeout
+    agents = await agent_graph()
+    # Model calls of batch items wait behind interactive ones, each job sharing as one user
+    with tracing.trace("batch", job_id=job.id), scheduler.caller(f"batch-{job.id}", "batch"):
+        async with limiter.slot(timeout=None, priority="batch"):
+            return await agents.llm_call_async(content=text, user_id=f"batch-{job.id}", ephemeral=True)
 
 @app.post("/runs/batch")
-def run_batch():
-    return {"status": "OK", "message": "Batch endpoint placeholder"}
+async def run_batch(request: Request, parallelism: int = None, stream: bool = True):
+    try:
+        messages, body_parallelism = await read_batch_messages(request)
+        items = parse_items(messages)
+        job = BatchJob(items, parallelism=int(parallelism or body_parallelism or BATCH_PARALLELISM))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch: {e}")
+
+    job.start(lambda text: run_batch_item(job, text))
+    job_store.add(job)
+    logging.info(f"Started batch {job.id} with {len(items)} messages (parallelism {job.parallelism})")
+
+    if not stream:
+        return job.snapshot()
+
+    async def result_lines():
+        yield json.dumps({"type": "job", "job_id": job.id, "total": len(items)}) + "\n"
+        async for result in job.follow():
+            yield json.dumps({"type": "result", **result}, default=str) + "\n"
+        summary = job.snapshot()
+        del summary["results"]
+        yield json.dumps({"type": "summary", **summary}) + "\n"
+
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson", headers={"X-Job-Id": job.id})
+
+@app.get("/runs/batch/{job_id}")
+def batch_status(job_id: str, offset: int = 0):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found.")
+    return job.snapshot(offset=offset)
+
+@app.delete("/runs/batch/{job_id}")
+def cancel_batch(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found.")
+    return {"job_id": job_id, "cancelled": job.cancel(), "status": job.status}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,188 @@
+# agent_service/benchmarks/fake_ollama.py
+"""Scripted stand-in for an Ollama server, so the full agent path can be benchmarked offline.
+
+Usage (from agent_service/):
+    python -m benchmarks.fake_ollama --port 11500 --ttft 0.05 --token-latency 0.01
+
+/api/chat answers the way the agents expect from a real model: the supervisor transfers to
+the sub-agent matching the question, a sub-agent calls its tool, and once a tool result is in
+the conversation the model writes a short answer. Replies are streamed token by token with the
+configured latencies; /api/embed returns deterministic hash-based vectors.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Configuration
+FAKE_TTFT = float(os.getenv("FAKE_TTFT", "0.05"))  # seconds before the first token (prompt processing)
+FAKE_TOKEN_LATENCY = float(os.getenv("FAKE_TOKEN_LATENCY", "0.01"))  # seconds per generated token
+FAKE_EMBED_LATENCY = float(os.getenv("FAKE_EMBED_LATENCY", "0.005"))
+FAKE_EMBED_DIM = int(os.getenv("FAKE_EMBED_DIM", "256"))
+
+INTENTS = [
+    ("weather_agent", "get_weather_report", re.compile(r"\b(weather|temperature|forecast|rain\w*|sunny|hot|cold)\b", re.I)),
+    ("calendar_agent", "check_calendar", re.compile(r"\b(meeting|meetings|calendar|schedule|appointment)s?\b", re.I)),
+    ("retriever_agent", "retrieve_information", re.compile(r".")),
+]
+CITY_PATTERN = re.compile(r"\bin ([A-Z][a-zA-Z]+(?: [A-Z][a-zA-Z]+)?)")
+CONTEXT_PREFIX = "For context:"
+
+app = FastAPI()
+stats = {"chat": 0, "embed": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def question_of(messages: list) -> str:
+    # Context lines ADK adds for other agents' turns are not the user's question
+    for message in reversed(messages):
+        content = message.get("content") or ""
+        if message.get("role") == "user" and content and not content.startswith(CONTEXT_PREFIX):
+            return content
+    return ""
+
+
+def tool_call(name: str, arguments: dict) -> dict:
+    return {"function": {"name": name, "arguments": arguments}}
+
+
+def script_reply(messages: list, tools: list) -> dict:
+    """The assistant message a cooperative model would produce for this conversation."""
+    tool_names = {tool.get("function", {}).get("name") for tool in tools or []}
+    last = messages[-1] if messages else {}
+    if last.get("role") == "tool":
+        result = last.get("content") or ""
+        return {"role": "assistant", "content": f"Here is what I found: {result[:200]}"}
+
+    question = question_of(messages)
+    agent, tool, _ = next(intent for intent in INTENTS if intent[2].search(question))
+    if tool in tool_names:
+        if tool == "get_weather_report":
+            city = CITY_PATTERN.search(question)
+            return {"role": "assistant", "content": "", "tool_calls": [tool_call(tool, {"city": city.group(1) if city else "London"})]}
+        if tool == "check_calendar":
+            return {"role": "assistant", "content": "", "tool_calls": [tool_call(tool, {})]}
+        return {"role": "assistant", "content": "", "tool_calls": [tool_call(tool, {"query": question, "k": 3})]}
+    if "transfer_to_agent" in tool_names:
+        return {"role": "assistant", "content": "", "tool_calls": [tool_call("transfer_to_agent", {"agent_name": agent})]}
+    return {"role": "assistant", "content": f"Summary: {question[:200] or 'done'}"}
+
+
+def final_chunk(model: str, prompt_tokens: int, completion_tokens: int, started: float) -> dict:
+    return {
+        "model": model,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "message": {"role": "assistant", "content": ""},
+        "done": True,
+        "done_reason": "stop",
+        "total_duration": int((time.monotonic() - started) * 1e9),
+        "prompt_eval_count": prompt_tokens,
+        "eval_count": completion_tokens,
+    }
+
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    body = await request.json()
+    started = time.monotonic()
+    model = body.get("model", "fake")
+    messages = body.get("messages", [])
+    reply = script_reply(messages, body.get("tools"))
+    prompt_tokens = sum(count_tokens(json.dumps(message)) for message in messages)
+    text = reply.get("content") or ""
+    words = re.findall(r"\S+\s*", text)
+    completion_tokens = max(1, len(words)) + 10 * len(reply.get("tool_calls", []))
+    stats["chat"] += 1
+    stats["prompt_tokens"] += prompt_tokens
+    stats["completion_tokens"] += completion_tokens
+
+    if not body.get("stream", True):
+        await asyncio.sleep(FAKE_TTFT + FAKE_TOKEN_LATENCY * completion_tokens)
+        return JSONResponse({**final_chunk(model, prompt_tokens, completion_tokens, started), "message": reply})
+
+    async def chunks():
+        await asyncio.sleep(FAKE_TTFT)
+        if reply.get("tool_calls"):
+            await asyncio.sleep(FAKE_TOKEN_LATENCY * completion_tokens)
+            yield json.dumps({"model": model, "message": reply, "done": False}) + "\n"
+        for word in words:
+            yield json.dumps({"model": model, "message": {"role": "assistant", "content": word}, "done": False}) + "\n"
+            await asyncio.sleep(FAKE_TOKEN_LATENCY)
+        yield json.dumps(final_chunk(model, prompt_tokens, completion_tokens, started)) + "\n"
+
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+
+def embed_text(text: str) -> list:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(FAKE_EMBED_DIM).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+@app.post("/api/embed")
+async def embed(request: Request):
+    body = await request.json()
+    inputs = body.get("input", [])
+    inputs = [inputs] if isinstance(inputs, str) else inputs
+    stats["embed"] += len(inputs)
+    await asyncio.sleep(FAKE_EMBED_LATENCY)
+    return {"model": body.get("model", "fake"), "embeddings": [embed_text(text) for text in inputs]}
+
+
+@app.post("/api/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    stats["embed"] += 1
+    await asyncio.sleep(FAKE_EMBED_LATENCY)
+    return {"embedding": embed_text(body.get("prompt", ""))}
+
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    body = await request.json()
+    # Without a prompt Ollama only loads the model
+    return {"model": body.get("model", "fake"), "response": "", "done": True}
+
+
+@app.get("/api/tags")
+async def tags():
+    model = os.getenv("MODEL", "fake")
+    return {"models": [{"name": model, "model": model}]}
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+@app.get("/")
+async def root():
+    return "Ollama is running"
+
+
+def main():
+    global FAKE_TTFT, FAKE_TOKEN_LATENCY
+    parser = argparse.ArgumentParser(description="Scripted fake Ollama server for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--ttft", type=float, default=FAKE_TTFT, help="Seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=FAKE_TOKEN_LATENCY, help="Seconds per generated token")
+    args = parser.parse_args()
+    FAKE_TTFT, FAKE_TOKEN_LATENCY = args.ttft, args.token_latency
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
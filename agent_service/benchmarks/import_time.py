@@ -0,0 +1,62 @@
+# agent_service/benchmarks/import_time.py
+"""Measures how long importing a module takes and checks it against a budget.
+
+Usage (from agent_service/):
+    python -m benchmarks.import_time --module app --budget-ms 1000
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter, prints the slowest
+imports by cumulative time and exits non-zero when the total exceeds the budget, so it can
+gate CI. The server becomes live as soon as `app` is imported, so this is its startup floor.
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+
+LINE_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure(module: str) -> dict:
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    imports = []
+    for line in completed.stderr.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append({"module": name, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000,
+                            "depth": (len(indent) - 1) // 2})
+    top_level = [entry for entry in imports if entry["depth"] == 0]
+    return {
+        "module": module,
+        "total_ms": round(sum(entry["cumulative_ms"] for entry in top_level if entry["module"] == module), 1),
+        "all_imports_ms": round(sum(entry["cumulative_ms"] for entry in top_level), 1),
+        "slowest": sorted((entry for entry in imports if entry["depth"] <= 2),
+                          key=lambda entry: entry["cumulative_ms"], reverse=True)[:15],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget check.")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--budget-ms", type=float, default=1000.0)
+    parser.add_argument("--json", action="store_true", help="Print the full result as JSON")
+    args = parser.parse_args()
+
+    result = measure(args.module)
+    result["budget_ms"] = args.budget_ms
+    result["within_budget"] = result["total_ms"] <= args.budget_ms
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"import {args.module}: {result['total_ms']:.0f} ms (budget {args.budget_ms:.0f} ms)")
+        for entry in result["slowest"]:
+            print(f"  {entry['cumulative_ms']:8.1f} ms  {'  ' * entry['depth']}{entry['module']}")
+    sys.exit(0 if result["within_budget"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# agent_service/benchmarks/loadgen.py
+"""Open-loop load generator for the agent service.
+
+Usage (from agent_service/):
+    python -m benchmarks.loadgen --url http://127.0.0.1:5000 --mode chat --rate 20 --duration 30 --concurrency 64
+
+Requests are started on a fixed Poisson schedule (`--rate` per second) regardless of how fast
+earlier ones finish, so queueing delay shows up in the latencies instead of silently lowering
+the offered load. `--concurrency` caps requests in flight; arrivals beyond the cap are counted as
+dropped. Without `--rate` the generator runs closed-loop with `--concurrency` workers.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import List, Optional
+
+import httpx
+
+DEFAULT_PROMPTS = [
+    "What is the weather in London?",
+    "Is it raining in Tokyo today?",
+    "Do I have any meetings today?",
+    "What does my calendar look like tomorrow?",
+    "How should I write a few-shot prompt?",
+    "What is the weather in Chennai and do I have meetings today?",
+]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: List[dict], elapsed: float, dropped: int = 0, items_per_request: int = 1) -> dict:
+    ok = [sample for sample in samples if sample["ok"]]
+    latencies = [sample["latency"] for sample in ok]
+    summary = {
+        "requests": len(samples),
+        "succeeded": len(ok),
+        "errors": len(samples) - len(ok),
+        "dropped": dropped,
+        "error_rate": round((len(samples) - len(ok)) / len(samples), 4) if samples else 0.0,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "items_per_second": round(len(ok) * items_per_request / elapsed, 3) if elapsed else 0.0,
+        "latency_seconds": {
+            "mean": round(sum(latencies) / len(latencies), 4) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else None,
+        },
+        "status_codes": {},
+    }
+    first_tokens = [sample["first_token"] for sample in ok if sample.get("first_token") is not None]
+    if first_tokens:
+        summary["first_token_seconds"] = {
+            "p50": percentile(first_tokens, 50),
+            "p95": percentile(first_tokens, 95),
+            "p99": percentile(first_tokens, 99),
+        }
+    for sample in samples:
+        code = str(sample.get("status"))
+        summary["status_codes"][code] = summary["status_codes"].get(code, 0) + 1
+    return summary
+
+
+async def send_chat(client: httpx.AsyncClient, prompt: str) -> dict:
+    response = await client.post("/chat", json={"text": prompt})
+    return {"status": response.status_code, "ok": response.status_code == 200}
+
+
+async def send_stream(client: httpx.AsyncClient, prompt: str) -> dict:
+    started = time.monotonic()
+    first_token = None
+    ok = False
+    async with client.stream("POST", "/chat/stream", json={"text": prompt}) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return {"status": response.status_code, "ok": False}
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+                if first_token is None and event in ("token", "final"):
+                    first_token = time.monotonic() - started
+                ok = ok or event == "final"
+                if event == "error":
+                    ok = False
+    return {"status": response.status_code, "ok": ok, "first_token": first_token}
+
+
+def make_send_batch(batch_size: int, prompts: List[str], rng: random.Random):
+    async def send_batch(client: httpx.AsyncClient, _prompt: str) -> dict:
+        messages = [rng.choice(prompts) for _ in range(batch_size)]
+        failed = 0
+        async with client.stream("POST", "/runs/batch", json={"messages": messages}) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return {"status": response.status_code, "ok": False}
+            async for line in response.aiter_lines():
+                if line.strip():
+                    message = json.loads(line)
+                    if message.get("type") == "result" and message.get("error"):
+                        failed += 1
+        return {"status": response.status_code, "ok": failed == 0, "failed_items": failed}
+    return send_batch
+
+
+async def run_load(url: str, send, prompts: List[str], rate: Optional[float], duration: float, concurrency: int,
+                   seed: int = 0, items_per_request: int = 1, timeout: float = 300.0) -> dict:
+    rng = random.Random(seed)
+    samples: List[dict] = []
+    in_flight = 0
+    dropped = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        async def one(prompt: str):
+            nonlocal in_flight
+            started = time.monotonic()
+            try:
+                sample = await send(client, prompt)
+            except Exception as e:
+                sample = {"status": type(e).__name__, "ok": False}
+            sample["latency"] = time.monotonic() - started
+            samples.append(sample)
+            in_flight -= 1
+
+        started = time.monotonic()
+        deadline = started + duration
+        if rate:
+            tasks = []
+            next_at = started
+            while next_at < deadline:
+                await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+                if in_flight >= concurrency:
+                    dropped += 1
+                else:
+                    in_flight += 1
+                    tasks.append(asyncio.create_task(one(rng.choice(prompts))))
+                next_at += rng.expovariate(rate)
+            await asyncio.gather(*tasks)
+        else:
+            async def worker():
+                nonlocal in_flight
+                while time.monotonic() < deadline:
+                    in_flight += 1
+                    await one(rng.choice(prompts))
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+    return summarize(samples, elapsed, dropped, items_per_request)
+
+
+def build_sender(mode: str, batch_size: int, prompts: List[str], seed: int):
+    if mode == "chat":
+        return send_chat
+    if mode == "stream":
+        return send_stream
+    if mode == "batch":
+        return make_send_batch(batch_size, prompts, random.Random(seed + 1))
+    raise ValueError(f"Unknown mode '{mode}'")
+
+
+async def run_scenario(url: str, mode: str, rate: Optional[float], duration: float, concurrency: int,
+                       batch_size: int = 10, prompts: List[str] = None, seed: int = 0) -> dict:
+    prompts = prompts or DEFAULT_PROMPTS
+    send = build_sender(mode, batch_size, prompts, seed)
+    result = await run_load(url, send, prompts, rate, duration, concurrency, seed,
+                            items_per_request=batch_size if mode == "batch" else 1)
+    return {
+        "mode": mode,
+        "rate": rate,
+        "duration": duration,
+        "concurrency": concurrency,
+        "batch_size": batch_size if mode == "batch" else None,
+        "seed": seed,
+        **result,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load generator for the agent service.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--mode", choices=["chat", "stream", "batch"], default="chat")
+    parser.add_argument("--rate", type=float, default=None, help="Arrivals per second (omit for closed loop)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load")
+    parser.add_argument("--concurrency", type=int, default=32, help="Maximum requests in flight")
+    parser.add_argument("--batch-size", type=int, default=10, help="Messages per batch in batch mode")
+    parser.add_argument("--prompts", help="File with one prompt per line (default: built-in mix)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON result here as well as to stdout")
+    args = parser.parse_args()
+
+    prompts = None
+    if args.prompts:
+        with open(args.prompts) as f:
+            prompts = [line.strip() for line in f if line.strip()]
+    result = asyncio.run(run_scenario(args.url, args.mode, args.rate, args.duration, args.concurrency,
+                                      args.batch_size, prompts, args.seed))
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
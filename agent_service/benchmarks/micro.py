@@ -0,0 +1,218 @@
+# agent_service/benchmarks/micro.py
+"""Micro-benchmarks for the tools, without the agents or a model.
+
+Usage (from agent_service/):
+    python -m benchmarks.micro --calendar-rows 200000 --chunks 20000 --output micro.json
+
+Covers calendar lookups (memory and SQLite index) over a synthetic calendar, weather reports
+(cold and cached, mock provider) and the hybrid search building blocks (BM25, RRF, MMR, packing)
+over a synthetic corpus, and the embedding cache (bulk lookups, disk footprint against the old
+one-JSON-file-per-vector layout). The real retriever is timed too when a persisted corpus exists.
+"""
+import argparse
+import asyncio
+import csv
+import datetime
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Callable, List
+
+import numpy as np
+
+WORDS = ("agent prompt model token context weather calendar meeting retrieval vector index query answer "
+         "latency cache batch stream router session tool chunk embedding search rank fusion diversity").split()
+
+
+def timed(fn: Callable, repeat: int) -> dict:
+    """Wall time per call over `repeat` calls, in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "calls": repeat,
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p50_ms": round(samples[len(samples) // 2], 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "max_ms": round(samples[-1], 4),
+    }
+
+
+def write_calendar(path: str, rows: int, rng: random.Random):
+    start = datetime.date(2025, 1, 1)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["date", "meeting", "user"])
+        for index in range(rows):
+            day = start + datetime.timedelta(days=rng.randrange(730))
+            writer.writerow([day.isoformat(), f"Meeting {index} at {rng.randrange(8, 18)}:00", f"user{rng.randrange(100)}"])
+
+
+def bench_calendar(rows: int, repeat: int, rng: random.Random) -> dict:
+    from tools.calendar_store import CalendarStore
+    results = {"rows": rows}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "calendar.csv")
+        write_calendar(path, rows, rng)
+        for backend in ("memory", "sqlite"):
+            store = CalendarStore(path, backend=backend)
+            started = time.perf_counter()
+            store.lookup("2025-01-01", "2025-01-01")
+            load_ms = (time.perf_counter() - started) * 1000
+            days = [(datetime.date(2025, 1, 1) + datetime.timedelta(days=rng.randrange(730))).isoformat() for _ in range(repeat)]
+            day_iter = iter(days * 3)
+
+            def day(user=None):
+                date = next(day_iter)
+                return store.lookup(date, date, user=user)
+
+            def week():
+                date = next(day_iter)
+                return store.lookup(date, (datetime.date.fromisoformat(date) + datetime.timedelta(days=6)).isoformat())
+
+            results[backend] = {
+                "load_ms": round(load_ms, 2),
+                "day": timed(day, repeat),
+                "day_for_user": timed(lambda: day("user7"), repeat),
+                "week": timed(week, repeat),
+            }
+    return results
+
+
+def bench_weather(repeat: int) -> dict:
+    from tools import weather_providers
+    from tools.weather_tool import get_weather_report
+    cities = list(weather_providers.MOCK_WEATHER_CELSIUS)
+
+    async def run(count: int):
+        for index in range(count):
+            await get_weather_report(cities[index % len(cities)])
+
+    async def concurrent(count: int):
+        await asyncio.gather(*(get_weather_report("London") for _ in range(count)))
+
+    # Each measurement is a whole group of reports, run in one event loop
+    weather_providers.weather_cache._values.clear()
+    results = {"cold_all_cities": timed(lambda: asyncio.run(run(len(cities))), 1)}
+    results["cached_100_sequential"] = timed(lambda: asyncio.run(run(100)), max(1, repeat // 10))
+    results["cached_100_concurrent"] = timed(lambda: asyncio.run(concurrent(100)), max(1, repeat // 10))
+    results["cache"] = weather_providers.weather_cache.stats()
+    return results
+
+
+def synthetic_corpus(chunks: int, rng: random.Random) -> List[str]:
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120))) for _ in range(chunks)]
+
+
+def bench_hybrid_search(chunks: int, repeat: int, rng: random.Random) -> dict:
+    from tools import hybrid_search
+    documents = synthetic_corpus(chunks, rng)
+    chunk_ids = [f"chunk-{index}" for index in range(chunks)]
+
+    started = time.perf_counter()
+    index = hybrid_search.BM25Index.build(chunk_ids, documents)
+    build_ms = (time.perf_counter() - started) * 1000
+    queries = [" ".join(rng.sample(WORDS, 4)) for _ in range(repeat)]
+    query_iter = iter(queries * 2)
+
+    np_rng = np.random.default_rng(0)
+    vectors = {chunk_id: np_rng.standard_normal(768).astype(np.float32) for chunk_id in chunk_ids[:100]}
+    query_vector = np_rng.standard_normal(768).astype(np.float32)
+    rankings = [chunk_ids[:12], list(reversed(chunk_ids[:12]))]
+    packed = [{"content": documents[i]} for i in range(10)]
+    return {
+        "chunks": chunks,
+        "bm25_build_ms": round(build_ms, 2),
+        "bm25_search": timed(lambda: index.search(next(query_iter), 12), repeat),
+        "rrf": timed(lambda: hybrid_search.reciprocal_rank_fusion(rankings), repeat),
+        "mmr": timed(lambda: hybrid_search.mmr(query_vector, list(vectors)[:12], vectors, 3), repeat),
+        "pack": timed(lambda: hybrid_search.pack(packed, 600), repeat),
+    }
+
+
+def bench_embedding_cache(rows: int, dim: int, repeat: int) -> dict:
+    from tools.embedding_cache import EmbeddingCache, text_keys
+    np_rng = np.random.default_rng(0)
+    texts = [f"chunk {index}" for index in range(rows)]
+    vectors = np_rng.standard_normal((rows, dim)).astype(np.float32)
+    results = {"rows": rows, "dim": dim}
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache("bench", directory=tmp)
+        started = time.perf_counter()
+        cache.put_many(texts, vectors)
+        results["put_many_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        keys = text_keys(texts)
+        batch = texts[:64]
+        results["hash_all_ms"] = round(timed(lambda: text_keys(texts), 3)["p50_ms"], 2)
+        results["index_lookup_all"] = timed(lambda: cache.rows_of(keys), 10)
+        results["get_keys_all"] = timed(lambda: cache.get_keys(keys), 5)
+        results["get_many_64"] = timed(lambda: cache.get_many(batch), repeat)
+        results["bytes"] = cache.stats()["bytes"]
+        # What LocalFileStore held: a JSON list per vector, each in its own file (4 KiB blocks)
+        json_bytes = len(json.dumps(vectors[0].tolist()))
+        results["file_store_bytes"] = rows * (json_bytes + 4095) // 4096 * 4096
+    return results
+
+
+def bench_retriever(repeat: int) -> dict:
+    from tools.retriever import PERSIST_DIR, get_retriever_service, is_chroma_db_initialized
+    if not is_chroma_db_initialized(PERSIST_DIR):
+        return {"skipped": f"no persisted corpus in {PERSIST_DIR}"}
+    service = get_retriever_service()
+    started = time.perf_counter()
+    service.warm()
+    warm_ms = (time.perf_counter() - started) * 1000
+    counter = iter(range(repeat * 2))
+    return {
+        "warm_ms": round(warm_ms, 2),
+        "uncached": timed(lambda: service.retrieve(f"how to write prompts variant {next(counter)}"), min(repeat, 20)),
+        "cached": timed(lambda: service.retrieve("how to write prompts variant 0"), repeat),
+    }
+
+
+def run_all(calendar_rows: int = 100000, chunks: int = 10000, repeat: int = 200, seed: int = 0,
+            include_retriever: bool = True, embeddings: int = 100000, embedding_dim: int = 768) -> dict:
+    rng = random.Random(seed)
+    results = {
+        "calendar": bench_calendar(calendar_rows, repeat, rng),
+        "weather": bench_weather(repeat),
+        "hybrid_search": bench_hybrid_search(chunks, repeat, rng),
+        "embedding_cache": bench_embedding_cache(embeddings, embedding_dim, repeat),
+    }
+    if include_retriever:
+        try:
+            results["retriever"] = bench_retriever(repeat)
+        except Exception as e:
+            results["retriever"] = {"skipped": str(e)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the agent tools.")
+    parser.add_argument("--calendar-rows", type=int, default=100000)
+    parser.add_argument("--chunks", type=int, default=10000, help="Synthetic corpus size for BM25")
+    parser.add_argument("--repeat", type=int, default=200, help="Calls per measurement")
+    parser.add_argument("--embeddings", type=int, default=100000, help="Cached vectors for the embedding cache benchmark")
+    parser.add_argument("--embedding-dim", type=int, default=768)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-retriever", action="store_true", help="Skip the persisted-corpus retriever benchmark")
+    parser.add_argument("--output", help="Write the JSON result here as well as to stdout")
+    args = parser.parse_args()
+
+    result = run_all(args.calendar_rows, args.chunks, args.repeat, args.seed, not args.no_retriever,
+                     args.embeddings, args.embedding_dim)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
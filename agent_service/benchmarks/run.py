@@ -0,0 +1,162 @@
+# agent_service/benchmarks/run.py
+"""Runs the whole benchmark suite offline and writes one JSON result file.
+
+Usage (from agent_service/):
+    python -m benchmarks.run --duration 20 --rate 10 --concurrency 32 --output-dir benchmarks/results
+
+Starts the fake Ollama server and the agent service (uvicorn, pointed at the fake server, with
+the response cache off so every request reaches the agents), then runs the load scenarios for
+/chat, /chat/stream and /runs/batch, and the tool micro-benchmarks. Compare result files across
+commits to see whether a change helps or hurts.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import loadgen, micro
+
+AGENT_SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_MODEL = "fake-llm"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url: str, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f}s")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=AGENT_SERVICE_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def service_env(ollama_url: str, workdir: str, overrides: dict) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "BASE_URL": ollama_url,
+        "MODEL": FAKE_MODEL,
+        "OLLAMA_ENDPOINTS": f"{ollama_url}={FAKE_MODEL}",
+        "CACHE_ENABLED": "false",
+        # The backend follows WORKERS as in production (SQLite when shared); its file lives with the run
+        "SESSION_DB_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'sessions.db')}",
+        "CACHE_DB_PATH": os.path.join(workdir, "response_cache.db"),
+        "SHARED_STATE_DB": os.path.join(workdir, "shared_state.db"),
+        "PYTHONUNBUFFERED": "1",
+        # Offline: LiteLLM would otherwise fetch its model price map at import
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+    })
+    env.update(overrides)
+    return env
+
+
+def start(args: list, env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(args, cwd=AGENT_SERVICE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def stop(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite for the agent service.")
+    parser.add_argument("--modes", default="chat,stream,batch", help="Load scenarios to run")
+    parser.add_argument("--rate", type=float, default=10.0, help="Arrivals per second for chat and stream")
+    parser.add_argument("--batch-rate", type=float, default=0.5, help="Batches per second")
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per scenario")
+    parser.add_argument("--concurrency", type=int, default=32, help="Maximum requests in flight")
+    parser.add_argument("--ttft", type=float, default=0.05, help="Fake model seconds to first token")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Fake model seconds per token")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--workers", type=int, default=1, help="Service worker processes (shared-state mode above 1)")
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE passed to the agent service")
+    parser.add_argument("--output-dir", default=os.path.join("benchmarks", "results"))
+    args = parser.parse_args()
+
+    overrides = {"WORKERS": str(args.workers), **dict(item.split("=", 1) for item in args.env)}
+    ollama_port, service_port = free_port(), free_port()
+    ollama_url = f"http://127.0.0.1:{ollama_port}"
+    service_url = f"http://127.0.0.1:{service_port}"
+
+    result = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {**vars(args), "service_env": overrides},
+        "scenarios": [],
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = service_env(ollama_url, workdir, overrides)
+        fake = start([sys.executable, "-m", "benchmarks.fake_ollama", "--port", str(ollama_port), "--ttft", str(args.ttft),
+                      "--token-latency", str(args.token_latency)], env, os.path.join(workdir, "fake_ollama.log"))
+        service = None
+        try:
+            wait_ready(ollama_url)
+            service = start([sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(service_port),
+                             "--workers", str(args.workers), "--log-level", "warning"], env, os.path.join(workdir, "service.log"))
+            # /ready turns 200 once the agents are imported and the model is warm on the fake server
+            wait_ready(f"{service_url}/ready")
+            for mode in args.modes.split(","):
+                rate = args.batch_rate if mode == "batch" else args.rate
+                print(f"[bench] {mode}: {rate}/s for {args.duration:.0f}s", file=sys.stderr)
+                result["scenarios"].append(asyncio.run(loadgen.run_scenario(
+                    service_url, mode, rate, args.duration, args.concurrency, args.batch_size, seed=args.seed)))
+            result["service_metrics"] = httpx.get(f"{service_url}/metrics", timeout=10).text
+            result["fake_ollama"] = httpx.get(f"{ollama_url}/stats", timeout=10).json()
+        except Exception:
+            with open(os.path.join(workdir, "service.log")) as f:
+                sys.stderr.write(f.read()[-4000:])
+            raise
+        finally:
+            if service is not None:
+                stop(service)
+            stop(fake)
+
+    if not args.skip_micro:
+        print("[bench] micro-benchmarks", file=sys.stderr)
+        result["micro"] = micro.run_all(seed=args.seed)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps({scenario["mode"]: {"p50": scenario["latency_seconds"]["p50"], "p99": scenario["latency_seconds"]["p99"],
+                                         "rps": scenario["throughput_rps"], "error_rate": scenario["error_rate"]}
+                      for scenario in result["scenarios"]}, indent=2))
+    print(f"[bench] results written to {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# agent_service/core/admission.py
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from core.metrics import registry
+from core.tracing import span
+
+logging.basicConfig(level=logging.INFO)
+
+# Configuration
+MAX_IN_FLIGHT_RUNS = int(os.getenv("MAX_IN_FLIGHT_RUNS", "8"))
+MAX_QUEUED_RUNS = int(os.getenv("MAX_QUEUED_RUNS", "1000"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("QUEUE_TIMEOUT_SECONDS", "60"))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "5"))
+# Run slots batch items may hold at once; the rest stay free for interactive requests
+MAX_BATCH_RUNS = int(os.getenv("MAX_BATCH_RUNS", str(max(1, MAX_IN_FLIGHT_RUNS // 2))))
+
+_DEFAULT_TIMEOUT = object()
+
+
+class AdmissionRejected(Exception):
+    """Raised when a run cannot be admitted; carries the HTTP status to return."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int = RETRY_AFTER_SECONDS):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """Caps in-flight agent runs and bounds the number of callers waiting for a slot.
+
+    Waiting callers are parked on an asyncio semaphore, so an idle waiter costs a
+    coroutine rather than a threadpool worker. When the wait queue is full the caller
+    is rejected immediately (429); when it waits longer than `queue_timeout` it is
+    rejected as overloaded (503).
+
+    Batch runs first pass a smaller gate of `max_batch` slots, so however many batch items
+    are queued, the remaining slots (and the front of the run queue) stay open for
+    interactive requests.
+    """
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT_RUNS, max_queued: int = MAX_QUEUED_RUNS,
+                 queue_timeout: float = QUEUE_TIMEOUT_SECONDS, max_batch: int = MAX_BATCH_RUNS):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.max_batch = max(1, min(max_batch, max_in_flight))
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._batch = asyncio.Semaphore(self.max_batch)
+        self.in_flight = 0
+        self.waiting = 0
+        self.batch_in_flight = 0
+        self.batch_waiting = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def check(self):
+        """Raise 429 right away if a new run would find both the slots and the queue full."""
+        if self._semaphore.locked() and self.waiting >= self.max_queued:
+            self.rejected += 1
+            logging.warning(f"[admission] Queue full ({self.waiting} waiting), rejecting run")
+            raise AdmissionRejected(429, "Too many queued requests, retry later.")
+
+    @asynccontextmanager
+    async def slot(self, timeout=_DEFAULT_TIMEOUT, priority: str = "interactive"):
+        """Holds one run slot for the duration of the block; `timeout=None` waits indefinitely.
+
+        `priority="batch"` runs wait for one of the `max_batch` batch slots before they queue for a run slot.
+        """
+        if timeout is _DEFAULT_TIMEOUT:
+            timeout = self.queue_timeout
+        if priority != "batch":
+            async with self._run_slot(timeout):
+                yield
+            return
+
+        self.batch_waiting += 1
+        try:
+            await asyncio.wait_for(self._batch.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise AdmissionRejected(503, "Agent service is overloaded, retry later.")
+        finally:
+            self.batch_waiting -= 1
+        self.batch_in_flight += 1
+        try:
+            async with self._run_slot(timeout):
+                yield
+        finally:
+            self.batch_in_flight -= 1
+            self._batch.release()
+
+    @asynccontextmanager
+    async def _run_slot(self, timeout):
+        if not self._semaphore.locked():
+            # A slot is free, acquire() returns without suspending
+            await self._semaphore.acquire()
+        else:
+            self.check()
+            self.waiting += 1
+            try:
+                with span("queue"):
+                    await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                logging.warning(f"[admission] Run waited more than {timeout}s for a slot")
+                raise AdmissionRejected(503, "Agent service is overloaded, retry later.")
+            finally:
+                self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_in_flight": self.max_in_flight,
+            "max_queued": self.max_queued,
+            "batch_in_flight": self.batch_in_flight,
+            "batch_waiting": self.batch_waiting,
+            "max_batch": self.max_batch,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+# Shared limiter for every endpoint that drives the runner
+limiter = AdmissionLimiter()
+
+registry.gauge("agent_admission_in_flight", "Runs holding an admission slot", source=lambda: {(): limiter.in_flight})
+registry.gauge("agent_admission_waiting", "Runs waiting for an admission slot", source=lambda: {(): limiter.waiting})
+registry.gauge("agent_admission_batch_waiting", "Batch runs waiting for a batch slot",
+               source=lambda: {(): limiter.batch_waiting})
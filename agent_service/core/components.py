@@ -0,0 +1,134 @@
+# agent_service/core/components.py
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logging.basicConfig(level=logging.INFO)
+
+# Configuration
+WARM_RETRY_SECONDS = float(os.getenv("WARM_RETRY_SECONDS", "10"))  # retry interval for components that failed to warm
+
+
+class Component:
+    """A lazily built piece of the service (module, client, index) and its warm-up state."""
+
+    def __init__(self, name: str, load: Callable[[], Any], warm: Callable[[Any], Awaitable] = None,
+                 required: bool = True, retry: bool = True):
+        self.name = name
+        self.load = load
+        self.warm = warm
+        self.required = required
+        self.retry = retry
+        self.value = None
+        self.state = "cold"  # cold -> loading -> loaded -> warming -> ready, or failed
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warm_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.value is not None
+
+    def get(self) -> Any:
+        """Builds the component on first use; concurrent first callers wait for the same build."""
+        if self.value is not None:
+            return self.value
+        with self._lock:
+            if self.value is None:
+                self.state = "loading"
+                started = time.monotonic()
+                try:
+                    value = self.load()
+                except Exception as e:
+                    self.state, self.error = "failed", str(e)
+                    raise
+                self.load_seconds = round(time.monotonic() - started, 3)
+                self.value = value
+                if self.state == "loading":
+                    self.state = "loaded" if self.warm else "ready"
+                logging.info(f"[components] Loaded {self.name} in {self.load_seconds}s")
+        return self.value
+
+    async def aget(self) -> Any:
+        # Loading imports heavy modules, keep it off the event loop
+        if self.value is not None:
+            return self.value
+        return await asyncio.to_thread(self.get)
+
+    async def start(self):
+        """Loads and warms the component, retrying failed warm-ups until they succeed."""
+        while True:
+            try:
+                value = await self.aget()
+                if self.warm is not None:
+                    self.state = "warming"
+                    started = time.monotonic()
+                    await self.warm(value)
+                    self.warm_seconds = round(time.monotonic() - started, 3)
+                self.state, self.error = "ready", None
+                logging.info(f"[components] {self.name} is ready")
+                return
+            except Exception as e:
+                self.state, self.error = "failed", str(e)
+                logging.warning(f"[components] {self.name} failed to start: {e}")
+                if not self.retry:
+                    return
+            await asyncio.sleep(WARM_RETRY_SECONDS)
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "required": self.required,
+            "load_seconds": self.load_seconds,
+            "warm_seconds": self.warm_seconds,
+            "error": self.error,
+        }
+
+
+class ComponentRegistry:
+    """Named components, built on first use or warmed in the background after startup.
+
+    Startup only schedules the warm-up tasks, so the server is live right away; `ready` turns
+    true once every required component is warm.
+    """
+
+    def __init__(self):
+        self.components: Dict[str, Component] = {}
+        self._tasks = []
+
+    def register(self, name: str, load: Callable[[], Any], warm: Callable[[Any], Awaitable] = None,
+                 required: bool = True, retry: bool = True) -> Component:
+        component = Component(name, load, warm, required, retry)
+        self.components[name] = component
+        return component
+
+    def __getitem__(self, name: str) -> Component:
+        return self.components[name]
+
+    def peek(self, name: str) -> Any:
+        """The component if it is already built, without building it."""
+        return self.components[name].value
+
+    def start(self):
+        for component in self.components.values():
+            self._tasks.append(asyncio.create_task(component.start()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def ready(self) -> bool:
+        return all(component.state == "ready" for component in self.components.values() if component.required)
+
+    def status(self) -> dict:
+        return {"ready": self.ready, "components": {name: component.status() for name, component in self.components.items()}}
+
+
+components = ComponentRegistry()
@@ -0,0 +1,283 @@
+# agent_service/core/jobs.py
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+
+from core.shared_state import MULTI_WORKER, SHARED_STATE_DB, WORKER_ID, connect
+
+logging.basicConfig(level=logging.INFO)
+
+# Configuration
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", "4"))
+BATCH_MAX_PARALLELISM = int(os.getenv("BATCH_MAX_PARALLELISM", "32"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+BATCH_JOBS_RETAINED = int(os.getenv("BATCH_JOBS_RETAINED", "100"))
+# Where job progress is written so any worker can report on or cancel a job; empty keeps jobs in-process
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", SHARED_STATE_DB if MULTI_WORKER else "")
+CANCEL_POLL_SECONDS = 1.0
+
+
+class BatchJob:
+    """A batch of messages run with bounded parallelism; results are kept in completion order."""
+
+    def __init__(self, items: List[dict], parallelism: int = BATCH_PARALLELISM):
+        self.id = uuid.uuid4().hex
+        self.items = items
+        self.parallelism = max(1, min(parallelism, BATCH_MAX_PARALLELISM))
+        self.status = "pending"
+        self.results: List[dict] = []
+        self.failed = 0
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+        # Called (in a thread) with the position of each new result, and with None when the job finishes
+        self.on_change: Optional[Callable[["BatchJob", Optional[int]], None]] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "cancelled")
+
+    def start(self, run_item: Callable[[str], Awaitable[str]]):
+        self.status = "running"
+        self._task = asyncio.create_task(self._run(run_item))
+
+    def cancel(self) -> bool:
+        if self.done or not self._task:
+            return False
+        self._task.cancel()
+        return True
+
+    async def _run(self, run_item):
+        pending = iter(enumerate(self.items))
+
+        async def worker():
+            # Workers share one iterator, so at most `parallelism` items are in flight
+            for index, item in pending:
+                started = time.monotonic()
+                result = {"index": index, "id": item.get("id", index)}
+                try:
+                    result.update(status="ok", reply=await run_item(item["text"]))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.error(f"[batch {self.id}] Item {index} failed: {e}")
+                    self.failed += 1
+                    result.update(status="error", error=str(e))
+                result["latency_ms"] = round((time.monotonic() - started) * 1000, 1)
+                self.results.append(result)
+                self._changed.set()
+                await self._publish(len(self.results) - 1)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.parallelism, len(self.items)))))
+            self.status = "completed"
+        except asyncio.CancelledError:
+            self.status = "cancelled"
+            logging.info(f"[batch {self.id}] Cancelled after {len(self.results)}/{len(self.items)} items")
+        finally:
+            self.finished_at = time.time()
+            self._changed.set()
+            await self._publish(None)
+
+    async def _publish(self, seq: Optional[int]):
+        if self.on_change is None:
+            return
+        try:
+            await asyncio.to_thread(self.on_change, self, seq)
+        except Exception as e:
+            logging.warning(f"[batch {self.id}] Could not record progress: {e}")
+
+    async def follow(self):
+        """Yields every result as it completes, starting from the first one."""
+        sent = 0
+        while True:
+            self._changed.clear()
+            while sent < len(self.results):
+                yield self.results[sent]
+                sent += 1
+            if self.done:
+                return
+            await self._changed.wait()
+
+    def snapshot(self, offset: int = 0) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total": len(self.items),
+            "completed": len(self.results),
+            "failed": self.failed,
+            "parallelism": self.parallelism,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "results": self.results[offset:],
+        }
+
+
+class StoredJob:
+    """A job run by another worker process, read back from the job database."""
+
+    def __init__(self, store: "JobStore", row: tuple):
+        (self.id, self.status, self.total, self.completed, self.failed, self.parallelism,
+         self.created_at, self.finished_at, self.owner) = row
+        self.store = store
+        if self.status == "running" and not _process_alive(self.owner):
+            self.status = "lost"  # its worker died before finishing
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "cancelled", "lost")
+
+    def cancel(self) -> bool:
+        """Asks the owning worker to cancel; it notices within CANCEL_POLL_SECONDS."""
+        if self.done:
+            return False
+        self.store.request_cancel(self.id)
+        return True
+
+    def snapshot(self, offset: int = 0) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "parallelism": self.parallelism,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "results": self.store.results(self.id, offset),
+        }
+
+
+def _process_alive(owner: str) -> bool:
+    try:
+        os.kill(int(owner.split("-", 1)[0]), 0)
+    except ProcessLookupError:
+        return False
+    except (ValueError, PermissionError):
+        pass
+    return True
+
+
+class JobStore:
+    """Keeps running jobs plus the most recent finished ones.
+
+    With a database, each job's progress is also written there, so a status request or a
+    cancel that reaches a different worker process than the one running the job still works.
+    """
+
+    def __init__(self, retained: int = BATCH_JOBS_RETAINED, db_path: str = JOBS_DB_PATH):
+        self.retained = retained
+        self._jobs: "OrderedDict[str, BatchJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = self._open_db(db_path) if db_path else None
+        self._watcher: Optional[asyncio.Task] = None
+
+    def _open_db(self, db_path: str):
+        db = connect(db_path)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT, total INTEGER, completed INTEGER, "
+            "failed INTEGER, parallelism INTEGER, created_at REAL, finished_at REAL, owner TEXT, "
+            "cancel_requested INTEGER DEFAULT 0)"
+        )
+        db.execute("CREATE TABLE IF NOT EXISTS job_results (job_id TEXT, seq INTEGER, result TEXT, PRIMARY KEY (job_id, seq))")
+        db.commit()
+        logging.info(f"[jobs] Recording batch jobs in {db_path}")
+        return db
+
+    def add(self, job: BatchJob):
+        self._jobs[job.id] = job
+        finished = [job_id for job_id, j in self._jobs.items() if j.done]
+        for job_id in finished[:max(0, len(finished) - self.retained)]:
+            del self._jobs[job_id]
+        if self._db is None:
+            return
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO jobs VALUES (?, ?, ?, 0, 0, ?, ?, NULL, ?, 0)",
+                (job.id, job.status, len(job.items), job.parallelism, job.created_at, WORKER_ID),
+            )
+            stale = ("SELECT id FROM jobs WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT -1 OFFSET ?")
+            self._db.execute(f"DELETE FROM job_results WHERE job_id IN ({stale})", (self.retained,))
+            self._db.execute(f"DELETE FROM jobs WHERE id IN ({stale})", (self.retained,))
+        for seq in range(len(job.results)):
+            self._record(job, seq)
+        job.on_change = self._record
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch_cancellations())
+
+    def _record(self, job: BatchJob, seq: Optional[int]):
+        with self._lock, self._db:
+            if seq is not None:
+                self._db.execute("INSERT OR REPLACE INTO job_results VALUES (?, ?, ?)",
+                                 (job.id, seq, json.dumps(job.results[seq], default=str)))
+            self._db.execute("UPDATE jobs SET status = ?, completed = ?, failed = ?, finished_at = ? WHERE id = ?",
+                             (job.status, len(job.results), job.failed, job.finished_at, job.id))
+
+    async def _watch_cancellations(self):
+        # Cancels requested by other workers arrive through the database
+        while any(not job.done for job in self._jobs.values()):
+            await asyncio.sleep(CANCEL_POLL_SECONDS)
+            running = [job_id for job_id, job in self._jobs.items() if not job.done]
+            if not running:
+                break
+            try:
+                requested = await asyncio.to_thread(self._cancel_requested, running)
+            except Exception as e:
+                logging.warning(f"[jobs] Could not check for cancelled jobs: {e}")
+                continue
+            for job_id in requested:
+                logging.info(f"[batch {job_id}] Cancelled from another worker")
+                self._jobs[job_id].cancel()
+
+    def _cancel_requested(self, job_ids: List[str]) -> List[str]:
+        marks = ",".join("?" * len(job_ids))
+        with self._lock:
+            rows = self._db.execute(f"SELECT id FROM jobs WHERE cancel_requested = 1 AND id IN ({marks})", job_ids).fetchall()
+        return [row[0] for row in rows]
+
+    def request_cancel(self, job_id: str):
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+
+    def results(self, job_id: str, offset: int = 0) -> List[dict]:
+        with self._lock:
+            rows = self._db.execute("SELECT result FROM job_results WHERE job_id = ? AND seq >= ? ORDER BY seq",
+                                    (job_id, offset)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get(self, job_id: str):
+        """The job if this worker runs it, else its recorded state from the database."""
+        job = self._jobs.get(job_id)
+        if job is not None or self._db is None:
+            return job
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, status, total, completed, failed, parallelism, created_at, finished_at, owner "
+                "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return StoredJob(self, row) if row else None
+
+
+def parse_items(messages) -> List[dict]:
+    """Normalizes a list of strings or {"text": ..., "id": ...} objects into batch items."""
+    if not isinstance(messages, list) or not messages:
+        raise ValueError("Batch must contain a non-empty list of messages.")
+    if len(messages) > BATCH_MAX_ITEMS:
+        raise ValueError(f"Batch exceeds the limit of {BATCH_MAX_ITEMS} messages.")
+    items = []
+    for index, message in enumerate(messages):
+        if isinstance(message, str):
+            message = {"text": message}
+        if not isinstance(message, dict) or not isinstance(message.get("text"), str):
+            raise ValueError(f"Message {index} must be a string or an object with a 'text' field.")
+        items.append(message)
+    return items
+
+
+job_store = JobStore()
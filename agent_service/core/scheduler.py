@@ -0,0 +1,285 @@
+# agent_service/core/scheduler.py
+import asyncio
+import contextvars
+import logging
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+from core.admission import AdmissionRejected
+from core.metrics import registry
+from core import tracing
+
+logging.basicConfig(level=logging.INFO)
+
+# Configuration
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+# Generations sent to one model at once by this process; 0 sizes it to the backend (see model_pool)
+SCHEDULER_MAX_GENERATIONS = int(os.getenv("SCHEDULER_MAX_GENERATIONS", "0"))
+# Per-user weights as "user=weight,..."; a user with weight 2 gets twice the share of a busy model
+SCHEDULER_USER_WEIGHTS = os.getenv("SCHEDULER_USER_WEIGHTS", "")
+SCHEDULER_USER_RATE = float(os.getenv("SCHEDULER_USER_RATE", "0"))  # model calls per second per user; 0 = no quota
+SCHEDULER_USER_BURST = float(os.getenv("SCHEDULER_USER_BURST", "10"))
+# Seconds a caller waits in total before its model calls are dropped; 0 = no deadline
+SCHEDULER_DEADLINES = os.getenv("SCHEDULER_DEADLINES", "interactive=120,batch=0")
+SCHEDULER_MAX_FLOWS = 10000  # idle per-user state kept before it is swept
+
+# Served strictly in this order: a batch call only starts when no interactive call is waiting
+PRIORITIES = ("interactive", "batch")
+
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+wait_seconds = registry.histogram("agent_scheduler_wait_seconds", "Time model calls waited for a generation slot",
+                                  ("model", "priority"), buckets=WAIT_BUCKETS)
+shed_total = registry.counter("agent_scheduler_shed_total", "Model calls dropped before they started (deadline, abandoned)",
+                              ("model", "priority", "reason"))
+
+
+def parse_pairs(value: str) -> Dict[str, float]:
+    pairs = {}
+    for pair in filter(None, (part.strip() for part in value.split(","))):
+        name, _, number = pair.partition("=")
+        pairs[name.strip()] = float(number)
+    return pairs
+
+
+user_weights = parse_pairs(SCHEDULER_USER_WEIGHTS)
+deadlines = parse_pairs(SCHEDULER_DEADLINES)
+
+
+class Caller:
+    """Who the model calls of the current request are made for."""
+
+    def __init__(self, user: str, priority: str = "interactive", abandoned: Callable[[], Awaitable[bool]] = None):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}', expected one of {PRIORITIES}")
+        self.user = user
+        self.priority = priority
+        self.abandoned = abandoned
+        timeout = deadlines.get(priority, 0)
+        self.deadline = time.monotonic() + timeout if timeout > 0 else None
+
+
+_caller: contextvars.ContextVar[Optional[Caller]] = contextvars.ContextVar("scheduler_caller", default=None)
+ANONYMOUS = Caller("anonymous")
+
+
+@contextmanager
+def caller(user: str, priority: str = "interactive", abandoned: Callable[[], Awaitable[bool]] = None):
+    """Model calls made inside this block are queued for `user` at `priority`. `abandoned` is
+    awaited before a queued call starts; when it returns True (the client disconnected) the
+    call is dropped."""
+    token = _caller.set(Caller(user, priority, abandoned))
+    try:
+        yield
+    finally:
+        try:
+            _caller.reset(token)
+        except ValueError:
+            pass  # a streaming generator abandoned by its consumer is closed from another context
+
+
+class Shed(AdmissionRejected):
+    """A queued model call dropped because its caller's deadline passed or the caller went away."""
+
+    def __init__(self, detail: str):
+        super().__init__(503, detail)
+
+
+class Flow:
+    """One user's queue within a priority class, with its fair-queuing tag and token bucket."""
+
+    def __init__(self, user: str):
+        self.user = user
+        self.weight = user_weights.get(user, 1.0)
+        self.waiters: deque = deque()
+        self.finish = 0.0  # virtual time at which this user's last dispatched call "ends"
+        self.tokens = SCHEDULER_USER_BURST
+        self.refilled_at = time.monotonic()
+
+    def refill(self, now: float):
+        if SCHEDULER_USER_RATE > 0:
+            self.tokens = min(SCHEDULER_USER_BURST, self.tokens + (now - self.refilled_at) * SCHEDULER_USER_RATE)
+        self.refilled_at = now
+
+    def ready_in(self) -> float:
+        """Seconds until the bucket holds a token (0 when it does, or when quotas are off)."""
+        if SCHEDULER_USER_RATE <= 0 or self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / SCHEDULER_USER_RATE
+
+
+class Waiter:
+    def __init__(self, flow: Flow, caller: Caller):
+        self.flow = flow
+        self.caller = caller
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+
+class ModelScheduler:
+    """Orders the calls to one model and caps how many generate at once.
+
+    Calls wait in per-user queues inside two strict priority classes (interactive before batch).
+    Within a class, users take turns by start-time fair queuing: each dispatched call advances
+    the user's virtual finish tag by 1/weight, and the user with the smallest tag goes next, so
+    a burst from one client queues behind everyone else's next call instead of in front of it.
+    With SCHEDULER_USER_RATE set, a user's calls also wait for a token in their bucket.
+
+    A call whose caller's deadline passes while it waits is dropped (503), and so is one whose
+    caller disconnected by the time its turn comes, so no generation runs for nobody.
+    """
+
+    def __init__(self, model: str, max_generations: int):
+        self.model = model
+        self.max_generations = max_generations
+        self.running = 0
+        self.flows: Dict[str, Dict[str, Flow]] = {priority: {} for priority in PRIORITIES}
+        self.virtual = {priority: 0.0 for priority in PRIORITIES}
+        self.queued = {priority: 0 for priority in PRIORITIES}
+        self.started = {priority: 0 for priority in PRIORITIES}
+        self.shed = {"deadline": 0, "abandoned": 0}
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    def _flow(self, priority: str, user: str) -> Flow:
+        flows = self.flows[priority]
+        if user not in flows:
+            if len(flows) >= SCHEDULER_MAX_FLOWS:
+                self._sweep(priority)
+            flows[user] = Flow(user)
+        return flows[user]
+
+    def _sweep(self, priority: str):
+        """Forgets idle users whose tags and buckets no longer matter."""
+        now = time.monotonic()
+        for user, flow in list(self.flows[priority].items()):
+            flow.refill(now)
+            if not flow.waiters and flow.finish <= self.virtual[priority] and flow.ready_in() == 0:
+                del self.flows[priority][user]
+
+    def _next(self) -> Optional[Waiter]:
+        now = time.monotonic()
+        retry_in = None
+        for priority in PRIORITIES:
+            best, best_start = None, None
+            for flow in self.flows[priority].values():
+                if not flow.waiters:
+                    continue
+                flow.refill(now)
+                delay = flow.ready_in()
+                if delay:
+                    retry_in = delay if retry_in is None else min(retry_in, delay)
+                    continue
+                start = max(self.virtual[priority], flow.finish)
+                if best is None or start < best_start:
+                    best, best_start = flow, start
+            if best is not None:
+                waiter = best.waiters.popleft()
+                best.finish = best_start + 1 / best.weight
+                self.virtual[priority] = best_start
+                if SCHEDULER_USER_RATE > 0:
+                    best.tokens -= 1
+                self.queued[priority] -= 1
+                return waiter
+        if retry_in is not None and self._wakeup is None:
+            # Only quotas hold the queue back; look again once the first bucket refills
+            self._wakeup = asyncio.get_running_loop().call_later(retry_in, self._wake)
+        return None
+
+    def _wake(self):
+        self._wakeup = None
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.running < self.max_generations:
+            waiter = self._next()
+            if waiter is None:
+                return
+            self.running += 1
+            waiter.future.set_result(None)
+
+    async def acquire(self):
+        """Waits for this caller's turn and a free generation slot; pair with `release()`."""
+        caller = _caller.get() or ANONYMOUS
+        flow = self._flow(caller.priority, caller.user)
+        waiter = Waiter(flow, caller)
+        flow.waiters.append(waiter)
+        self.queued[caller.priority] += 1
+        self._dispatch()
+        if not waiter.future.done():
+            timeout = None if caller.deadline is None else max(0.0, caller.deadline - time.monotonic())
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+            except BaseException as e:
+                if waiter.future.done():
+                    self.release()  # the slot was granted just as the wait ended
+                else:
+                    waiter.future.cancel()
+                    flow.waiters.remove(waiter)
+                    self.queued[caller.priority] -= 1
+                if isinstance(e, asyncio.TimeoutError):
+                    self._shed(caller, "deadline")
+                    raise Shed("The request's deadline passed while it waited for the model.")
+                raise
+        waited = time.monotonic() - waiter.enqueued_at
+        wait_seconds.observe(waited, model=self.model, priority=caller.priority)
+        if waited > 0.001:
+            tracing.record("model_queue", self.model, waiter.enqueued_at, time.monotonic(),
+                           {"priority": caller.priority})
+            if caller.abandoned is not None and await caller.abandoned():
+                self.release()
+                self._shed(caller, "abandoned")
+                raise Shed("The client went away before its model call started.")
+        self.started[caller.priority] += 1
+
+    def release(self):
+        self.running -= 1
+        self._dispatch()
+
+    def _shed(self, caller: Caller, reason: str):
+        self.shed[reason] += 1
+        shed_total.inc(model=self.model, priority=caller.priority, reason=reason)
+        logging.warning(f"[scheduler] Dropped {caller.priority} call to {self.model} for {caller.user} ({reason})")
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {"max_generations": self.max_generations, "running": self.running, "queued": dict(self.queued),
+                "started": dict(self.started), "shed": dict(self.shed),
+                "users_waiting": {priority: sum(1 for flow in flows.values() if flow.waiters)
+                                  for priority, flows in self.flows.items()}}
+
+
+schedulers: Dict[str, ModelScheduler] = {}
+
+
+def scheduler_for(model: str, capacity: int, workers: int = 1) -> Optional[ModelScheduler]:
+    """The scheduler of `model`, created on first use. Unless SCHEDULER_MAX_GENERATIONS is set,
+    its slots are the backend's `capacity` (parallel generations over the model's endpoints)
+    split between the server's `workers` processes."""
+    if not SCHEDULER_ENABLED:
+        return None
+    if model not in schedulers:
+        slots = SCHEDULER_MAX_GENERATIONS or max(1, math.ceil(capacity / max(1, workers)))
+        schedulers[model] = ModelScheduler(model, slots)
+        logging.info(f"[scheduler] {model}: {slots} concurrent generations")
+    return schedulers[model]
+
+
+def stats() -> dict:
+    return {model: scheduler.stats() for model, scheduler in schedulers.items()}
+
+
+registry.gauge("agent_scheduler_queued", "Model calls waiting for a generation slot", ("model", "priority"),
+               source=lambda: {(model, priority): count for model, scheduler in schedulers.items()
+                               for priority, count in scheduler.queued.items()})
+registry.gauge("agent_scheduler_running", "Model calls holding a generation slot", ("model",),
+               source=lambda: {(model,): scheduler.running for model, scheduler in schedulers.items()})
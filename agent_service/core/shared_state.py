@@ -0,0 +1,82 @@
+# agent_service/core/shared_state.py
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+logging.basicConfig(level=logging.INFO)
+
+# Configuration
+WORKERS = int(os.getenv("WORKERS", os.getenv("WEB_CONCURRENCY", "1")))  # server processes on this box
+MULTI_WORKER = WORKERS > 1
+SHARED_STATE_DB = os.getenv("SHARED_STATE_DB", "./shared_state.db")  # batch jobs and session leases
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+LEASE_TTL_SECONDS = float(os.getenv("LEASE_TTL_SECONDS", "300"))  # a crashed worker's leases expire after this
+LEASE_POLL_SECONDS = 0.05
+
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """A connection several worker processes can share the file through: WAL, and waits instead of failing on locks."""
+    db = sqlite3.connect(path, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    return db
+
+
+class LeaseTable:
+    """Named, expiring locks held in SQLite, so only one worker process at a time runs on a session.
+
+    A lease is a row keyed by name; taking it is an insert that fails while another worker holds
+    it. Leases left behind by a worker that died are taken over once they expire.
+    """
+
+    def __init__(self, path: str = SHARED_STATE_DB, ttl: float = LEASE_TTL_SECONDS):
+        self.ttl = ttl
+        self._db = connect(path)
+        self._lock = threading.Lock()
+        self._db.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, expires_at REAL)")
+        self._db.execute("DELETE FROM leases WHERE owner LIKE ?", (f"{os.getpid()}-%",))
+        self._db.commit()
+        self.waits = 0
+        self.takeovers = 0
+
+    def _try_acquire(self, name: str, owner: str) -> bool:
+        now = time.time()
+        with self._lock, self._db:
+            expired = self._db.execute("DELETE FROM leases WHERE name = ? AND expires_at < ?", (name, now)).rowcount
+            taken = self._db.execute("INSERT OR IGNORE INTO leases VALUES (?, ?, ?)", (name, owner, now + self.ttl)).rowcount
+        if taken and expired:
+            self.takeovers += 1
+            logging.warning(f"[shared_state] Took over expired lease {name}")
+        return bool(taken)
+
+    def _release(self, name: str, owner: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    @asynccontextmanager
+    async def hold(self, name: str):
+        owner = f"{WORKER_ID}-{uuid.uuid4().hex[:8]}"
+        waited = False
+        while not await asyncio.to_thread(self._try_acquire, name, owner):
+            waited = True
+            await asyncio.sleep(LEASE_POLL_SECONDS)
+        if waited:
+            self.waits += 1
+        try:
+            yield
+        finally:
+            await asyncio.to_thread(self._release, name, owner)
+
+    def stats(self) -> dict:
+        return {"waits": self.waits, "takeovers": self.takeovers}
+
+
+leases = LeaseTable() if MULTI_WORKER else None
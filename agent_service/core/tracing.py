@@ -0,0 +1,235 @@
+# agent_service/core/tracing.py
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import aclosing, contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from core.metrics import (
+    request_seconds,
+    requests_in_flight,
+    requests_total,
+    stage_errors_total,
+    stage_seconds,
+    tokens_total,
+    transfers_total,
+)
+
+logging.basicConfig(level=logging.INFO)
+
+# Configuration
+TRACE_FILE = os.getenv("TRACE_FILE")  # JSON lines, one trace per request; unset disables trace output
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "stage", "name", "start", "end", "attrs", "error")
+
+    def __init__(self, stage: str, name: str, start: float, end: float, parent_id: Optional[str], attrs: dict = None,
+                 error: str = None, span_id: str = None):
+        self.span_id = span_id or uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.stage = stage
+        self.name = name
+        self.start = start
+        self.end = end
+        self.attrs = attrs or {}
+        self.error = error
+
+
+class Trace:
+    """Spans of one request; shared by every task the request fans out to."""
+
+    def __init__(self, endpoint: str, **attrs):
+        self.trace_id = uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.attrs = attrs
+        self.wall_start = time.time()
+        self.start = time.monotonic()
+        self.spans: List[Span] = []
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.prompt_estimate = 0  # prompt tokens counted locally before each model call
+
+    def usage(self) -> dict:
+        return {"tokens_in": self.tokens_in, "tokens_out": self.tokens_out, "prompt_estimate": self.prompt_estimate}
+
+    def to_dict(self, status: str, end: float) -> dict:
+        # Span fields follow the OpenTelemetry span model, with times in unix nanoseconds
+        def unix_nano(t: float) -> int:
+            return int((self.wall_start + t - self.start) * 1e9)
+
+        return {
+            "trace_id": self.trace_id,
+            "name": self.endpoint,
+            "status": status,
+            "start_time_unix_nano": unix_nano(self.start),
+            "end_time_unix_nano": unix_nano(end),
+            "attributes": {**self.attrs, **self.usage()},
+            "spans": [
+                {
+                    "span_id": span.span_id,
+                    "parent_span_id": span.parent_id,
+                    "name": f"{span.stage}:{span.name}" if span.name else span.stage,
+                    "start_time_unix_nano": unix_nano(span.start),
+                    "end_time_unix_nano": unix_nano(span.end),
+                    "attributes": span.attrs,
+                    "status": "error" if span.error else "ok",
+                    "error": span.error,
+                }
+                for span in self.spans
+            ],
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[str]] = ContextVar("current_span", default=None)
+_file_lock = threading.Lock()
+
+
+def write_trace(data: dict):
+    try:
+        with _file_lock, open(TRACE_FILE, "a") as f:
+            f.write(json.dumps(data, default=str) + "\n")
+    except OSError as e:
+        logging.warning(f"[tracing] Could not write trace to {TRACE_FILE}: {e}")
+
+
+def _finish(span: Span):
+    stage_seconds.observe(span.end - span.start, stage=span.stage, name=span.name)
+    if span.error:
+        stage_errors_total.inc(stage=span.stage, name=span.name)
+    request = _current_trace.get()
+    if request is not None:
+        request.spans.append(span)
+
+
+def record(stage: str, name: str, start: float, end: float, attrs: dict = None, error: str = None):
+    """Records a finished stage in the latency histograms and, inside a request, in its trace."""
+    _finish(Span(stage, name, start, end, _current_span.get(), attrs, error))
+
+
+def record_tokens(agent: str, tokens_in: int, tokens_out: int):
+    tokens_total.inc(tokens_in, agent=agent, direction="in")
+    tokens_total.inc(tokens_out, agent=agent, direction="out")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.tokens_in += tokens_in
+        trace.tokens_out += tokens_out
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def trace(endpoint: str, **attrs):
+    """Request scope: in-flight gauge, request counter and latency, and the trace written to TRACE_FILE."""
+    request = Trace(endpoint, **attrs)
+    token = _current_trace.set(request)
+    requests_in_flight.inc(endpoint=endpoint)
+    status = "ok"
+    try:
+        yield request
+    except Exception as e:
+        status = str(getattr(e, "status_code", "error"))
+        raise
+    except BaseException:
+        status = "cancelled"
+        raise
+    finally:
+        end = time.monotonic()
+        requests_in_flight.dec(endpoint=endpoint)
+        requests_total.inc(endpoint=endpoint, status=status)
+        request_seconds.observe(end - request.start, endpoint=endpoint)
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            # A streaming generator finalized from another context; nothing else to undo there
+            pass
+        if TRACE_FILE:
+            data = request.to_dict(status, end)
+            try:
+                asyncio.get_running_loop().run_in_executor(None, write_trace, data)
+            except RuntimeError:
+                write_trace(data)
+
+
+@contextmanager
+def span(stage: str, name: str = "", **attrs):
+    """Times the enclosed block as one stage; spans opened inside it become its children."""
+    start = time.monotonic()
+    span_id = uuid.uuid4().hex[:16]
+    parent_id = _current_span.get()
+    token = _current_span.set(span_id)
+    error = None
+    try:
+        yield attrs
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(Span(stage, name, start, time.monotonic(), parent_id, attrs, error, span_id=span_id))
+
+
+async def observe_events(events):
+    """Passes ADK runner events through, recording model turns, tool calls and time per agent.
+
+    A model turn runs from the previous event to the event carrying the model's output; a tool
+    call from its function_call event to the matching function_response.
+    """
+    last = time.monotonic()
+    agent, agent_start = None, last
+    first_token_seen = False
+    pending_calls = {}
+    try:
+        async with aclosing(events):
+            async for event in events:
+                now = time.monotonic()
+                if event.author != agent and event.author != "user":
+                    # The new agent took over right after the previous event
+                    if agent is not None:
+                        record("agent", agent, agent_start, last)
+                    agent, agent_start = event.author, last
+
+                if event.partial:
+                    if not first_token_seen:
+                        record("first_token", event.author, last, now)
+                        first_token_seen = True
+                    yield event
+                    continue
+
+                responses = event.get_function_responses()
+                if responses:
+                    for response in responses:
+                        name, start = pending_calls.pop(response.id, (response.name, last))
+                        if name == "transfer_to_agent":
+                            continue
+                        result = response.response or {}
+                        error = result.get("error_message") if result.get("status") == "error" else None
+                        record("tool", name, start, now, error=error)
+                elif event.content and event.content.parts and event.author != "user":
+                    attrs = {}
+                    usage = getattr(event, "usage_metadata", None)
+                    if usage is not None:
+                        attrs = {"tokens_in": usage.prompt_token_count or 0, "tokens_out": usage.candidates_token_count or 0}
+                        record_tokens(event.author, attrs["tokens_in"], attrs["tokens_out"])
+                    record("llm", event.author, last, now, attrs)
+
+                for call in event.get_function_calls():
+                    pending_calls[call.id] = (call.name, now)
+                if event.actions and event.actions.transfer_to_agent:
+                    transfers_total.inc(source=event.author, target=event.actions.transfer_to_agent)
+
+                last = now
+                first_token_seen = False
+                yield event
+    finally:
+        # Also runs when the caller stops early (e.g. right after the final response)
+        if agent is not None:
+            record("agent", agent, agent_start, time.monotonic())
@@ -1,7 +1,13 @@
 #!/bin/bash
 
+# WORKERS > 1 runs several server processes that share sessions, the response cache and batch jobs
+# through SQLite files (see README, "Multiple workers")
+if [ "${WORKERS:-1}" -gt 1 ]; then
+    exec gunicorn -c gunicorn.conf.py app:app
+fi
+
 # Start both commands
-uvicorn app:app --host 0.0.0.0 --port 5000
+exec uvicorn app:app --host 0.0.0.0 --port 5000
 
 # sleep 5
 
@@ -1,23 +1,35 @@
 # agent_service/graph/agent_graph.py
 
+import asyncio
 import logging
 import uuid
 import os
+import time
+from contextlib import aclosing
 from typing import List, Literal, Annotated
 from dotenv import load_dotenv
 from google.adk.agents import SequentialAgent, LlmAgent, Agent, BaseAgent
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.models.lite_llm import LiteLlm
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from google.genai import types
 from tools.weather_tool import weather_tool
+from tools.weather_providers import close_http_client
 from tools.calendar_tool import calendar_tool
 from tools.retriever_tool import retriever_tool
-import litellm
-litellm._turn_on_debug()
+from tools import memo as tool_memo
+from graph.router import router, router_stats, RouteDecision
+from graph import fanout
+from graph.response_cache import response_cache, stands_alone, ttl_for
+from graph.session_store import SessionManager, build_session_service, maybe_await, trim_history
+from graph.model_client import build_model, configure_logging
+from graph.model_pool import check_agent_models
+from graph import context_budget
+from core import tracing
 
 logging.basicConfig(level=logging.INFO)
 load_dotenv()
+configure_logging()
 
 # model = "llama3.1:8b"
 model = os.getenv("MODEL")
@@ -30,11 +42,6 @@ APP_NAME = "adk__multi_agent_app"
 USER_ID = "1234"
 SESSION_ID = str(uuid.uuid4())
 
-llm = LiteLlm(
-    model="ollama_chat/" + model,
-    api_base=ollama_base_url
-)
-
 weather_prompt = """You are a weather assistant. Follow these rules STRICTLY:
 1. ONLY answer weather-related questions (e.g., temperature, forecast, rain) for a specific city.
 2. If the user asks for the weather, identify the city and use the 'get_weather_report' tool with the city name.
@@ -45,11 +52,11 @@ weather_prompt = """You are a weather assistant. Follow these rules STRICTLY:
 """
 
 calendar_prompt = """You are a calendar assistant. Follow these rules STRICTLY:
-1. ONLY answer questions about today's meetings or schedule.
-2. If the user asks about their schedule or meetings for today, use the 'check_calendar' tool.
+1. ONLY answer questions about meetings or schedules.
+2. If the user asks about their schedule or meetings, use the 'check_calendar' tool. Pass 'start_date' and 'end_date' (YYYY-MM-DD) for days other than today, and 'user' when they ask about a specific person.
 3. If the tool returns a 'success' status with a report, provide the meeting information to the user.
 4. If the tool indicates no meetings, inform the user.
-5. DO NOT answer anything not related to today's calendar.
+5. DO NOT answer anything not related to the calendar.
 6. After completing your task, ALWAYS transfer back to the supervisor.
 """
 
@@ -62,89 +69,395 @@ retriever_prompt = """You are a document retrieval assistant. Follow these rules
 6. After completing your task, ALWAYS transfer back to the supervisor.
 """
 
-# Create specialized agents
+supervisor_prompt = """
+            You are a supervisor agent managing `weather_agent`, `calendar_agent`, and `retriever_agent`.
+
+            **Responsibilities:**
+            1. Split the user's question into distinct sub-questions using '?' or logical breaks.
+            2. For each sub-question:
+            - Identify the intent (weather, calendar, documents).
+            - Use only ONE specialized agent per sub-question:
+                - If about temperature, forecast, rain, etc. → use `weather_agent`.
+                - If about meetings, schedules, appointments → use `calendar_agent`.
+                - If about documents, blogs, prompts, retrieval → use `retriever_agent`.
+            3. For each sub-question, send only the relevant part to the appropriate agent.
+            4. Wait for all agent responses.
+            5. Use `compile_responses` to merge results.
+            6. Use `finalize_response` to polish and format the final message for the user.
+
+            **Strict Rules:**
+            - DO NOT answer any sub-question yourself.
+            - DO NOT send the same sub-question to multiple agents.
+            - DO NOT skip any sub-question.
+            - ALWAYS wait for all agent outputs before responding.
+            - ALWAYS use `compile_responses` and `finalize_response`.
+            - Respond ONLY with `FINISH` when ready to return the final output.
+            """
+
+# The same rules in a fraction of the tokens (PROMPT_STYLE=compact); on CPU inference every
+# instruction token is paid again in prompt evaluation on each model call
+COMPACT_TRANSFER_BACK_RULE = "When done, transfer back to the supervisor.\n"
+compact_prompts = {
+    "weather_agent": "Answer only weather questions about a city. Call get_weather_report with the city and give its report; "
+                     "on an error, say the weather for that city is not available.\n" + COMPACT_TRANSFER_BACK_RULE,
+    "calendar_agent": "Answer only questions about meetings and schedules. Call check_calendar (start_date and end_date as "
+                      "YYYY-MM-DD for days other than today, user for a specific person) and give its report.\n"
+                      + COMPACT_TRANSFER_BACK_RULE,
+    "retriever_agent": "Answer questions about documents, blogs, LLMs and prompts only from retrieve_information results "
+                       "(query, k=2 or 3), citing sources when useful; on an error, say the information could not be found.\n"
+                       + COMPACT_TRANSFER_BACK_RULE,
+    "supervisor_agent": "Never answer yourself. Send each distinct part of the user's question to exactly one agent: "
+                        "weather_agent (weather), calendar_agent (meetings, schedules), retriever_agent (documents, blogs, "
+                        "LLMs, prompts). Skip no part. Reply only FINISH once every part is answered.\n",
+}
+
+def instruction(agent_name: str, full_prompt: str) -> str:
+    if context_budget.PROMPT_STYLE == "compact":
+        return compact_prompts[agent_name]
+    return full_prompt
+
+# Every model call: drop old turns by count, then fit the rest to the token budget and measure it
+before_model = [trim_history, context_budget.fit_request]
+
+# Create specialized agents. Each gets its own client: it may run on its own model (AGENT_MODELS),
+# served by any endpoint in the model pool
 weather_agent = Agent(
-    model=llm,
+    model=build_model("answer", "weather_agent"),
     tools=[weather_tool],
     name="weather_agent",
     description="Find weather information using weather_tool",
-    instruction=weather_prompt
+    instruction=instruction("weather_agent", weather_prompt),
+    before_model_callback=before_model,
+    after_tool_callback=context_budget.trim_tool_output,
 )
 
 calendar_agent = Agent(
-    model=llm,
+    model=build_model("answer", "calendar_agent"),
     tools=[calendar_tool],
     name="calendar_agent",
     description="Find meeting or scheduling information using calendar_tool",
-    instruction=calendar_prompt
+    instruction=instruction("calendar_agent", calendar_prompt),
+    before_model_callback=before_model,
+    after_tool_callback=context_budget.trim_tool_output,
 )
 
 retriever_agent = Agent(
-    model=llm,
+    model=build_model("answer", "retriever_agent"),
     tools=[retriever_tool],
     name="retriever_agent",
     description="Find local blog or retrival information using retriever_tool",
-    instruction=retriever_prompt
+    instruction=instruction("retriever_agent", retriever_prompt),
+    before_model_callback=before_model,
+    after_tool_callback=context_budget.trim_tool_output,
 )
 
 agents = [weather_agent, calendar_agent, retriever_agent]
 
-# Supervisor agent using standard LangGraph supervisor
+# Supervisor agent using standard LangGraph supervisor. Its turns only pick a sub-agent,
+# so their reply budget is small
 supervisor = Agent(
-    model=llm,
+    model=build_model("routing", "supervisor_agent"),
     name="supervisor_agent",
     description="I coordinate `weather_agent`, `calendar_agent`, and `retriever_agent`",
-    instruction="""
-            You are a supervisor agent managing `weather_agent`, `calendar_agent`, and `retriever_agent`.
+    instruction=instruction("supervisor_agent", supervisor_prompt),
+    sub_agents=agents,
+    before_model_callback=before_model,
+)
 
-            **Responsibilities:**
-            1. Split the user's question into distinct sub-questions using '?' or logical breaks.
-            2. For each sub-question:
-            - Identify the intent (weather, calendar, documents).
-            - Use only ONE specialized agent per sub-question:
-                - If about temperature, forecast, rain, etc. → use `weather_agent`.
-                - If about meetings, schedules, appointments → use `calendar_agent`.
-                - If about documents, blogs, prompts, retrieval → use `retriever_agent`.
-            3. For each sub-question, send only the relevant part to the appropriate agent.
-            4. Wait for all agent responses.
-            5. Use `compile_responses` to merge results.
-            6. Use `finalize_response` to polish and format the final message for the user.
+# Single-purpose copies of the sub-agents, used when the router has already picked the intent
+TRANSFER_BACK_RULE = "6. After completing your task, ALWAYS transfer back to the supervisor.\n"
 
-            **Strict Rules:**
-            - DO NOT answer any sub-question yourself.
-            - DO NOT send the same sub-question to multiple agents.
-            - DO NOT skip any sub-question.
-            - ALWAYS wait for all agent outputs before responding.
-            - ALWAYS use `compile_responses` and `finalize_response`.
-            - Respond ONLY with `FINISH` when ready to return the final output.
-            """,
-    sub_agents=agents,
+def direct_agent(agent: Agent) -> Agent:
+    return Agent(
+        model=agent.model,
+        tools=agent.tools,
+        name=agent.name,
+        description=agent.description,
+        instruction=agent.instruction.replace(TRANSFER_BACK_RULE, "").replace(COMPACT_TRANSFER_BACK_RULE, ""),
+        disallow_transfer_to_parent=True,
+        disallow_transfer_to_peers=True,
+        before_model_callback=before_model,
+        after_tool_callback=context_budget.trim_tool_output,
+    )
+
+# Merges the answers of sub-questions run in parallel
+composer_agent = Agent(
+    model=build_model("answer", "composer_agent"),
+    name="composer_agent",
+    description="Merges sub-question answers into one reply",
+    instruction=fanout.compose_prompt,
+    before_model_callback=context_budget.fit_request,
 )
 
+# Tools the router may call without any LLM turn (memoized like the agents' calls)
+DIRECT_TOOLS = {
+    "get_weather_report": weather_tool.func,
+    "check_calendar": calendar_tool.func,
+}
+
 # Session and Runner
-session_service = InMemorySessionService()
+session_service = build_session_service()
+session_manager = SessionManager(session_service, APP_NAME)
 runner = Runner(agent=supervisor, app_name=APP_NAME, session_service=session_service)
+runners = {supervisor.name: runner}
+for agent in agents:
+    runners[agent.name] = Runner(agent=direct_agent(agent), app_name=APP_NAME, session_service=session_service)
+runners[composer_agent.name] = Runner(agent=composer_agent, app_name=APP_NAME, session_service=session_service)
+check_agent_models(runners)
+
+
+async def call_direct_tool(decision: RouteDecision):
+    """Answer a trivial query straight from its tool; None means the agent should handle it"""
+    started = time.monotonic()
+    result = await maybe_await(DIRECT_TOOLS[decision.tool](**decision.tool_args))
+    tracing.record("tool", decision.tool, started, time.monotonic(), error=result.get("error_message"))
+    if result.get("status") == "success":
+        return result["report"]
+    logging.info(f"[router] {decision.tool} returned an error, handing over to {decision.target}")
+    return None
+
+def record_route(decision: RouteDecision, started: float):
+    router_stats.record(decision.route, (time.monotonic() - started) * 1000)
 
 # Agent execution wrapper
-def llm_call(content: str, user_id: str = USER_ID, session_id: str = str(uuid.uuid4())) -> str:
-    """LLM decides whether to call a tool or not"""
+def llm_call(content: str, user_id: str = USER_ID, session_id: str = None) -> str:
+    """LLM decides whether to call a tool or not (blocking wrapper around `llm_call_async`)"""
+    async def call():
+        try:
+            return await llm_call_async(content, user_id=user_id, session_id=session_id)
+        finally:
+            # The loop ends with this call; its pooled HTTP client would otherwise leak
+            await close_http_client()
+    return asyncio.run(call())
+
+
+async def route_async(content: str) -> RouteDecision:
+    with tracing.span("route") as attrs:
+        # Embedding classification calls Ollama, keep it off the event loop
+        if router.use_embeddings:
+            decision = await asyncio.to_thread(router.classify, content)
+        else:
+            decision = router.classify(content)
+        attrs.update(target=decision.route, method=decision.method)
+    return decision
+
+class CachePlan:
+    """Where a question's reply is looked up and stored in the response cache"""
+
+    def __init__(self, decision: RouteDecision, steps, user_id: str, session_id: str = None):
+        self.intents = [step.intent for _, step in steps] if steps else [decision.intent]
+        route = "fanout" if steps else decision.target
+        self.scope = response_cache.scope_for(route, self.intents, decision.tool_args, user_id)
+        self.semantic = response_cache.allows_semantic(self.intents)
+        self.author = decision.target
+        self.user_id = user_id
+        self.session_id = session_id
+
+    async def lookup(self, content: str):
+        with tracing.span("cache", "lookup") as attrs:
+            cached = await response_cache.lookup(content, self.scope, semantic=self.semantic)
+            attrs["hit"] = cached is not None
+        if cached and self.session_id:
+            await session_manager.record_turn(self.user_id, self.session_id, content, cached, self.author)
+        return cached
 
+    async def store(self, content: str, reply: str, started: float):
+        elapsed_ms = (time.monotonic() - started) * 1000
+        await response_cache.store(content, self.scope, reply, ttl_for(self.intents), elapsed_ms, semantic=self.semantic)
+
+async def plan_cache(content: str, decision: RouteDecision, steps, user_id: str, session_id: str = None):
+    """The cache plan of a question, or None when its reply must not be cached.
+
+    `session_id` is the user's session when the question would be answered in it.
+    """
+    # Direct tool answers are already cheap, caching them would only add staleness
+    if response_cache is None or decision.tool:
+        return None
+    # Supervisor turns may touch any agent (the user's calendar included) without the router knowing which
+    intents = [step.intent for _, step in steps] if steps else [decision.intent]
+    if None in intents:
+        return None
+    # A follow-up can lean on earlier turns. Once a session has history, only questions the rules
+    # routed by their own keywords, with nothing pointing back at the conversation, are cacheable
+    standalone = decision.method == "rules" and stands_alone(content)
+    if session_id and not standalone and await session_manager.has_history(user_id, session_id):
+        return None
+    return CachePlan(decision, steps, user_id, session_id)
+
+async def run_agent_async(target: str, text: str, user_id: str = USER_ID, session_id: str = None) -> str:
+    """Runs one agent tree to its first final response, in a throwaway session unless one is given"""
+    content = types.Content(role='user', parts=[types.Part(text=text)])
+    ephemeral = session_id is None
+    if ephemeral:
+        session_id = await session_manager.create_ephemeral(user_id)
     try:
-        content = types.Content(role='user', parts=[types.Part(text=content)])
-        session_id = str(uuid.uuid4())  # Create a new session ID for each call
-        session = session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
         final_response = None
-        for event in runner.run(user_id=USER_ID, session_id=session_id, new_message=content):
-            if event.is_final_response():
-                if event.content and event.content.parts:
-                    final_response = event.content.parts[0].text
-                    print("Agent Response: ", final_response)
-                break  # Exit the loop once the final response is received
-
-        if not final_response:
-            raise ValueError("Empty response from agent")
-
-        return final_response
-    except Exception as e:
-        logging.error(f"Error in llm_call: {str(e)}")
-        raise
+        events = tracing.observe_events(runners[target].run_async(user_id=user_id, session_id=session_id, new_message=content))
+        async with aclosing(events):
+            async for event in events:
+                if event.is_final_response():
+                    if event.content and event.content.parts:
+                        final_response = event.content.parts[0].text
+                        logging.info(f"Agent Response: {final_response}")
+                    break  # Exit the loop once the final response is received
+    finally:
+        if ephemeral:
+            await session_manager.discard(user_id, session_id)
+
+    if not final_response:
+        raise ValueError("Empty response from agent")
+    return final_response
+
+async def run_route_async(text: str, decision: RouteDecision, user_id: str = USER_ID, session_id: str = None) -> str:
+    """Answers from the routed tool when possible, otherwise from the routed agent"""
+    if decision.tool:
+        reply = await call_direct_tool(decision)
+        if reply:
+            return reply
+        decision.tool = None
+    return await run_agent_async(decision.target, text, user_id=user_id, session_id=session_id)
+
+async def compose_async(question: str, steps, answers: List[str], user_id: str = USER_ID) -> str:
+    with tracing.span("compose", fanout.FANOUT_COMPOSE):
+        if fanout.FANOUT_COMPOSE == "llm":
+            return await run_agent_async(composer_agent.name, fanout.compose_request(question, steps, answers), user_id=user_id)
+        return fanout.join_answers(answers)
+
+# Async agent execution wrapper
+async def llm_call_async(content: str, user_id: str = USER_ID, session_id: str = None,
+                         max_concurrency: int = fanout.FANOUT_MAX_CONCURRENCY, ephemeral: bool = False) -> str:
+    """Async variant of `llm_call` driven by `runner.run_async`, so waiting on the model never blocks a worker thread.
+
+    Runs in the user's persistent session unless `ephemeral` is set (e.g. for batch items).
+    """
+
+    # Repeated tool calls within this run (and its sub-questions) run once
+    with tool_memo.run_scope():
+        try:
+            started = time.monotonic()
+            decision = await route_async(content)
+            steps = await fanout.plan(content, router) if decision.target == supervisor.name else None
+            in_session = not (ephemeral or steps or decision.tool)
+            if in_session:
+                session_id = session_id or await session_manager.acquire(user_id)
+            cache = await plan_cache(content, decision, steps, user_id, session_id if in_session else None)
+            if cache:
+                cached = await cache.lookup(content)
+                if cached:
+                    return cached
+
+            if steps:
+                # Independent sub-questions run concurrently, then one compose step
+                answers = [None] * len(steps)
+                run_step = lambda part, step: run_route_async(part, step, user_id=user_id)
+                async for index, answer in fanout.run(steps, run_step, max_concurrency):
+                    answers[index] = answer
+                final_response = await compose_async(content, steps, answers, user_id=user_id)
+                router_stats.record("fanout", (time.monotonic() - started) * 1000)
+                if cache:
+                    await cache.store(content, final_response, started)
+                return final_response
+
+            if ephemeral or decision.tool:
+                final_response = await run_route_async(content, decision, user_id=user_id)
+            else:
+                session_id = session_id or await session_manager.acquire(user_id)
+                async with session_manager.lock(session_id):
+                    final_response = await run_route_async(content, decision, user_id=user_id, session_id=session_id)
+            record_route(decision, started)
+            if cache:
+                await cache.store(content, final_response, started)
+            return final_response
+        except Exception as e:
+            logging.error(f"Error in llm_call_async: {str(e)}")
+            raise
+
+
+def describe_event(event) -> List[dict]:
+    """Translate one ADK runner event into client-facing stream messages"""
+    messages = []
+    if event.actions and event.actions.transfer_to_agent:
+        messages.append({"type": "transfer", "from": event.author, "to": event.actions.transfer_to_agent})
+    for call in event.get_function_calls():
+        if call.name != "transfer_to_agent":
+            messages.append({"type": "tool_call", "agent": event.author, "name": call.name, "args": call.args or {}})
+    for response in event.get_function_responses():
+        if response.name != "transfer_to_agent":
+            messages.append({"type": "tool_result", "agent": event.author, "name": response.name, "response": response.response})
+    if event.partial and event.content and event.content.parts:
+        text = "".join(part.text for part in event.content.parts if part.text)
+        if text:
+            messages.append({"type": "token", "agent": event.author, "text": text})
+    return messages
+
+# Streaming agent execution wrapper
+async def llm_stream(content: str, user_id: str = USER_ID, session_id: str = None,
+                     max_concurrency: int = fanout.FANOUT_MAX_CONCURRENCY):
+    """Yields partial tokens, agent transfers and tool calls as they happen, ending with the final response"""
+
+    # Repeated tool calls within this run (and its sub-questions) run once
+    with tool_memo.run_scope():
+        started = time.monotonic()
+        decision = await route_async(content)
+        steps = await fanout.plan(content, router) if decision.target == supervisor.name else None
+        in_session = not (steps or decision.tool)
+        if in_session:
+            session_id = session_id or await session_manager.acquire(user_id)
+        cache = await plan_cache(content, decision, steps, user_id, session_id if in_session else None)
+        if cache:
+            cached = await cache.lookup(content)
+            if cached:
+                yield {"type": "final", "agent": "cache", "text": cached}
+                return
+
+        if steps:
+            for part, step in steps:
+                yield {"type": "transfer", "from": "router", "to": step.route, "question": part}
+            answers = [None] * len(steps)
+            run_step = lambda part, step: run_route_async(part, step, user_id=user_id)
+            async for index, answer in fanout.run(steps, run_step, max_concurrency):
+                answers[index] = answer
+                yield {"type": "tool_result", "agent": steps[index][1].target, "name": steps[index][1].route,
+                       "response": {"question": steps[index][0], "answer": answer}}
+            final_response = await compose_async(content, steps, answers, user_id=user_id)
+            router_stats.record("fanout", (time.monotonic() - started) * 1000)
+            if cache:
+                await cache.store(content, final_response, started)
+            yield {"type": "final", "agent": composer_agent.name, "text": final_response}
+            return
+
+        if decision.target != supervisor.name:
+            yield {"type": "transfer", "from": "router", "to": decision.route}
+        if decision.tool:
+            yield {"type": "tool_call", "agent": "router", "name": decision.tool, "args": decision.tool_args}
+            reply = await call_direct_tool(decision)
+            if reply:
+                yield {"type": "tool_result", "agent": "router", "name": decision.tool, "response": {"status": "success", "report": reply}}
+                record_route(decision, started)
+                yield {"type": "final", "agent": "router", "text": reply}
+                return
+            decision.tool = None
+
+        question = content
+        content = types.Content(role='user', parts=[types.Part(text=content)])
+        session_id = session_id or await session_manager.acquire(user_id)
+        run_config = RunConfig(streaming_mode=StreamingMode.SSE)
+        async with session_manager.lock(session_id):
+            events = tracing.observe_events(
+                runners[decision.target].run_async(user_id=user_id, session_id=session_id, new_message=content, run_config=run_config)
+            )
+            async with aclosing(events):
+                async for event in events:
+                    for message in describe_event(event):
+                        yield message
+                    if event.is_final_response():
+                        final_response = None
+                        if event.content and event.content.parts:
+                            final_response = event.content.parts[0].text
+                        if not final_response:
+                            raise ValueError("Empty response from agent")
+                        record_route(decision, started)
+                        if cache:
+                            await cache.store(question, final_response, started)
+                        yield {"type": "final", "agent": event.author, "text": final_response}
+                        break  # Stop at the first final response, like llm_call
@@ -0,0 +1,200 @@
+# agent_service/graph/context_budget.py
+import json
+import logging
+import os
+from typing import Dict, Optional
+
+from core.metrics import registry
+from core import tracing
+
+logging.basicConfig(level=logging.INFO)
+
+# Configuration
+PROMPT_STYLE = os.getenv("PROMPT_STYLE", "compact")  # "compact" or "full" agent instructions
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "tiktoken")  # "tiktoken" or "chars" (4 characters per token)
+CONTEXT_HISTORY_TOKENS = int(os.getenv("CONTEXT_HISTORY_TOKENS", "1024"))  # earlier turns sent with each model call
+CONTEXT_STALE_PART_TOKENS = int(os.getenv("CONTEXT_STALE_PART_TOKENS", "120"))  # per message or tool result of an earlier turn
+TOOL_OUTPUT_TOKENS_DEFAULT = int(os.getenv("TOOL_OUTPUT_TOKENS_DEFAULT", "300"))
+# Per-tool budget for a result handed to the model, as "tool=tokens,..."
+TOOL_OUTPUT_TOKENS = os.getenv("TOOL_OUTPUT_TOKENS", "retrieve_information=450,check_calendar=250,get_weather_report=80")
+# Metadata of retrieved passages worth its tokens
+KEPT_METADATA = ("source", "title")
+
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+prompt_tokens = registry.histogram("agent_prompt_tokens", "Prompt size of each model call by agent and part (estimated)",
+                                   ("agent", "part"), buckets=TOKEN_BUCKETS)
+tool_output_trimmed_total = registry.counter("agent_tool_output_trimmed_total", "Tool results cut to their token budget",
+                                             ("tool",))
+
+
+def parse_budgets(value: str) -> Dict[str, int]:
+    budgets = {}
+    for pair in filter(None, (part.strip() for part in value.split(","))):
+        name, _, tokens = pair.partition("=")
+        budgets[name.strip()] = int(tokens)
+    return budgets
+
+
+tool_budgets = parse_budgets(TOOL_OUTPUT_TOKENS)
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count of `text`.
+
+    Uses the cl100k BPE that ships with LiteLLM (no download); Llama 3 and Qwen 2.5 tokenizers
+    are built on a superset of it, so counts land close to what Ollama reports.
+    """
+    global _encoding
+    if not text:
+        return 0
+    if CONTEXT_TOKENIZER == "tiktoken":
+        if _encoding is None:
+            try:
+                import litellm
+                _encoding = litellm.encode
+            except Exception as e:
+                logging.warning(f"[context] No tokenizer available, estimating from characters: {e}")
+                _encoding = False
+        if _encoding:
+            return len(_encoding(model="", text=text))
+    return max(1, len(text) // 4)
+
+
+def truncate(text: str, tokens: int) -> str:
+    """Cuts `text` to about `tokens` tokens at a word boundary."""
+    if count_tokens(text) <= tokens:
+        return text
+    # Characters per token of this text, so the cut lands near the budget in one pass
+    chars = int(len(text) * tokens / count_tokens(text))
+    return text[:chars].rsplit(" ", 1)[0] + " ..."
+
+
+def part_tokens(part) -> int:
+    if getattr(part, "text", None):
+        return count_tokens(part.text)
+    if getattr(part, "function_call", None):
+        return count_tokens(part.function_call.name) + count_tokens(json.dumps(part.function_call.args or {}, default=str))
+    if getattr(part, "function_response", None):
+        return count_tokens(json.dumps(part.function_response.response or {}, default=str))
+    return 0
+
+
+def content_tokens(content) -> int:
+    return sum(part_tokens(part) for part in (content.parts or []))
+
+
+def is_question(content) -> bool:
+    """A message typed by the user (not a tool result, and not another agent's output relayed as context)."""
+    return content.role == "user" and any(
+        getattr(part, "text", None) and not part.text.startswith("For context:") for part in (content.parts or [])
+    ) and not any(getattr(part, "function_response", None) for part in (content.parts or []))
+
+
+def compact_part(part):
+    """A shorter copy of a long message or tool result from an earlier turn; short parts are kept as they are."""
+    from google.genai import types
+    if part_tokens(part) <= CONTEXT_STALE_PART_TOKENS:
+        return part
+    if getattr(part, "text", None):
+        return types.Part(text=truncate(part.text, CONTEXT_STALE_PART_TOKENS))
+    if getattr(part, "function_response", None):
+        response = part.function_response
+        text = truncate(json.dumps(response.response or {}, default=str), CONTEXT_STALE_PART_TOKENS)
+        return types.Part(function_response=types.FunctionResponse(id=response.id, name=response.name,
+                                                                   response={"result": text}))
+    return part
+
+
+def compact_tool_descriptions(config):
+    """Tool descriptions come from whole docstrings; the model only needs their first paragraph."""
+    for tool in getattr(config, "tools", None) or []:
+        for declaration in getattr(tool, "function_declarations", None) or []:
+            if declaration.description:
+                declaration.description = declaration.description.strip().split("\n\n", 1)[0]
+
+
+def fit_request(callback_context, llm_request):
+    """before_model_callback that keeps earlier turns within CONTEXT_HISTORY_TOKENS and measures the prompt.
+
+    Runs after `trim_history`. Earlier turns (everything before the latest user question) have
+    their long messages and tool results shortened; the current turn is sent untouched. With
+    compact prompts, tool descriptions are cut to their first paragraph. The estimated prompt
+    size is recorded per agent and part (instruction, tools, history, turn).
+    """
+    from google.genai import types
+    contents = llm_request.contents or []
+    current = next((index for index in range(len(contents) - 1, -1, -1) if is_question(contents[index])), 0)
+    history = []
+    for content in contents[:current]:
+        parts = [compact_part(part) for part in (content.parts or [])]
+        if any(new is not old for new, old in zip(parts, content.parts or [])):
+            content = types.Content(role=content.role, parts=parts)
+        history.append(content)
+
+    # Oldest earlier turns go first when they still exceed the budget
+    history_tokens = [content_tokens(content) for content in history]
+    while history and sum(history_tokens) > CONTEXT_HISTORY_TOKENS:
+        history.pop(0)
+        history_tokens.pop(0)
+    # Earlier turns start at a question, never at a tool result cut off from its call
+    while history and not is_question(history[0]):
+        history.pop(0)
+        history_tokens.pop(0)
+    llm_request.contents = history + contents[current:]
+
+    agent = callback_context.agent_name
+    config = llm_request.config
+    if PROMPT_STYLE == "compact":
+        compact_tool_descriptions(config)
+    sizes = {
+        "instruction": count_tokens(str(getattr(config, "system_instruction", None) or "")),
+        "tools": count_tokens(json.dumps([tool.model_dump(exclude_none=True) for tool in (getattr(config, "tools", None) or [])],
+                                         default=str)),
+        "history": sum(history_tokens),
+        "turn": sum(content_tokens(content) for content in contents[current:]),
+    }
+    sizes["total"] = sum(sizes.values())
+    for part, tokens in sizes.items():
+        prompt_tokens.observe(tokens, agent=agent, part=part)
+    trace = tracing.current_trace()
+    if trace is not None:
+        trace.prompt_estimate += sizes["total"]
+    logging.debug(f"[context] {agent} prompt ~{sizes['total']} tokens {sizes}")
+    return None
+
+
+def trim_results(results: list, budget: int) -> list:
+    """Retrieved passages with only useful metadata, each cut to an equal share of `budget` tokens.
+
+    The passages were picked for relevance and diversity, so every one keeps a share rather
+    than the first few taking the whole budget.
+    """
+    share = budget // max(1, len(results))
+    trimmed = []
+    for result in results:
+        if isinstance(result, dict):
+            result = dict(result)
+            if isinstance(result.get("metadata"), dict):
+                result["metadata"] = {key: value for key, value in result["metadata"].items() if key in KEPT_METADATA}
+            overhead = count_tokens(json.dumps(result.get("metadata") or {}, default=str)) + 8
+            result["content"] = truncate(str(result.get("content", "")), max(32, share - overhead))
+        trimmed.append(result)
+    return trimmed
+
+
+def trim_tool_output(tool, args, tool_context, tool_response) -> Optional[dict]:
+    """after_tool_callback that cuts a tool result to the tool's budget before the model reads it."""
+    if not isinstance(tool_response, dict):
+        return None
+    budget = tool_budgets.get(tool.name, TOOL_OUTPUT_TOKENS_DEFAULT)
+    if count_tokens(json.dumps(tool_response, default=str)) <= budget:
+        return None
+    trimmed = dict(tool_response)
+    if isinstance(trimmed.get("results"), list):
+        trimmed["results"] = trim_results(trimmed["results"], budget)
+    for key, value in trimmed.items():
+        if isinstance(value, str):
+            trimmed[key] = truncate(value, budget)
+    tool_output_trimmed_total.inc(tool=tool.name)
+    return trimmed
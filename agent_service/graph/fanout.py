@@ -0,0 +1,84 @@
+# agent_service/graph/fanout.py
+import asyncio
+import logging
+import os
+import re
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from graph.router import IntentRouter, RouteDecision
+
+logging.basicConfig(level=logging.INFO)
+
+# Configuration
+FANOUT_ENABLED = os.getenv("FANOUT_ENABLED", "true").lower() == "true"
+FANOUT_MAX_CONCURRENCY = int(os.getenv("FANOUT_MAX_CONCURRENCY", "3"))
+FANOUT_MAX_PARTS = int(os.getenv("FANOUT_MAX_PARTS", "5"))
+FANOUT_COMPOSE = os.getenv("FANOUT_COMPOSE", "llm")  # "llm" or "join"
+
+# Sub-question boundaries: '?', ';', new lines, ", and", " and ", and commas between clauses
+SPLIT_PATTERN = re.compile(r"\?|;|\n|,?\s+\band\b\s+|,\s+(?=\w)", re.I)
+
+compose_prompt = """You are a response composer. You receive a user's question and the answers to each of its parts.
+1. Merge the answers into ONE clear, concise reply addressing every part, in the order they were asked.
+2. Use ONLY the information in the provided answers. DO NOT add facts of your own.
+3. If an answer says the information is not available, say so for that part.
+"""
+
+
+async def plan(text: str, router: IntentRouter) -> Optional[List[Tuple[str, RouteDecision]]]:
+    """Splits a multi-intent question into sub-questions that each have exactly one confident route.
+
+    Returns None when the question cannot be split that way, in which case the supervisor handles it.
+    """
+    if not FANOUT_ENABLED:
+        return None
+    parts = [part.strip(" ,.") for part in SPLIT_PATTERN.split(text)]
+    parts = [part for part in parts if part]
+    if len(parts) < 2 or len(parts) > FANOUT_MAX_PARTS:
+        return None
+    if router.use_embeddings:
+        # Embedding classification calls Ollama: classify the parts concurrently, off the event loop
+        decisions = await asyncio.gather(*(asyncio.to_thread(router.classify, part) for part in parts))
+    else:
+        decisions = [router.classify(part) for part in parts]
+    steps = list(zip(parts, decisions))
+    if any(decision.target == "supervisor_agent" for _, decision in steps):
+        return None
+    return steps
+
+
+async def run(steps: List[Tuple[str, RouteDecision]], run_step: Callable[[str, RouteDecision], Awaitable[str]],
+              max_concurrency: int = FANOUT_MAX_CONCURRENCY):
+    """Runs every sub-question concurrently (at most `max_concurrency` at once).
+
+    Yields (index, answer) in completion order; a failed sub-run yields an explanatory answer
+    instead of failing the whole question.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run_one(index: int, part: str, decision: RouteDecision):
+        async with semaphore:
+            try:
+                return index, await run_step(part, decision)
+            except Exception as e:
+                logging.error(f"[fanout] Sub-question '{part}' on {decision.route} failed: {e}")
+                return index, f"Could not answer '{part}'."
+
+    tasks = [asyncio.create_task(run_one(index, part, decision)) for index, (part, decision) in enumerate(steps)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def compose_request(question: str, steps: List[Tuple[str, RouteDecision]], answers: List[str]) -> str:
+    lines = [f"Question: {question}", ""]
+    for (part, _), answer in zip(steps, answers):
+        lines.append(f"- {part}: {answer}")
+    return "\n".join(lines)
+
+
+def join_answers(answers: List[str]) -> str:
+    return "\n\n".join(answer.strip() for answer in answers)
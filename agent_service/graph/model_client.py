@@ -0,0 +1,111 @@
+# agent_service/graph/model_client.py
+import asyncio
+import logging
+import os
+
+import httpx
+import litellm
+from dotenv import load_dotenv
+from google.adk.models.lite_llm import LiteLlm
+
+from graph.model_pool import PooledLiteLLMClient, agent_models, model_pool
+
+logging.basicConfig(level=logging.INFO)
+load_dotenv()
+
+# Configuration
+MODEL = os.getenv("MODEL")
+MODEL_DEBUG = os.getenv("MODEL_DEBUG", "false").lower() == "true"
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # a negative duration ("-1m") never unloads
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+ROUTING_NUM_PREDICT = int(os.getenv("ROUTING_NUM_PREDICT", "128"))  # supervisor turns only emit a transfer call
+ANSWER_NUM_PREDICT = int(os.getenv("ANSWER_NUM_PREDICT", "512"))
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() == "true"
+MODEL_TIMEOUT_SECONDS = float(os.getenv("MODEL_TIMEOUT_SECONDS", "120"))
+MODEL_HTTP_MAX_CONNECTIONS = int(os.getenv("MODEL_HTTP_MAX_CONNECTIONS", "32"))
+
+# Generation parameters per kind of turn
+PROFILES = {
+    "routing": {"num_predict": ROUTING_NUM_PREDICT},
+    "answer": {"num_predict": ANSWER_NUM_PREDICT},
+}
+
+
+def configure_logging():
+    """Payload logging is synchronous and runs on every call, so it is opt-in through MODEL_DEBUG."""
+    if MODEL_DEBUG:
+        litellm._turn_on_debug()
+        return
+    litellm.suppress_debug_info = True
+    litellm.set_verbose = False
+    for name in ("LiteLLM", "LiteLLM Router", "LiteLLM Proxy", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+
+def build_model(profile: str = "answer", agent: str = None) -> LiteLlm:
+    """A LiteLlm client for `profile` that keeps the model resident and caps the context and reply size.
+
+    Requests go through the model pool, to whichever endpoint serving the agent's model
+    (AGENT_MODELS, default MODEL) has the fewest requests in flight.
+    """
+    model = agent_models.get(agent, MODEL)
+    return LiteLlm(
+        model="ollama_chat/" + model,
+        llm_client=PooledLiteLLMClient(model_pool, model),
+        keep_alive=OLLAMA_KEEP_ALIVE,
+        num_ctx=OLLAMA_NUM_CTX,
+        timeout=MODEL_TIMEOUT_SECONDS,
+        **PROFILES[profile],
+    )
+
+
+def install_http_session():
+    """Gives LiteLLM one pooled keep-alive client to Ollama instead of a connection per call.
+
+    The async client binds its connections to the running loop, so this is called from the
+    server's startup hook rather than at import (the blocking `llm_call` wrapper runs its own loop).
+    """
+    if litellm.aclient_session is not None:
+        return
+    limits = httpx.Limits(max_connections=MODEL_HTTP_MAX_CONNECTIONS, max_keepalive_connections=MODEL_HTTP_MAX_CONNECTIONS)
+    timeout = httpx.Timeout(MODEL_TIMEOUT_SECONDS, connect=5.0)
+    litellm.aclient_session = httpx.AsyncClient(limits=limits, timeout=timeout)
+    litellm.client_session = httpx.Client(limits=limits, timeout=timeout)
+
+
+async def close_http_session():
+    if litellm.aclient_session is not None:
+        await litellm.aclient_session.aclose()
+        litellm.aclient_session = None
+    if litellm.client_session is not None:
+        litellm.client_session.close()
+        litellm.client_session = None
+
+
+async def warm_model():
+    """Loads each endpoint's model into Ollama and pins it for OLLAMA_KEEP_ALIVE, so the first request skips the load.
+
+    Raises if some model could not be loaded on any of its endpoints.
+    """
+    if not MODEL_WARMUP:
+        return
+
+    async def warm(client: httpx.AsyncClient, endpoint):
+        # A generate request without a prompt only loads the model
+        try:
+            response = await client.post(
+                f"{endpoint.url}/api/generate",
+                json={"model": endpoint.model, "keep_alive": OLLAMA_KEEP_ALIVE, "options": {"num_ctx": OLLAMA_NUM_CTX}},
+            )
+            response.raise_for_status()
+        except Exception as e:
+            logging.warning(f"[model] Could not load {endpoint.model} on {endpoint.url}: {e}")
+            return None
+        logging.info(f"[model] {endpoint.model} loaded on {endpoint.url} (keep_alive={OLLAMA_KEEP_ALIVE})")
+        return endpoint.model
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(MODEL_TIMEOUT_SECONDS, connect=5.0)) as client:
+        loaded = set(await asyncio.gather(*(warm(client, endpoint) for endpoint in model_pool.endpoints)))
+    missing = [model for model in model_pool.models() if model not in loaded]
+    if missing:
+        raise RuntimeError(f"No endpoint could load {', '.join(missing)}")
@@ -0,0 +1,242 @@
+# agent_service/graph/model_pool.py
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+import litellm
+from dotenv import load_dotenv
+from google.adk.models.lite_llm import LiteLLMClient
+
+from core import scheduler
+from core.metrics import registry
+from core.shared_state import WORKERS
+
+logging.basicConfig(level=logging.INFO)
+load_dotenv()
+
+# Configuration
+# Comma-separated "url=model" pairs, e.g. "http://ollama_server:11434=llama3.1:8b,http://ollama_server_lite:11434=llama3.2:1b";
+# a server that serves several models is listed once per model
+OLLAMA_ENDPOINTS = os.getenv("OLLAMA_ENDPOINTS", f"{os.getenv('BASE_URL')}={os.getenv('MODEL')}")
+# Comma-separated "agent=model" pairs; agents not listed use MODEL
+AGENT_MODELS = os.getenv("AGENT_MODELS", "")
+POOL_HEALTH_INTERVAL = float(os.getenv("POOL_HEALTH_INTERVAL", "15"))
+POOL_EJECT_SECONDS = float(os.getenv("POOL_EJECT_SECONDS", "30"))
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))  # as set on the Ollama servers; sizes the scheduler
+
+# Failures that mean the endpoint, not the request, is the problem; these are retried elsewhere
+RETRYABLE_ERRORS = (litellm.APIConnectionError, litellm.ServiceUnavailableError, httpx.TransportError)
+
+
+def parse_pairs(value: str) -> Dict[str, str]:
+    pairs = {}
+    for item in value.split(","):
+        if "=" in item:
+            key, _, model = item.strip().partition("=")
+            pairs[key.strip()] = model.strip()
+    return pairs
+
+
+def parse_endpoints(value: str) -> List[Tuple[str, str]]:
+    """(url, model) pairs in order, without duplicates; one url may appear with several models."""
+    endpoints = []
+    for item in value.split(","):
+        url, sep, model = item.strip().partition("=")
+        if sep and (url.strip(), model.strip()) not in endpoints:
+            endpoints.append((url.strip(), model.strip()))
+    return endpoints
+
+
+class Endpoint:
+    def __init__(self, url: str, model: str):
+        self.url = url.rstrip("/")
+        self.model = model
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.healthy = True
+        self.ejected_until = 0.0
+        self.last_error = None
+
+    @property
+    def available(self) -> bool:
+        # An ejected endpoint gets traffic again once its ejection expires, even before a health check
+        return self.healthy or time.monotonic() >= self.ejected_until
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "model": self.model,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class ModelPool:
+    """Ollama endpoints grouped by model, picked by least outstanding requests.
+
+    Endpoints that fail to connect are ejected for POOL_EJECT_SECONDS; a background
+    health check against /api/tags ejects and restores them between requests.
+    """
+
+    def __init__(self, endpoints: List[Tuple[str, str]] = None):
+        endpoints = parse_endpoints(OLLAMA_ENDPOINTS) if endpoints is None else endpoints
+        self.endpoints = [Endpoint(url, model) for url, model in endpoints]
+        self._health_task: Optional[asyncio.Task] = None
+        if not self.endpoints:
+            raise ValueError("OLLAMA_ENDPOINTS does not list any url=model pair")
+
+    def models(self) -> List[str]:
+        return sorted({endpoint.model for endpoint in self.endpoints})
+
+    def pick(self, model: str, exclude=()) -> Endpoint:
+        serving = [endpoint for endpoint in self.endpoints if endpoint.model == model and endpoint not in exclude]
+        if not serving:
+            raise ValueError(f"No Ollama endpoint left for model '{model}'")
+        # With every endpoint ejected, trying one beats failing outright
+        candidates = [endpoint for endpoint in serving if endpoint.available] or serving
+        return min(candidates, key=lambda endpoint: (endpoint.outstanding, endpoint.requests))
+
+    def eject(self, endpoint: Endpoint, error: Exception):
+        endpoint.failures += 1
+        endpoint.healthy = False
+        endpoint.ejected_until = time.monotonic() + POOL_EJECT_SECONDS
+        endpoint.last_error = str(error)[:200]
+        logging.warning(f"[model_pool] Ejecting {endpoint.url} for {POOL_EJECT_SECONDS:.0f}s: {error}")
+
+    async def check(self, client: httpx.AsyncClient, endpoint: Endpoint):
+        try:
+            response = await client.get(f"{endpoint.url}/api/tags")
+            response.raise_for_status()
+            names = {model["name"] for model in response.json().get("models", [])}
+            if endpoint.model not in names and f"{endpoint.model}:latest" not in names:
+                raise ValueError(f"model {endpoint.model} is not pulled")
+        except Exception as e:
+            if endpoint.healthy:
+                self.eject(endpoint, e)
+            return
+        if not endpoint.healthy:
+            logging.info(f"[model_pool] {endpoint.url} is healthy again")
+        endpoint.healthy = True
+        endpoint.last_error = None
+
+    async def check_all(self):
+        async with httpx.AsyncClient(timeout=httpx.Timeout(5.0)) as client:
+            await asyncio.gather(*(self.check(client, endpoint) for endpoint in self.endpoints))
+
+    async def _health_loop(self):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(POOL_HEALTH_INTERVAL)
+
+    def start_health_checks(self):
+        if self._health_task is None and POOL_HEALTH_INTERVAL > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop_health_checks(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    def scheduler(self, model: str) -> Optional[scheduler.ModelScheduler]:
+        """Queue in front of `model`, with as many slots as its endpoints generate in parallel."""
+        capacity = OLLAMA_NUM_PARALLEL * sum(1 for endpoint in self.endpoints if endpoint.model == model)
+        return scheduler.scheduler_for(model, capacity, WORKERS)
+
+    def stats(self) -> dict:
+        return {"endpoints": [endpoint.stats() for endpoint in self.endpoints], "scheduler": scheduler.stats()}
+
+
+class PooledLiteLLMClient(LiteLLMClient):
+    """LiteLLM client that sends each completion to the least busy healthy endpoint serving `model`.
+
+    Completions first wait for their turn in the model's scheduler (priority, per-user fairness,
+    quotas); the slot is held until the reply, or the last chunk of a streamed one, arrives.
+    """
+
+    def __init__(self, pool: ModelPool, model: str):
+        self.pool = pool
+        self.model = model
+        self.scheduler = pool.scheduler(model)
+
+    async def acompletion(self, model, messages, tools, **kwargs):
+        if self.scheduler is None:
+            return await self._acompletion(messages, tools, **kwargs)
+        await self.scheduler.acquire()
+        try:
+            response = await self._acompletion(messages, tools, **kwargs)
+        except BaseException:
+            self.scheduler.release()
+            raise
+        if kwargs.get("stream"):
+            return self._release_after(response, release=self.scheduler.release)
+        self.scheduler.release()
+        return response
+
+    async def _acompletion(self, messages, tools, **kwargs):
+        tried = []
+        while True:
+            endpoint = self.pool.pick(self.model, exclude=tried)
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            kwargs["api_base"] = endpoint.url
+            try:
+                response = await super().acompletion("ollama_chat/" + endpoint.model, messages, tools, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                endpoint.outstanding -= 1
+                self.pool.eject(endpoint, e)
+                tried.append(endpoint)
+                if len(tried) >= sum(1 for candidate in self.pool.endpoints if candidate.model == self.model):
+                    raise
+                continue
+            except Exception:
+                endpoint.outstanding -= 1
+                raise
+            if kwargs.get("stream"):
+                return self._release_after(response, endpoint=endpoint)
+            endpoint.outstanding -= 1
+            return response
+
+    @staticmethod
+    async def _release_after(stream, endpoint: Endpoint = None, release=None):
+        # A streamed reply keeps the endpoint (and its scheduler slot) busy until its last chunk
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            if endpoint is not None:
+                endpoint.outstanding -= 1
+            if release is not None:
+                release()
+
+
+def check_agent_models(agent_names: Iterable[str]):
+    """Fails startup on an AGENT_MODELS entry for an unknown agent or a model no endpoint serves,
+    instead of leaving the agent on MODEL or failing its first call."""
+    problems = [f"'{agent}' is not an agent" for agent in agent_models if agent not in set(agent_names)]
+    problems += [f"{agent}'s model '{model}' is not in OLLAMA_ENDPOINTS" for agent, model in agent_models.items()
+                 if model not in model_pool.models()]
+    unlisted = [agent for agent in agent_names if agent not in agent_models]
+    if unlisted and os.getenv("MODEL") not in model_pool.models():
+        problems.append(f"{', '.join(unlisted)} use MODEL '{os.getenv('MODEL')}', which is not in OLLAMA_ENDPOINTS")
+    if problems:
+        raise ValueError(f"Invalid AGENT_MODELS: {'; '.join(problems)} (endpoints serve {', '.join(model_pool.models())})")
+
+
+model_pool = ModelPool()
+agent_models = parse_pairs(AGENT_MODELS)
+
+registry.gauge("agent_model_requests_in_flight", "Model calls in flight per Ollama endpoint", ("endpoint", "model"),
+               source=lambda: {(endpoint.url, endpoint.model): endpoint.outstanding for endpoint in model_pool.endpoints})
+registry.gauge("agent_model_endpoint_healthy", "1 when the endpoint passes health checks", ("endpoint", "model"),
+               source=lambda: {(endpoint.url, endpoint.model): int(endpoint.healthy) for endpoint in model_pool.endpoints})
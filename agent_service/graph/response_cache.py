@@ -0,0 +1,304 @@
+# agent_service/graph/response_cache.py
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from core.shared_state import MULTI_WORKER, connect
+
+logging.basicConfig(level=logging.INFO)
+
+# Configuration
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_SEMANTIC = os.getenv("CACHE_SEMANTIC", "true").lower() == "true"
+CACHE_SIMILARITY = float(os.getenv("CACHE_SIMILARITY", "0.95"))
+# Only intents whose answers do not hinge on a single word (a city, a day) use the semantic tier
+CACHE_SEMANTIC_INTENTS = set(os.getenv("CACHE_SEMANTIC_INTENTS", "documents").split(","))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "./response_cache.db")  # empty to keep the cache in memory only
+# Serve from the database rather than a per-process copy, so every worker sees every entry and every clear
+CACHE_SHARED = os.getenv("CACHE_SHARED", str(MULTI_WORKER)).lower() == "true"
+CACHE_TTL_WEATHER = float(os.getenv("CACHE_TTL_WEATHER", "600"))
+CACHE_TTL_DOCUMENTS = float(os.getenv("CACHE_TTL_DOCUMENTS", str(7 * 24 * 3600)))
+CACHE_TTL_DEFAULT = float(os.getenv("CACHE_TTL_DEFAULT", "600"))
+MODEL = os.getenv("MODEL")
+EMBEDDING_MODEL = os.getenv("MODEL")
+OLLAMA_SERVER_URL = os.getenv("BASE_URL")
+
+# Routes whose answers depend on who is asking
+PER_USER_INTENTS = {"calendar"}
+
+NORMALIZE_PATTERN = re.compile(r"[^\w\s]")
+# Words that lean on earlier turns ("what about there?", "and tomorrow?")
+FOLLOW_UP_PATTERN = re.compile(
+    r"^\s*(?:and|but|what about|how about)\b|\b(?:that|there|then|those|these|them|same|again|instead|else|"
+    r"previous|earlier|above)\b",
+    re.I,
+)
+
+
+def normalize(text: str) -> str:
+    return " ".join(NORMALIZE_PATTERN.sub(" ", text.lower()).split())
+
+
+def stands_alone(text: str) -> bool:
+    """True when a question does not point back at the conversation it is asked in."""
+    return not FOLLOW_UP_PATTERN.search(text)
+
+
+def seconds_until_midnight() -> float:
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return (midnight - now).total_seconds()
+
+
+def ttl_for(intents: List[Optional[str]]) -> float:
+    """Shortest TTL among the intents an answer depends on."""
+    ttls = []
+    for intent in intents:
+        if intent == "weather":
+            ttls.append(CACHE_TTL_WEATHER)
+        elif intent == "calendar":
+            ttls.append(seconds_until_midnight())
+        elif intent == "documents":
+            ttls.append(CACHE_TTL_DOCUMENTS)
+        else:
+            ttls.append(CACHE_TTL_DEFAULT)
+    return min(ttls) if ttls else CACHE_TTL_DEFAULT
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    scope: str
+    reply: str
+    expires_at: float
+    latency_ms: float
+    vector: Optional[np.ndarray] = None
+
+
+class ResponseCache:
+    """Two-tier reply cache: exact normalized-text matches, then embedding similarity.
+
+    Entries are grouped into scopes (model, date, route, routed tool arguments and, for
+    per-user intents, the user). Semantic matches are only looked up within a scope, so
+    "weather in Pune" can never be served the answer for "weather in Mumbai".
+
+    In shared mode the SQLite file is the only copy: lookups read it directly, so entries
+    stored or cleared by one worker process are seen by all of them.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, db_path: str = CACHE_DB_PATH,
+                 semantic: bool = CACHE_SEMANTIC, similarity: float = CACHE_SIMILARITY, shared: bool = CACHE_SHARED):
+        self.max_entries = max_entries
+        self.semantic = semantic
+        self.similarity = similarity
+        self.shared = shared and bool(db_path)
+        if shared and not db_path:
+            logging.warning("[cache] CACHE_SHARED needs CACHE_DB_PATH; each worker keeps its own cache")
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._scopes: Dict[str, Dict[str, CacheEntry]] = {}
+        self._embeddings = None
+        self._lock = threading.Lock()
+        self._db = self._open_db(db_path) if db_path else None
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+        self.latency_saved_ms = 0.0
+
+    def _open_db(self, db_path: str):
+        db = connect(db_path)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, scope TEXT, reply TEXT, "
+            "expires_at REAL, latency_ms REAL, vector BLOB)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope)")
+        db.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+        db.commit()
+        if self.shared:
+            logging.info(f"[cache] Sharing cached responses through {db_path}")
+            return db
+        rows = db.execute(
+            "SELECT key, scope, reply, expires_at, latency_ms, vector FROM responses ORDER BY expires_at DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for key, scope, reply, expires_at, latency_ms, vector in reversed(rows):
+            vector = np.frombuffer(vector, dtype=np.float32) if vector else None
+            self._insert(CacheEntry(key, scope, reply, expires_at, latency_ms, vector))
+        logging.info(f"[cache] Loaded {len(rows)} cached responses from {db_path}")
+        return db
+
+    def scope_for(self, route: str, intents: List[Optional[str]], tool_args: dict, user_id: str) -> str:
+        parts = [MODEL or "", date.today().isoformat(), route, json.dumps(tool_args or {}, sort_keys=True).lower()]
+        # An answer of unknown intent may hold anything, the user's own data included
+        if None in intents or PER_USER_INTENTS.intersection(intents):
+            parts.append(user_id)
+        return "|".join(parts)
+
+    def allows_semantic(self, intents: List[Optional[str]]) -> bool:
+        return self.semantic and bool(intents) and all(intent in CACHE_SEMANTIC_INTENTS for intent in intents)
+
+    def _embed(self, text: str) -> np.ndarray:
+        if self._embeddings is None:
+            from langchain_ollama import OllamaEmbeddings
+            self._embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL, base_url=OLLAMA_SERVER_URL)
+        vector = np.asarray(self._embeddings.embed_query(text), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    async def _run(self, step, *args):
+        """Runs a cache step, off the event loop when it touches SQLite: in shared mode a write can
+        wait up to the busy timeout for another worker's lock."""
+        if self._db is None:
+            return step(*args)
+        return await asyncio.to_thread(step, *args)
+
+    async def lookup(self, text: str, scope: str, semantic: bool = True) -> Optional[str]:
+        """Returns a cached reply for this question, or None on a miss."""
+        reply, candidates = await self._run(self._lookup_exact, f"{scope}|{normalize(text)}", scope, semantic)
+        if reply is not None:
+            return reply
+
+        if semantic and candidates:
+            try:
+                vector = await asyncio.to_thread(self._embed, normalize(text))
+            except Exception as e:
+                logging.warning(f"[cache] Embedding lookup failed: {e}")
+                vector = None
+            if vector is not None:
+                scores = np.stack([candidate.vector for candidate in candidates]) @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    entry = candidates[best]
+                    with self._lock:
+                        self.hits_semantic += 1
+                        self.latency_saved_ms += entry.latency_ms
+                    return entry.reply
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _lookup_exact(self, key: str, scope: str, semantic: bool):
+        """(reply, None) on an exact hit, else (None, the scope's semantic candidates)."""
+        now = time.time()
+        with self._lock:
+            entry = self._shared_entry(key, now) if self.shared else self._entries.get(key)
+            if entry is not None and entry.expires_at < now:
+                self._remove(key)
+                if self._db is not None:
+                    self._db.commit()
+                entry = None
+            if entry is not None:
+                if not self.shared:
+                    self._entries.move_to_end(key)
+                self.hits_exact += 1
+                self.latency_saved_ms += entry.latency_ms
+                return entry.reply, None
+            if self.shared:
+                return None, self._shared_candidates(scope, now) if semantic else []
+            return None, [e for e in self._scopes.get(scope, {}).values() if e.vector is not None and e.expires_at >= now]
+
+    async def store(self, text: str, scope: str, reply: str, ttl: float, latency_ms: float, semantic: bool = True):
+        if ttl <= 0:
+            return
+        normalized = normalize(text)
+        vector = None
+        if semantic:
+            try:
+                vector = await asyncio.to_thread(self._embed, normalized)
+            except Exception as e:
+                logging.warning(f"[cache] Could not embed question for the semantic tier: {e}")
+        entry = CacheEntry(f"{scope}|{normalized}", scope, reply, time.time() + ttl, latency_ms, vector)
+        await self._run(self._store_entry, entry)
+
+    def _store_entry(self, entry: CacheEntry):
+        with self._lock:
+            if not self.shared:
+                self._insert(entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                    (entry.key, entry.scope, entry.reply, entry.expires_at, entry.latency_ms,
+                     entry.vector.tobytes() if entry.vector is not None else None),
+                )
+                if self.shared:
+                    self._trim_shared()
+                self._db.commit()
+
+    def _shared_entry(self, key: str, now: float) -> Optional[CacheEntry]:
+        row = self._db.execute("SELECT scope, reply, expires_at, latency_ms FROM responses WHERE key = ?", (key,)).fetchone()
+        return CacheEntry(key, *row) if row else None
+
+    def _shared_candidates(self, scope: str, now: float) -> List[CacheEntry]:
+        rows = self._db.execute(
+            "SELECT key, reply, expires_at, latency_ms, vector FROM responses "
+            "WHERE scope = ? AND expires_at >= ? AND vector IS NOT NULL", (scope, now)).fetchall()
+        return [CacheEntry(key, scope, reply, expires_at, latency_ms, np.frombuffer(vector, dtype=np.float32))
+                for key, reply, expires_at, latency_ms, vector in rows]
+
+    def _trim_shared(self):
+        # Entries closest to expiry go first; there is no cross-process recency order to evict by
+        excess = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._db.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY expires_at LIMIT ?)",
+                             (excess,))
+
+    def _insert(self, entry: CacheEntry):
+        if entry.key in self._entries:
+            self._remove(entry.key)
+        self._entries[entry.key] = entry
+        self._scopes.setdefault(entry.scope, {})[entry.key] = entry
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        # The caller commits
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            if self.shared:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return
+        scope = self._scopes.get(entry.scope, {})
+        scope.pop(key, None)
+        if not scope:
+            self._scopes.pop(entry.scope, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    async def clear(self):
+        await self._run(self._clear)
+
+    def _clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits_exact + self.hits_semantic + self.misses
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] if self.shared else len(self._entries)
+            return {
+                "shared": self.shared,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits_exact": self.hits_exact,
+                "hits_semantic": self.hits_semantic,
+                "misses": self.misses,
+                "hit_rate": round((self.hits_exact + self.hits_semantic) / lookups, 4) if lookups else 0.0,
+                "latency_saved_ms": round(self.latency_saved_ms, 1),
+            }
+
+
+response_cache = ResponseCache() if CACHE_ENABLED else None
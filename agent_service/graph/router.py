@@ -0,0 +1,229 @@
+# agent_service/graph/router.py
+import logging
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from core.metrics import registry
+
+logging.basicConfig(level=logging.INFO)
+
+# Configuration
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+ROUTER_DIRECT_TOOLS = os.getenv("ROUTER_DIRECT_TOOLS", "true").lower() == "true"
+ROUTER_EMBEDDINGS = os.getenv("ROUTER_EMBEDDINGS", "false").lower() == "true"
+ROUTER_MIN_SIMILARITY = float(os.getenv("ROUTER_MIN_SIMILARITY", "0.75"))
+ROUTER_MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", "0.05"))
+ROUTER_MAX_DIRECT_WORDS = int(os.getenv("ROUTER_MAX_DIRECT_WORDS", "8"))
+EMBEDDING_MODEL = os.getenv("MODEL")
+OLLAMA_SERVER_URL = os.getenv("BASE_URL")
+
+# Intent name -> sub-agent that handles it
+INTENT_AGENTS = {
+    "weather": "weather_agent",
+    "calendar": "calendar_agent",
+    "documents": "retriever_agent",
+}
+
+INTENT_RULES = {
+    "weather": re.compile(r"\b(weather|temperature|forecast|rain\w*|humid\w*|sunny|cloudy|degrees?)\b", re.I),
+    "calendar": re.compile(r"\b(meetings?|calendar|schedul\w*|appointments?|agenda)\b", re.I),
+    "documents": re.compile(
+        r"\b(prompt\w*|few[- ]shot|zero[- ]shot|chain[- ]of[- ]thought|llms?|documents?|blogs?|retriev\w*)\b", re.I
+    ),
+}
+
+# Example utterances for the optional embedding-similarity classifier
+INTENT_EXAMPLES = {
+    "weather": [
+        "what is the weather in Mumbai",
+        "will it rain in Chennai today",
+        "how hot is it in Delhi",
+        "temperature in London in fahrenheit",
+    ],
+    "calendar": [
+        "what meetings do I have today",
+        "am I free this afternoon",
+        "show my schedule for today",
+        "do I have any appointments",
+    ],
+    "documents": [
+        "what is few-shot prompting",
+        "explain chain of thought prompting",
+        "how should I write a good prompt for an LLM",
+        "what does the blog say about prompt engineering",
+    ],
+}
+
+CITY_PATTERN = re.compile(
+    r"\b(?:weather|temperature|forecast|rain\w*)\b.*?\b(?:in|at|for|of)\s+([A-Za-z][A-Za-z .'-]*?)"
+    r"\s*(?:\b(?:today|now|right now|currently|in (?:celsius|fahrenheit))\b|[?.!,]|$)",
+    re.I,
+)
+FAHRENHEIT_PATTERN = re.compile(r"\bfahrenheit\b|°\s*f\b", re.I)
+NON_TODAY_PATTERN = re.compile(r"\b(tomorrow|yesterday|next|last|week|month|monday|tuesday|wednesday|thursday|friday|saturday|sunday|\d)\w*", re.I)
+
+
+route_total = registry.counter("agent_route_total", "Answered questions by route (sub-agent, direct tool, fanout or supervisor)",
+                               ("route",))
+route_seconds = registry.histogram("agent_route_seconds", "End-to-end latency of answered questions by route", ("route",))
+route_saved_seconds = registry.counter("agent_route_saved_seconds_total",
+                                       "Estimated latency saved by routing past the supervisor")
+
+
+@dataclass
+class RouteDecision:
+    """Where a query should go: a sub-agent, a direct tool call, or the supervisor."""
+    target: str                     # sub-agent name, or "supervisor_agent"
+    intent: Optional[str] = None
+    method: str = "fallback"        # "rules", "embeddings" or "fallback"
+    confidence: float = 0.0
+    tool: Optional[str] = None      # set when the query is trivial enough to skip the LLM
+    tool_args: Dict = field(default_factory=dict)
+
+    @property
+    def route(self) -> str:
+        return self.tool or self.target
+
+
+def cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class EmbeddingClassifier:
+    """Nearest-example intent classifier over locally served Ollama embeddings."""
+
+    def __init__(self, examples: Dict[str, List[str]] = INTENT_EXAMPLES):
+        self.examples = examples
+        self._vectors = None
+        self._lock = threading.Lock()
+        self._embeddings = None
+
+    def _load(self):
+        with self._lock:
+            if self._vectors is None:
+                from langchain_ollama import OllamaEmbeddings
+                self._embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL, base_url=OLLAMA_SERVER_URL)
+                self._vectors = {
+                    intent: self._embeddings.embed_documents(texts) for intent, texts in self.examples.items()
+                }
+                logging.info(f"[router] Embedded {sum(len(v) for v in self.examples.values())} example utterances")
+
+    def classify(self, text: str):
+        """Returns (intent, similarity, margin over the runner-up intent)."""
+        self._load()
+        query = self._embeddings.embed_query(text)
+        scores = sorted(
+            ((max(cosine(query, v) for v in vectors), intent) for intent, vectors in self._vectors.items()),
+            reverse=True,
+        )
+        best_score, best_intent = scores[0]
+        margin = best_score - scores[1][0] if len(scores) > 1 else best_score
+        return best_intent, best_score, margin
+
+
+class IntentRouter:
+    """Deterministic pre-router: keyword/regex rules first, then optionally embedding similarity."""
+
+    def __init__(self, enabled: bool = ROUTER_ENABLED, use_embeddings: bool = ROUTER_EMBEDDINGS,
+                 direct_tools: bool = ROUTER_DIRECT_TOOLS):
+        self.enabled = enabled
+        self.use_embeddings = use_embeddings
+        self.direct_tools = direct_tools
+        self.classifier = EmbeddingClassifier() if use_embeddings else None
+
+    def classify(self, text: str) -> RouteDecision:
+        if not self.enabled:
+            return RouteDecision(target="supervisor_agent")
+        matched = [intent for intent, pattern in INTENT_RULES.items() if pattern.search(text)]
+        if len(matched) > 1:
+            # Several intents in one question: the supervisor has to split it
+            return RouteDecision(target="supervisor_agent")
+        if len(matched) == 1:
+            decision = RouteDecision(target=INTENT_AGENTS[matched[0]], intent=matched[0], method="rules", confidence=1.0)
+        elif self.classifier:
+            try:
+                intent, score, margin = self.classifier.classify(text)
+            except Exception as e:
+                logging.warning(f"[router] Embedding classifier failed, using supervisor: {e}")
+                return RouteDecision(target="supervisor_agent")
+            if score < ROUTER_MIN_SIMILARITY or margin < ROUTER_MIN_MARGIN:
+                return RouteDecision(target="supervisor_agent", confidence=score)
+            decision = RouteDecision(target=INTENT_AGENTS[intent], intent=intent, method="embeddings", confidence=score)
+        else:
+            return RouteDecision(target="supervisor_agent")
+
+        if self.direct_tools and len(text.split()) <= ROUTER_MAX_DIRECT_WORDS:
+            self._add_direct_tool(decision, text)
+        return decision
+
+    def _add_direct_tool(self, decision: RouteDecision, text: str):
+        # The tools only know today (current weather, today's meetings); other days need the agent
+        if NON_TODAY_PATTERN.search(text):
+            return
+        if decision.intent == "weather":
+            match = CITY_PATTERN.search(text)
+            if match:
+                decision.tool = "get_weather_report"
+                decision.tool_args = {
+                    "city": match.group(1).strip(),
+                    "unit": "fahrenheit" if FAHRENHEIT_PATTERN.search(text) else "celsius",
+                }
+        elif decision.intent == "calendar":
+            decision.tool = "check_calendar"
+
+
+class RouterStats:
+    """Per-route hit counts and an estimate of the latency saved versus the supervisor path.
+
+    The same figures are exported to /metrics; the moving averages here only feed /info.
+    """
+
+    def __init__(self, smoothing: float = 0.1):
+        self.smoothing = smoothing
+        self.hits: Dict[str, int] = {}
+        self.latency_ms: Dict[str, float] = {}   # moving average per route
+        self.saved_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, route: str, elapsed_ms: float):
+        saved_ms = 0.0
+        with self._lock:
+            self.hits[route] = self.hits.get(route, 0) + 1
+            previous = self.latency_ms.get(route)
+            self.latency_ms[route] = elapsed_ms if previous is None else (
+                previous + self.smoothing * (elapsed_ms - previous)
+            )
+            baseline = self.latency_ms.get("supervisor_agent")
+            if route != "supervisor_agent" and baseline is not None:
+                saved_ms = max(0.0, baseline - elapsed_ms)
+                self.saved_ms += saved_ms
+        route_total.inc(route=route)
+        route_seconds.observe(elapsed_ms / 1000, route=route)
+        if saved_ms:
+            route_saved_seconds.inc(saved_ms / 1000)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = sum(self.hits.values())
+            return {
+                "total": total,
+                "routes": {
+                    route: {
+                        "hits": hits,
+                        "hit_rate": round(hits / total, 4),
+                        "avg_latency_ms": round(self.latency_ms[route], 1),
+                    }
+                    for route, hits in self.hits.items()
+                },
+                "latency_saved_ms": round(self.saved_ms, 1),
+            }
+
+
+router = IntentRouter()
+router_stats = RouterStats()
@@ -0,0 +1,248 @@
+# agent_service/graph/session_store.py
+import asyncio
+import inspect
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from core.shared_state import MULTI_WORKER, leases
+
+logging.basicConfig(level=logging.INFO)
+
+# Configuration
+# Worker processes only see each other's sessions through the database
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite" if MULTI_WORKER else "memory")  # "memory" or "sqlite"
+SESSION_DB_URL = os.getenv("SESSION_DB_URL", "sqlite+aiosqlite:///./sessions.db")  # ADK needs an async driver
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+SESSION_MAX_ACTIVE = int(os.getenv("SESSION_MAX_ACTIVE", "10000"))
+SESSION_MAX_HISTORY = int(os.getenv("SESSION_MAX_HISTORY", "12"))  # contents sent to the model per turn
+SESSION_SUMMARY_LINES = int(os.getenv("SESSION_SUMMARY_LINES", "8"))  # latest dropped messages quoted in the summary
+SUMMARY_SNIPPET_CHARS = 120
+
+
+async def maybe_await(result):
+    """Session services are sync in older ADK releases and async in newer ones."""
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+def build_session_service():
+    """In-process sessions by default; a SQLite database when sessions must survive restarts or be shared."""
+    if SESSION_BACKEND == "sqlite":
+        from google.adk.sessions import DatabaseSessionService
+        logging.info(f"[sessions] Using database session store at {SESSION_DB_URL}")
+        return DatabaseSessionService(db_url=SESSION_DB_URL)
+    if MULTI_WORKER:
+        logging.warning("[sessions] In-memory sessions with several workers: a user's history is split across workers")
+    from google.adk.sessions import InMemorySessionService
+    return InMemorySessionService()
+
+
+class SessionManager:
+    """Hands out one reusable ADK session per user, bounded by LRU size and idle TTL.
+
+    Session ids are derived from the user id, so every worker process resolves the same
+    user to the same session without sharing a lookup table.
+    """
+
+    def __init__(self, session_service, app_name: str, ttl: float = SESSION_TTL_SECONDS,
+                 max_active: int = SESSION_MAX_ACTIVE):
+        self.session_service = session_service
+        self.app_name = app_name
+        self.ttl = ttl
+        self.max_active = max_active
+        # Only in-process sessions are deleted on LRU eviction; database sessions just expire
+        self.delete_on_evict = SESSION_BACKEND == "memory"
+        self._active: "OrderedDict[str, tuple]" = OrderedDict()  # session_id -> (user_id, last_used)
+        self._locks = {}
+        self._tables_ready = SESSION_BACKEND != "sqlite"
+        self.created = 0
+        self.reused = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def session_id_for(self, user_id: str) -> str:
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{self.app_name}:{user_id}"))
+
+    async def acquire(self, user_id: str) -> str:
+        """Returns the user's live session id, creating (or re-creating after expiry) as needed."""
+        session_id = self.session_id_for(user_id)
+        now = time.time()
+        await self._prepare_tables()
+        await self._sweep(now)
+
+        session = await maybe_await(self.session_service.get_session(
+            app_name=self.app_name, user_id=user_id, session_id=session_id))
+        if session is not None and now - (session.last_update_time or now) > self.ttl:
+            await self._delete(user_id, session_id)
+            self.expired += 1
+            session = None
+        if session is None:
+            from google.adk.errors.already_exists_error import AlreadyExistsError
+            try:
+                await maybe_await(self.session_service.create_session(
+                    app_name=self.app_name, user_id=user_id, session_id=session_id))
+                self.created += 1
+            except AlreadyExistsError:
+                # A concurrent request (here or on another worker) created it first
+                self.reused += 1
+        else:
+            self.reused += 1
+
+        self._active[session_id] = (user_id, now)
+        self._active.move_to_end(session_id)
+        while len(self._active) > self.max_active:
+            old_id, (old_user, _) = self._active.popitem(last=False)
+            self.evicted += 1
+            if self.delete_on_evict:
+                await self._delete(old_user, old_id)
+        return session_id
+
+    @asynccontextmanager
+    async def lock(self, session_id: str):
+        """Serializes runs on one session so concurrent requests do not interleave events.
+
+        With several worker processes the session lease is taken as well, so two requests from
+        one user that land on different workers still run one after the other.
+        """
+        if session_id not in self._locks:
+            self._locks[session_id] = asyncio.Lock()
+        async with self._locks[session_id]:
+            if leases is None:
+                yield
+            else:
+                async with leases.hold(f"session:{session_id}"):
+                    yield
+
+    async def has_history(self, user_id: str, session_id: str) -> bool:
+        session = await maybe_await(self.session_service.get_session(
+            app_name=self.app_name, user_id=user_id, session_id=session_id))
+        return bool(session is not None and session.events)
+
+    async def record_turn(self, user_id: str, session_id: str, question: str, reply: str, author: str):
+        """Appends a question and a reply that no agent run produced (a cached answer) to the session,
+        so the user's next question still sees it as part of the conversation."""
+        from google.adk.events import Event
+        from google.genai import types
+        async with self.lock(session_id):
+            session = await maybe_await(self.session_service.get_session(
+                app_name=self.app_name, user_id=user_id, session_id=session_id))
+            if session is None:
+                return
+            invocation_id = Event.new_id()
+            for role, event_author, text in (("user", "user", question), ("model", author, reply)):
+                event = Event(invocation_id=invocation_id, author=event_author,
+                              content=types.Content(role=role, parts=[types.Part(text=text)]))
+                await maybe_await(self.session_service.append_event(session, event))
+
+    async def create_ephemeral(self, user_id: str) -> str:
+        """A throwaway session for runs that must not share history (batch items, sub-questions)."""
+        session_id = str(uuid.uuid4())
+        await self._prepare_tables()
+        await maybe_await(self.session_service.create_session(
+            app_name=self.app_name, user_id=user_id, session_id=session_id))
+        return session_id
+
+    async def discard(self, user_id: str, session_id: str):
+        await self._delete(user_id, session_id)
+
+    async def _prepare_tables(self):
+        """Creates the database tables once; with several workers under the shared lease, since
+        ADK only serializes its schema setup within one process."""
+        if self._tables_ready:
+            return
+        if leases is None:
+            await self.session_service.prepare_tables()
+        else:
+            async with leases.hold("sessions:schema"):
+                await self.session_service.prepare_tables()
+        self._tables_ready = True
+
+    async def _sweep(self, now: float):
+        # _active is in last-used order, so expired sessions sit at the front
+        while self._active:
+            session_id, (user_id, last_used) = next(iter(self._active.items()))
+            if now - last_used <= self.ttl:
+                break
+            del self._active[session_id]
+            if not self.delete_on_evict:
+                # Another worker may have used a database session since; acquire() checks its
+                # shared last_update_time and expires it only when it is really stale
+                continue
+            self.expired += 1
+            await self._delete(user_id, session_id)
+
+    async def _delete(self, user_id: str, session_id: str):
+        self._active.pop(session_id, None)
+        lock = self._locks.get(session_id)
+        if lock is not None and not lock.locked():
+            del self._locks[session_id]
+        try:
+            await maybe_await(self.session_service.delete_session(
+                app_name=self.app_name, user_id=user_id, session_id=session_id))
+        except Exception as e:
+            logging.warning(f"[sessions] Could not delete session {session_id}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": SESSION_BACKEND,
+            "shared": leases is not None,
+            "active": len(self._active),
+            "max_active": self.max_active,
+            "ttl_seconds": self.ttl,
+            "created": self.created,
+            "reused": self.reused,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+def _text_of(content) -> str:
+    return " ".join(part.text for part in (content.parts or []) if getattr(part, "text", None)).strip()
+
+
+def _summarize(contents) -> str:
+    """Extractive summary of dropped turns: the first words of the latest questions and answers.
+
+    At most SESSION_SUMMARY_LINES messages are kept, so the summary stays the same size however
+    long the session grows.
+    """
+    lines = []
+    for content in contents:
+        text = _text_of(content)
+        if text:
+            speaker = "User" if content.role == "user" else "Assistant"
+            lines.append(f"{speaker}: {text[:SUMMARY_SNIPPET_CHARS]}")
+    omitted = max(0, len(lines) - SESSION_SUMMARY_LINES)
+    lines = lines[omitted:]
+    if omitted:
+        lines.insert(0, f"({omitted} earlier messages omitted)")
+    return "Summary of the earlier conversation:\n" + "\n".join(lines)
+
+
+def trim_history(callback_context, llm_request):
+    """before_model_callback that keeps only the most recent turns of a long session.
+
+    The cut is moved forward to a plain user message so a tool call is never separated
+    from its response; the dropped turns are replaced by a short extractive summary.
+    """
+    contents = llm_request.contents or []
+    if len(contents) <= SESSION_MAX_HISTORY:
+        return None
+
+    cut = len(contents) - SESSION_MAX_HISTORY
+    while cut < len(contents) - 1 and not (
+        contents[cut].role == "user" and _text_of(contents[cut])
+        and not any(getattr(part, "function_response", None) for part in contents[cut].parts)
+    ):
+        cut += 1
+
+    from google.genai import types
+    summary = types.Content(role="user", parts=[types.Part(text=_summarize(contents[:cut]))])
+    llm_request.contents = [summary] + contents[cut:]
+    return None
@@ -0,0 +1,15 @@
+# agent_service/gunicorn.conf.py
+# Multi-worker serving: gunicorn -c gunicorn.conf.py app:app (see README, "Multiple workers")
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WORKERS", os.getenv("WEB_CONCURRENCY", "2")))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Agent runs can take minutes on a busy model; a worker is only killed when it stops heartbeating
+timeout = int(os.getenv("WORKER_TIMEOUT", "300"))
+graceful_timeout = int(os.getenv("WORKER_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+# Each worker imports the agents itself after the fork (see core/components.py), so nothing is preloaded
+preload_app = False
+# Workers read WORKERS to turn on shared state; keep it in step with the worker count above
+os.environ["WORKERS"] = str(workers)
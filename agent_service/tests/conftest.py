@@ -0,0 +1,6 @@
+# agent_service/tests/conftest.py
+import os
+import sys
+
+# Modules import each other as top-level packages (core, graph, tools), as when the service runs
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
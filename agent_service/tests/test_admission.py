@@ -0,0 +1,37 @@
+# agent_service/tests/test_admission.py
+import asyncio
+
+import pytest
+
+from core.admission import AdmissionLimiter, AdmissionRejected
+
+
+async def occupy(limiter: AdmissionLimiter, priority: str, release: asyncio.Event):
+    async with limiter.slot(timeout=None, priority=priority):
+        await release.wait()
+
+
+def test_batch_leaves_slots_for_interactive():
+    async def main():
+        limiter = AdmissionLimiter(max_in_flight=4, max_queued=100, queue_timeout=0.05, max_batch=2)
+        release = asyncio.Event()
+        batch = [asyncio.create_task(occupy(limiter, "batch", release)) for _ in range(32)]
+        await asyncio.sleep(0.01)
+        assert limiter.batch_in_flight == 2 and limiter.batch_waiting == 30
+        # Interactive requests get the reserved slots at once, without queuing behind the batch
+        async with limiter.slot():
+            async with limiter.slot():
+                assert limiter.in_flight == 4
+                with pytest.raises(AdmissionRejected):
+                    async with limiter.slot():
+                        pass
+        release.set()
+        await asyncio.gather(*batch)
+        return limiter.stats()
+
+    stats = asyncio.run(main())
+    assert stats["in_flight"] == 0 and stats["batch_in_flight"] == 0 and stats["batch_waiting"] == 0
+
+
+def test_batch_cap_never_exceeds_run_slots():
+    assert AdmissionLimiter(max_in_flight=1, max_batch=4).max_batch == 1
@@ -0,0 +1,54 @@
+# agent_service/tests/test_calendar.py
+import asyncio
+
+import pytest
+
+from tools.calendar_store import CalendarStore
+
+ROWS = [
+    ("2025-04-14", "QA review at 1 PM", "Alice"),
+    ("2025-04-15", "HR townhall at 10 AM", ""),
+    ("2025-04-15", "1:1 with Bob at 3 PM", "Bob"),
+    ("2025-04-17", "Design sync at 11 AM", "alice"),
+    ("2025-04-21", "Sprint planning at 9 AM", "Bob"),
+]
+
+
+@pytest.fixture
+def calendar_path(tmp_path):
+    path = tmp_path / "calendar.csv"
+    path.write_text("date,meeting,user\n" + "".join(f'"{d}","{m}","{u}"\n' for d, m, u in ROWS))
+    return str(path)
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_date_ranges(calendar_path, backend):
+    store = CalendarStore(calendar_path, backend=backend)
+    assert [m[1] for m in store.lookup("2025-04-15", "2025-04-15")] == ["HR townhall at 10 AM", "1:1 with Bob at 3 PM"]
+    assert store.lookup("2025-04-16", "2025-04-16") == []
+    # Both ends are inclusive, days without meetings in between are skipped
+    assert [m[0] for m in store.lookup("2025-04-14", "2025-04-17")] == ["2025-04-14", "2025-04-15", "2025-04-15", "2025-04-17"]
+    assert store.lookup("2025-05-01", "2025-05-31") == []
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_user_filter_ignores_case_and_keeps_shared_meetings(calendar_path, backend):
+    store = CalendarStore(calendar_path, backend=backend)
+    for user in ("alice", "Alice", "ALICE"):
+        meetings = store.lookup("2025-04-14", "2025-04-21", user)
+        assert [m[1] for m in meetings] == ["QA review at 1 PM", "HR townhall at 10 AM", "Design sync at 11 AM"]
+    assert [m[1] for m in store.lookup("2025-04-15", "2025-04-21", "bob")] == [
+        "HR townhall at 10 AM", "1:1 with Bob at 3 PM", "Sprint planning at 9 AM"]
+
+
+def test_check_calendar_reports_a_range_for_one_user(calendar_path, monkeypatch):
+    pytest.importorskip("google.adk")
+    from tools import calendar_tool
+    monkeypatch.setattr(calendar_tool, "calendar_store", CalendarStore(calendar_path, backend="memory"))
+
+    result = asyncio.run(calendar_tool.check_calendar("2025-04-17", "2025-04-14", user="alice"))
+    assert result == {"status": "success",
+                      "report": "Meetings from 2025-04-14 to 2025-04-17: 2025-04-14: QA review at 1 PM; "
+                                "2025-04-15: HR townhall at 10 AM; 2025-04-17: Design sync at 11 AM"}
+    invalid = asyncio.run(calendar_tool.check_calendar("14/04/2025"))
+    assert invalid["status"] == "error"
@@ -0,0 +1,35 @@
+# agent_service/tests/test_embedding_cache.py
+import os
+
+import pytest
+
+from tools.embedding_cache import EmbeddingCache, migrate_file_store
+
+
+def test_migrates_a_from_bytes_store_cache(tmp_path):
+    cache_module = pytest.importorskip("langchain.embeddings.cache")
+    storage = pytest.importorskip("langchain.storage")
+    from langchain_core.embeddings import Embeddings
+
+    class LengthEmbeddings(Embeddings):
+        def embed_documents(self, texts):
+            return [[float(len(text)), 0.5, -1.0] for text in texts]
+
+        def embed_query(self, text):
+            return self.embed_documents([text])[0]
+
+    old_dir = tmp_path / "old"
+    texts = ["short", "a longer chunk", "the longest chunk of them all"]
+    legacy = cache_module.CacheBackedEmbeddings.from_bytes_store(
+        LengthEmbeddings(), storage.LocalFileStore(str(old_dir)), namespace="nomic-embed-text")
+    expected = legacy.embed_documents(texts)
+    assert len(os.listdir(old_dir)) == len(texts)
+
+    cache = EmbeddingCache("nomic-embed-text", directory=str(tmp_path / "new"))
+    # The corpus repeats a chunk and misses one that was only ever embedded before
+    counts = migrate_file_store(str(old_dir), "nomic-embed-text", cache, texts[:2] + texts[:1] + ["never embedded"],
+                                delete=True)
+
+    assert counts == {"migrated": 2, "missing": 1, "skipped": 0}
+    assert cache.get_many(texts) == expected[:2] + [None]
+    assert len(os.listdir(old_dir)) == 1  # the file of the text outside the corpus stays
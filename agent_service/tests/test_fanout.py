@@ -0,0 +1,53 @@
+# agent_service/tests/test_fanout.py
+import asyncio
+import threading
+
+from graph import fanout
+from graph.router import IntentRouter, RouteDecision
+
+
+class SlowEmbeddingRouter:
+    """Stands in for the embedding classifier: every call blocks as an Ollama request would."""
+    use_embeddings = True
+
+    def __init__(self):
+        self.threads = set()
+
+    def classify(self, text: str) -> RouteDecision:
+        self.threads.add(threading.get_ident())
+        threading.Event().wait(0.2)
+        return RouteDecision(target="weather_agent", intent="weather", method="embeddings", confidence=0.9)
+
+
+def test_plan_splits_on_rules():
+    router = IntentRouter(enabled=True, use_embeddings=False, direct_tools=False)
+    steps = asyncio.run(fanout.plan("What's the weather in Pune and do I have meetings today?", router))
+    assert [(part, decision.target) for part, decision in steps] == [
+        ("What's the weather in Pune", "weather_agent"), ("do I have meetings today", "calendar_agent")]
+    # A part no rule recognizes leaves the whole question to the supervisor
+    assert asyncio.run(fanout.plan("What's the weather in Pune and tell me a joke", router)) is None
+
+
+def test_plan_classifies_parts_concurrently_off_the_event_loop():
+    router = SlowEmbeddingRouter()
+
+    async def main():
+        loop_thread = threading.get_ident()
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        steps = await fanout.plan("weather in Pune; weather in Goa; weather in Agra", router)
+        ticker.cancel()
+        return steps, loop_thread, ticks
+
+    steps, loop_thread, ticks = asyncio.run(main())
+    assert len(steps) == 3
+    assert loop_thread not in router.threads
+    # Three 0.2 s classifications ran side by side while the loop kept running
+    assert len(router.threads) == 3 and ticks >= 10
@@ -0,0 +1,84 @@
+# agent_service/tests/test_hybrid_search.py
+import json
+
+import numpy as np
+
+from tools.hybrid_search import BM25Index, estimate_tokens, mmr, pack, reciprocal_rank_fusion
+
+CORPUS = {
+    "few-shot": "Few-shot prompting puts a handful of solved examples in the prompt.",
+    "cot": "Chain-of-thought prompting asks the model to reason step by step before answering.",
+    "zero-shot": "Zero-shot prompting gives only the instruction, with no examples at all.",
+    "api": "Call the generateContent API with a temperature of 0.2 for factual answers.",
+}
+
+
+def build() -> BM25Index:
+    return BM25Index.build(list(CORPUS), list(CORPUS.values()))
+
+
+def test_bm25_ranks_documents_by_their_terms():
+    index = build()
+    ranking = [chunk_id for chunk_id, _ in index.search("examples for few-shot prompting", 4)]
+    assert ranking[0] == "few-shot"
+    assert ranking[1] == "zero-shot"  # "examples" and "shot" as well, in a longer text
+    assert "api" not in ranking  # shares no term with the query
+    # Exact identifiers are what BM25 is there for
+    assert [chunk_id for chunk_id, _ in index.search("generateContent", 3)] == ["api"]
+    # Stopwords alone match nothing
+    assert index.search("what is the", 3) == []
+    assert index.source_count == 4
+
+
+def test_bm25_index_round_trips_through_json(tmp_path):
+    path = str(tmp_path / "bm25_index.json")
+    index = build()
+    index.save(path)
+    with open(path) as f:
+        assert set(json.load(f)) == {"chunk_ids", "postings", "source_count"}
+
+    loaded = BM25Index.load(path)
+    for query in ("few-shot examples", "reason step by step", "temperature"):
+        expected = index.search(query, 3)
+        got = loaded.search(query, 3)
+        assert [chunk_id for chunk_id, _ in got] == [chunk_id for chunk_id, _ in expected]
+        assert np.allclose([score for _, score in got], [score for _, score in expected])
+
+
+def test_missing_or_unreadable_index_loads_as_none(tmp_path):
+    assert BM25Index.load(str(tmp_path / "missing.json")) is None
+    legacy = tmp_path / "bm25_index.json"
+    legacy.write_bytes(b"\x80\x05\x95 not json")
+    assert BM25Index.load(str(legacy)) is None
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    vector_ranking = ["cot", "few-shot", "zero-shot"]
+    bm25_ranking = ["few-shot", "api"]
+    # "few-shot" is near the top of both lists; items in a single list keep their relative order
+    assert reciprocal_rank_fusion([vector_ranking, bm25_ranking]) == ["few-shot", "cot", "api", "zero-shot"]
+
+
+def test_mmr_skips_near_duplicates():
+    vectors = {
+        "a": np.array([1.0, 0.0, 0.0], dtype=np.float32),
+        "a-overlap": np.array([0.99, 0.05, 0.0], dtype=np.float32),
+        "b": np.array([0.6, 0.8, 0.0], dtype=np.float32),
+    }
+    query = np.array([1.0, 0.3, 0.0], dtype=np.float32)
+    assert mmr(query, ["a", "a-overlap", "b"], vectors, k=2) == ["a", "b"]
+    # All relevance and no diversity keeps the overlapping chunk
+    assert mmr(query, ["a", "a-overlap", "b"], vectors, k=2, lambda_mult=1.0) == ["a", "a-overlap"]
+    # Candidates without vectors cannot be compared
+    assert mmr(query, ["a", "unknown"], vectors, k=2) == ["a", "unknown"]
+
+
+def test_pack_keeps_order_within_the_token_budget():
+    results = [{"content": "x" * 400}, {"content": "word " * 200}, {"content": "y" * 400}]
+    packed = pack(results, token_budget=180)
+    assert [estimate_tokens(result["content"]) for result in packed][0] == 100
+    # The second result is cut at a word boundary to the 80 tokens left, the third is dropped
+    assert len(packed) == 2 and packed[1]["content"].endswith(" ...") and len(packed[1]["content"]) <= 80 * 4 + 4
+    assert results[1]["content"] == "word " * 200  # the input is not modified
+    # A remainder too small to be useful is not sent at all
+    assert len(pack(results, token_budget=120)) == 1
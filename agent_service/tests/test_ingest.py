@@ -0,0 +1,95 @@
+# agent_service/tests/test_ingest.py
+import pytest
+
+pytest.importorskip("langchain_text_splitters")
+
+from tools import ingest
+from tools.ingest import Ingestor, Manifest, split_chunks
+
+
+class FakeCollection:
+    """Keeps chunk id -> (text, metadata) like the Chroma collection calls the ingestor makes."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        for chunk_id, document, metadata in zip(ids, documents, metadatas):
+            self.rows[chunk_id] = (document, metadata)
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            self.rows.pop(chunk_id, None)
+
+    def get(self, where, include):
+        return {"ids": [chunk_id for chunk_id, (_, metadata) in self.rows.items()
+                        if all(metadata.get(key) == value for key, value in where.items())]}
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [[0.0] for _ in texts]
+
+
+def paragraphs(*names):
+    return "\n\n".join(f"{name}: " + " ".join(f"{name.lower()}{i}" for i in range(60)) for name in names)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "RETRIEVER_HYBRID", False)
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.md").write_text(paragraphs("Alpha", "Beta", "Gamma"))
+    (docs / "b.md").write_text(paragraphs("Delta", "Epsilon"))
+    return docs, FakeCollection(), str(tmp_path / "manifest.json")
+
+
+def test_an_interrupted_run_resumes_without_re_embedding(corpus):
+    docs, collection, manifest_path = corpus
+    first = CountingEmbeddings()
+    Ingestor(workers=1, collection=collection, embeddings=first, manifest=Manifest(manifest_path)).run(
+        [str(docs / "a.md")])
+
+    # The second run sees a.md in the manifest, as if the first had stopped before reaching b.md
+    resumed = CountingEmbeddings()
+    stats = Ingestor(workers=2, collection=collection, embeddings=resumed, manifest=Manifest(manifest_path)).run(
+        [str(docs)])
+    b_chunks = split_chunks(str((docs / "b.md").resolve()), (docs / "b.md").read_text())
+    assert stats["unchanged"] == 1 and stats["embedded"] == len(b_chunks) == resumed.embedded
+    assert len(collection.rows) == first.embedded + resumed.embedded
+
+
+def test_edited_source_deletes_stale_chunks_only(corpus):
+    docs, collection, manifest_path = corpus
+    source = docs / "a.md"
+    Ingestor(workers=1, collection=collection, embeddings=CountingEmbeddings(), manifest=Manifest(manifest_path)).run(
+        [str(source)])
+
+    source.write_text(paragraphs("Zeta", "Beta", "Gamma"))
+    embeddings = CountingEmbeddings()
+    stats = Ingestor(workers=1, collection=collection, embeddings=embeddings, manifest=Manifest(manifest_path)).run(
+        [str(source)])
+    expected = split_chunks(str(source.resolve()), source.read_text())
+    assert set(collection.rows) == set(expected)
+    assert stats["deleted"] >= 1 and embeddings.embedded == stats["embedded"] < len(expected)
+    # Kept chunks carry no position, so they cannot disagree with the new layout
+    assert all(metadata == {"source": str(source.resolve())} for _, metadata in collection.rows.values())
+
+
+def test_first_ingestion_replaces_legacy_uuid_chunks(corpus):
+    docs, collection, manifest_path = corpus
+    source = str((docs / "a.md").resolve())
+    collection.rows["0b7c6f0e-3d5e-4a7c-9d6e-1f2a3b4c5d6e"] = ("Alpha: alpha0 alpha1", {"source": source})
+    collection.rows["5e4d3c2b-1a0f-4e9d-8c7b-6a5f4e3d2c1b"] = ("Other page", {"source": "https://example.com"})
+
+    stats = Ingestor(workers=1, collection=collection, embeddings=CountingEmbeddings(),
+                     manifest=Manifest(manifest_path)).run([source])
+    assert stats["legacy_deleted"] == 1
+    assert "0b7c6f0e-3d5e-4a7c-9d6e-1f2a3b4c5d6e" not in collection.rows
+    # Legacy chunks of sources that were not ingested are left alone
+    assert "5e4d3c2b-1a0f-4e9d-8c7b-6a5f4e3d2c1b" in collection.rows
@@ -0,0 +1,51 @@
+# agent_service/tests/test_plan_cache.py
+import asyncio
+import importlib
+
+import pytest
+
+from graph.response_cache import ResponseCache
+
+# Building the agents needs a model name and an Ollama URL, but nothing is called
+AGENT_ENV = {"MODEL": "llama3.1:8b", "BASE_URL": "http://127.0.0.1:9", "LITELLM_LOCAL_MODEL_COST_MAP": "True"}
+
+
+@pytest.fixture(scope="module")
+def agent_graph():
+    pytest.importorskip("google.adk")
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in AGENT_ENV.items():
+            patch.setenv(name, value)
+        return importlib.import_module("graph.agent_graph")
+
+
+def test_repeated_question_in_a_session_hits_the_cache(agent_graph, monkeypatch):
+    monkeypatch.setattr(agent_graph, "response_cache", ResponseCache(db_path="", semantic=False))
+    sessions = agent_graph.session_manager
+    question = "What meetings do I have tomorrow?"
+
+    async def ask(text: str, session_id: str):
+        decision = await agent_graph.route_async(text)
+        return await agent_graph.plan_cache(text, decision, None, "alice", session_id)
+
+    async def main():
+        session_id = await sessions.acquire("alice")
+        await sessions.record_turn("alice", session_id, "Hello", "Hi, how can I help?", "supervisor_agent")
+        plan = await ask(question, session_id)
+        missed = await plan.lookup(question)
+        await plan.store(question, "You have a standup at 10:00.", 0.0)
+
+        # The session has grown since, but the question stands on its own
+        hit = await (await ask(question, session_id)).lookup(question)
+        follow_up = await ask("And what about the meetings on Friday?", session_id)
+        events = len((await sessions.session_service.get_session(
+            app_name=sessions.app_name, user_id="alice", session_id=session_id)).events)
+        await sessions.discard("alice", session_id)
+        return missed, hit, follow_up, events
+
+    missed, hit, follow_up, events = asyncio.run(main())
+    assert missed is None
+    assert hit == "You have a standup at 10:00."
+    assert follow_up is None
+    # The cached reply was added to the session like an answered turn
+    assert events == 4
@@ -0,0 +1,40 @@
+# agent_service/tests/test_response_cache.py
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from graph.response_cache import ResponseCache
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_store_lookup_expire_and_clear(tmp_path, shared):
+    db_path = str(tmp_path / "cache.db")
+
+    async def main():
+        cache = ResponseCache(db_path=db_path, semantic=False, shared=shared)
+        await cache.store("Weather in Pune?", "scope", "Clear, 31°C.", ttl=60, latency_ms=900, semantic=False)
+        await cache.store("Weather in Goa?", "scope", "Humid.", ttl=60, latency_ms=900, semantic=False)
+        hit = await cache.lookup("weather in pune", "scope", semantic=False)
+        other_scope = await cache.lookup("weather in pune", "elsewhere", semantic=False)
+
+        # Expire one entry: the lookup drops it, and the delete must reach the file
+        with cache._lock:
+            cache._db.execute("UPDATE responses SET expires_at = ? WHERE reply = ?", (time.time() - 1, "Humid."))
+            cache._db.commit()
+            if not shared:
+                cache._entries["scope|weather in goa"].expires_at = time.time() - 1
+        expired = await cache.lookup("weather in goa", "scope", semantic=False)
+        # Another process reading the file sees the remaining entry and not the removed one
+        rows = sqlite3.connect(db_path).execute("SELECT reply FROM responses").fetchall()
+
+        await cache.clear()
+        cleared = await cache.lookup("weather in pune", "scope", semantic=False)
+        return hit, other_scope, expired, rows, cleared, cache.stats()
+
+    hit, other_scope, expired, rows, cleared, stats = asyncio.run(main())
+    assert hit == "Clear, 31°C."
+    assert other_scope is None and expired is None and cleared is None
+    assert rows == [("Clear, 31°C.",)]
+    assert stats["hits_exact"] == 1 and stats["misses"] == 3 and stats["entries"] == 0
@@ -0,0 +1,66 @@
+# agent_service/tests/test_retriever.py
+import pytest
+
+pytest.importorskip("dotenv")
+
+from tools import retriever
+from tools.retriever import RetrieverService
+
+
+class FakeCollection:
+    """The one Chroma call a search needs, over a list of passages that ingestion may replace."""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def query(self, query_embeddings, n_results, include):
+        documents = self.documents[:n_results]
+        return {
+            "ids": [[f"chunk-{index}" for index in range(len(documents))]],
+            "documents": [documents],
+            "metadatas": [[{"source": "blog"} for _ in documents]],
+            "embeddings": [[[1.0, float(index)] for index in range(len(documents))]],
+        }
+
+    def count(self):
+        return len(self.documents)
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return [[1.0, 0.0] for _ in texts]
+
+
+def test_corpus_change_drops_cached_results_and_reloads_bm25(monkeypatch):
+    monkeypatch.setattr(retriever, "RETRIEVER_HYBRID", True)
+    monkeypatch.setattr(retriever, "RETRIEVER_MMR", False)
+    bm25_loads = []
+
+    class FakeBM25:
+        def search(self, query, k):
+            return []
+
+    def load_bm25(collection):
+        bm25_loads.append(collection.count())
+        return FakeBM25()
+
+    monkeypatch.setattr(RetrieverService, "_load_bm25", staticmethod(load_bm25))
+    version = {"value": 1}
+    service = RetrieverService(version=lambda: version["value"])
+    # As if _load had opened the persisted collection
+    service._collection = FakeCollection(["Few-shot prompting shows the model examples."])
+    service._embeddings = FakeEmbeddings()
+    service._bm25 = FakeBM25()
+    service._version = 1
+
+    first = service.retrieve("What is few-shot prompting?", k=1)
+    again = service.retrieve("what is few-shot prompting", k=1)
+    assert again is first and service.hits == 1
+
+    # A new ingestion rewrote the collection and its index files
+    service._collection.documents = ["Few-shot prompting puts a handful of solved examples in the prompt."]
+    version["value"] = 2
+    fresh = service.retrieve("What is few-shot prompting?", k=1)
+    assert fresh[0]["content"] == "Few-shot prompting puts a handful of solved examples in the prompt."
+    assert bm25_loads == [1]
+    assert service.stats()["reloads"] == 1 and service.misses == 2
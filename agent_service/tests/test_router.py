@@ -0,0 +1,91 @@
+# agent_service/tests/test_router.py
+import pytest
+
+from core.metrics import registry
+from graph.router import CITY_PATTERN, NON_TODAY_PATTERN, IntentRouter, RouterStats
+
+
+@pytest.fixture
+def router():
+    return IntentRouter(enabled=True, use_embeddings=False, direct_tools=True)
+
+
+@pytest.mark.parametrize("text, target, intent", [
+    ("Will it rain in Chennai this weekend?", "weather_agent", "weather"),
+    ("Which meetings are on my calendar next week?", "calendar_agent", "calendar"),
+    ("Explain chain-of-thought prompting", "retriever_agent", "documents"),
+])
+def test_single_intent_goes_to_its_agent(router, text, target, intent):
+    decision = router.classify(text)
+    assert (decision.target, decision.intent, decision.method, decision.confidence) == (target, intent, "rules", 1.0)
+    assert decision.tool is None
+
+
+@pytest.mark.parametrize("text", [
+    "What's the weather in Pune and what meetings do I have today?",  # two intents
+    "Tell me a joke",  # no intent
+])
+def test_mixed_or_unknown_questions_go_to_the_supervisor(router, text):
+    decision = router.classify(text)
+    assert decision.target == "supervisor_agent" and decision.intent is None and decision.tool is None
+
+
+def test_short_questions_call_the_tool_directly(router):
+    weather = router.classify("weather in New York in fahrenheit")
+    assert weather.tool == "get_weather_report"
+    assert weather.tool_args == {"city": "New York", "unit": "fahrenheit"}
+    assert router.classify("my meetings today").tool == "check_calendar"
+    # Other days need the agent to work out the dates
+    assert router.classify("my meetings tomorrow").tool is None
+    assert router.classify("Will it rain in Chennai this weekend?").tool is None
+    # Too long to be trivial
+    assert router.classify("could you please tell me what the weather will be like in Pune").tool is None
+
+
+def test_disabled_router_sends_everything_to_the_supervisor():
+    decision = IntentRouter(enabled=False, use_embeddings=False).classify("weather in Pune")
+    assert decision.target == "supervisor_agent" and decision.tool is None
+
+
+@pytest.mark.parametrize("text, city", [
+    ("weather in Pune", "Pune"),
+    ("What's the temperature in San Francisco right now?", "San Francisco"),
+    ("forecast for Rio de Janeiro today", "Rio de Janeiro"),
+    ("weather in Delhi in celsius", "Delhi"),
+    ("Is it raining at O'Hare, or not", "O'Hare"),
+])
+def test_city_pattern(text, city):
+    assert CITY_PATTERN.search(text).group(1).strip() == city
+
+
+def test_city_pattern_needs_a_weather_word_before_the_place():
+    assert CITY_PATTERN.search("meetings in Berlin") is None
+    assert CITY_PATTERN.search("what's the weather") is None
+
+
+@pytest.mark.parametrize("text, other_day", [
+    ("my meetings today", False),
+    ("what is on my agenda", False),
+    ("my meetings tomorrow", True),
+    ("meetings next week", True),
+    ("am I free on Friday", True),
+    ("meetings on 2025-04-15", True),
+])
+def test_non_today_pattern(text, other_day):
+    assert bool(NON_TODAY_PATTERN.search(text)) == other_day
+
+
+def test_router_stats_are_exported():
+    stats = RouterStats()
+    stats.record("supervisor_agent", 3000)
+    stats.record("weather_agent", 1000)
+    stats.record("weather_agent", 1000)
+    snapshot = stats.snapshot()
+    assert snapshot["total"] == 3
+    assert snapshot["routes"]["weather_agent"]["hit_rate"] == round(2 / 3, 4)
+    assert snapshot["latency_saved_ms"] == 4000.0
+
+    metrics = registry.render()
+    assert 'agent_route_total{route="weather_agent"}' in metrics
+    assert 'agent_route_seconds_count{route="supervisor_agent"}' in metrics
+    assert "agent_route_saved_seconds_total" in metrics
@@ -0,0 +1,149 @@
+# agent_service/tests/test_scheduler.py
+import asyncio
+
+import pytest
+
+from core import scheduler
+from core.scheduler import ModelScheduler, Shed
+
+
+async def hold(sched: ModelScheduler, user: str, priority: str, order: list, release: asyncio.Event):
+    with scheduler.caller(user, priority):
+        await sched.acquire()
+    order.append(user)
+    await release.wait()
+    sched.release()
+
+
+async def start_waiting(sched, specs, order, release):
+    """Occupies the only slot, then queues one call per (user, priority) in `specs`."""
+    with scheduler.caller("blocker"):
+        await sched.acquire()
+    tasks = [asyncio.create_task(hold(sched, user, priority, order, release)) for user, priority in specs]
+    await asyncio.sleep(0)
+    return tasks
+
+
+def test_users_take_turns():
+    async def main():
+        sched = ModelScheduler("m", 1)
+        order, release = [], asyncio.Event()
+        release.set()
+        tasks = await start_waiting(sched, [("a", "interactive")] * 3 + [("b", "interactive")] * 3, order, release)
+        sched.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main()) == ["a", "b", "a", "b", "a", "b"]
+
+
+def test_weights_share_slots(monkeypatch):
+    monkeypatch.setitem(scheduler.user_weights, "a", 2.0)
+
+    async def main():
+        sched = ModelScheduler("m", 1)
+        order, release = [], asyncio.Event()
+        release.set()
+        tasks = await start_waiting(sched, [("a", "interactive")] * 4 + [("b", "interactive")] * 2, order, release)
+        sched.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    # Twice the weight, twice the turns while both users are waiting
+    assert asyncio.run(main()) == ["a", "b", "a", "a", "b", "a"]
+
+
+def test_interactive_before_batch():
+    async def main():
+        sched = ModelScheduler("m", 1)
+        order, release = [], asyncio.Event()
+        release.set()
+        tasks = await start_waiting(sched, [("job", "batch")] * 2 + [("user", "interactive")], order, release)
+        sched.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main()) == ["user", "job", "job"]
+
+
+def test_quota_delays_a_user(monkeypatch):
+    monkeypatch.setattr(scheduler, "SCHEDULER_USER_RATE", 20.0)
+    monkeypatch.setattr(scheduler, "SCHEDULER_USER_BURST", 1.0)
+
+    async def main():
+        sched = ModelScheduler("m", 4)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with scheduler.caller("a"):
+            await sched.acquire()
+            first = loop.time() - started
+            await sched.acquire()
+            second = loop.time() - started
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first < 0.02
+    assert second >= 0.04  # one token every 50 ms
+
+
+def test_deadline_sheds_queued_call(monkeypatch):
+    monkeypatch.setitem(scheduler.deadlines, "interactive", 0.05)
+
+    async def main():
+        sched = ModelScheduler("m", 1)
+        with scheduler.caller("blocker", "batch"):
+            await sched.acquire()
+        with scheduler.caller("late"):
+            with pytest.raises(Shed):
+                await sched.acquire()
+        stats = sched.stats()
+        sched.release()
+        return stats
+
+    stats = asyncio.run(main())
+    assert stats["shed"]["deadline"] == 1
+    assert stats["queued"]["interactive"] == 0
+    assert stats["running"] == 1
+
+
+def test_abandoned_caller_frees_its_slot():
+    async def main():
+        sched = ModelScheduler("m", 1)
+        with scheduler.caller("blocker"):
+            await sched.acquire()
+
+        async def gone():
+            return True
+
+        async def waiting():
+            with scheduler.caller("gone", abandoned=gone):
+                await sched.acquire()
+
+        task = asyncio.create_task(waiting())
+        await asyncio.sleep(0.01)
+        sched.release()
+        with pytest.raises(Shed):
+            await task
+        return sched.stats()
+
+    stats = asyncio.run(main())
+    assert stats["shed"]["abandoned"] == 1
+    assert stats["running"] == 0
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def main():
+        sched = ModelScheduler("m", 1)
+        with scheduler.caller("blocker"):
+            await sched.acquire()
+        task = asyncio.create_task(sched.acquire())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        sched.release()
+        return sched.stats()
+
+    stats = asyncio.run(main())
+    assert stats["queued"]["interactive"] == 0
+    assert stats["running"] == 0
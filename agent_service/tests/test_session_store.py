@@ -0,0 +1,47 @@
+# agent_service/tests/test_session_store.py
+import asyncio
+
+import pytest
+from google.genai import types
+
+from graph import session_store
+from graph.session_store import SESSION_MAX_HISTORY, SessionManager, build_session_service, trim_history
+
+
+class Request:
+    def __init__(self, contents):
+        self.contents = contents
+
+
+def message(role: str, text: str) -> types.Content:
+    return types.Content(role=role, parts=[types.Part(text=text)])
+
+
+def test_summary_stays_bounded(monkeypatch):
+    monkeypatch.setattr(session_store, "SESSION_SUMMARY_LINES", 4)
+    contents = [message("user" if i % 2 == 0 else "model", f"message {i}") for i in range(200)]
+    request = Request(list(contents))
+
+    trim_history(None, request)
+
+    summary = request.contents[0].parts[0].text
+    assert summary.splitlines()[1:] == ["(184 earlier messages omitted)", "User: message 184", "Assistant: message 185",
+                                        "User: message 186", "Assistant: message 187"]
+    assert request.contents[1:] == contents[-SESSION_MAX_HISTORY:]
+
+
+def test_sqlite_backend_builds_and_keeps_turns(monkeypatch, tmp_path):
+    pytest.importorskip("sqlalchemy")
+    monkeypatch.setattr(session_store, "SESSION_BACKEND", "sqlite")
+    monkeypatch.setattr(session_store, "SESSION_DB_URL", f"sqlite+aiosqlite:///{tmp_path / 'sessions.db'}")
+
+    async def main():
+        manager = SessionManager(build_session_service(), "app")
+        session_id = await manager.acquire("alice")
+        first = await manager.has_history("alice", session_id)
+        await manager.record_turn("alice", session_id, "Weather in Pune?", "Clear, 31°C.", "weather_agent")
+        # A second manager on the same database (another worker) resolves the same session
+        other = SessionManager(build_session_service(), "app")
+        return first, await other.acquire("alice") == session_id, await other.has_history("alice", session_id)
+
+    assert asyncio.run(main()) == (False, True, True)
@@ -0,0 +1,54 @@
+# agent_service/tests/test_weather_providers.py
+import asyncio
+
+from tools.weather_providers import CachedFetcher
+
+
+def test_waiters_survive_cancelled_leader():
+    async def main():
+        fetcher = CachedFetcher(ttl=60)
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"temp": 20}
+
+        leader = asyncio.create_task(fetcher.get("pune", fetch))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(fetcher.get("pune", fetch)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*waiters)
+        return results, len(calls), fetcher.stats()
+
+    results, calls, stats = asyncio.run(main())
+    assert results == [{"temp": 20}] * 3
+    assert calls == 2  # the cancelled fetch, then one retry shared by every waiter
+    assert stats["entries"] == 1
+
+
+def test_expired_and_excess_entries_are_evicted(monkeypatch):
+    clock = {"now": 1000.0}
+    monkeypatch.setattr("tools.weather_providers.time.monotonic", lambda: clock["now"])
+
+    async def main():
+        fetcher = CachedFetcher(ttl=60, max_entries=3)
+
+        async def fetch():
+            return {"temp": 20}
+
+        for city in ("pune", "goa", "agra"):
+            await fetcher.get(city, fetch)
+        clock["now"] += 61
+        # Every earlier entry expired: the next insert drops them
+        await fetcher.get("delhi", fetch)
+        expired_dropped = sorted(fetcher._values)
+        for city in ("mumbai", "chennai", "kochi"):
+            await fetcher.get(city, fetch)
+        return expired_dropped, list(fetcher._values), fetcher.stats()
+
+    expired_dropped, kept, stats = asyncio.run(main())
+    assert expired_dropped == ["delhi"]
+    assert kept == ["mumbai", "chennai", "kochi"]  # the oldest went first
+    assert stats["entries"] == 3
@@ -0,0 +1,130 @@
+# tools/calendar_store.py
+import bisect
+import csv
+import logging
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+
+# Configuration
+CALENDAR_FILE = os.getenv("CALENDAR_FILE", os.path.join(os.path.dirname(__file__), "calendar.csv"))
+CALENDAR_BACKEND = os.getenv("CALENDAR_BACKEND", "auto")  # "memory", "sqlite" or "auto"
+CALENDAR_SQLITE_THRESHOLD_BYTES = int(os.getenv("CALENDAR_SQLITE_THRESHOLD_BYTES", str(50 * 1024 * 1024)))
+
+# (date, meeting, user); an empty user means the meeting is on everyone's calendar
+Meeting = Tuple[str, str, str]
+
+
+def file_signature(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_rows(path: str):
+    with open(path, newline='') as csvfile:
+        for row in csv.DictReader(csvfile):
+            if row.get('date') and row.get('meeting'):
+                yield row['date'].strip(), row['meeting'], (row.get('user') or '').strip()
+
+
+class MemoryCalendarIndex:
+    """date -> meetings dict plus a sorted date list, so a day is O(1) and a range is O(log n + hits)."""
+
+    def __init__(self, path: str):
+        # (meeting, user, case-folded user), so per-user lookups match any case without folding each row
+        by_date: Dict[str, List[Tuple[str, str, str]]] = defaultdict(list)
+        for date, meeting, user in read_rows(path):
+            by_date[date].append((meeting, user, user.casefold()))
+        self.by_date = dict(by_date)
+        self.dates = sorted(self.by_date)
+        logging.info(f"[calendar] Indexed {sum(len(m) for m in self.by_date.values())} meetings on {len(self.dates)} dates")
+
+    def lookup(self, start: str, end: str, user: Optional[str]) -> List[Meeting]:
+        if start == end:
+            dates = [start] if start in self.by_date else []
+        else:
+            dates = self.dates[bisect.bisect_left(self.dates, start):bisect.bisect_right(self.dates, end)]
+        user = user.casefold() if user else None
+        return [
+            (date, meeting, owner)
+            for date in dates
+            for meeting, owner, owner_key in self.by_date[date]
+            if not user or not owner or owner_key == user
+        ]
+
+
+class SqliteCalendarIndex:
+    """For calendars too large to hold in memory: the CSV is imported once into an indexed SQLite table."""
+
+    def __init__(self, path: str, signature: Tuple[int, int]):
+        self.db_path = os.path.splitext(path)[0] + ".db"
+        self._local = threading.local()
+        db = sqlite3.connect(self.db_path)
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        stored = db.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+        if not stored or stored[0] != repr(signature):
+            logging.info(f"[calendar] Importing {path} into {self.db_path}")
+            db.execute("DROP TABLE IF EXISTS meetings")
+            db.execute("CREATE TABLE meetings (date TEXT, meeting TEXT, user TEXT)")
+            db.executemany("INSERT INTO meetings VALUES (?, ?, ?)", read_rows(path))
+            db.execute("CREATE INDEX meetings_date_user ON meetings (date, user)")
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('signature', ?)", (repr(signature),))
+            db.commit()
+        db.close()
+
+    def _connection(self):
+        # sqlite3 connections are per thread; tool calls may come from different worker threads
+        if not hasattr(self._local, "db"):
+            self._local.db = sqlite3.connect(self.db_path)
+        return self._local.db
+
+    def lookup(self, start: str, end: str, user: Optional[str]) -> List[Meeting]:
+        query = "SELECT date, meeting, user FROM meetings WHERE date BETWEEN ? AND ?"
+        params = [start, end]
+        if user:
+            query += " AND (user = ? COLLATE NOCASE OR user = '')"
+            params.append(user)
+        return self._connection().execute(query + " ORDER BY date, rowid", params).fetchall()
+
+
+class CalendarStore:
+    """Loads the calendar once and reloads it only when the file's mtime or size changes."""
+
+    def __init__(self, path: str = CALENDAR_FILE, backend: str = CALENDAR_BACKEND):
+        self.path = path
+        self.backend = backend
+        self._index = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _current_index(self):
+        signature = file_signature(self.path)
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    use_sqlite = self.backend == "sqlite" or (
+                        self.backend == "auto" and signature[1] >= CALENDAR_SQLITE_THRESHOLD_BYTES
+                    )
+                    self._index = SqliteCalendarIndex(self.path, signature) if use_sqlite else MemoryCalendarIndex(self.path)
+                    self._signature = signature
+        return self._index
+
+    def lookup(self, start: str, end: str, user: Optional[str] = None) -> List[Meeting]:
+        """Meetings with start <= date <= end (ISO dates), optionally limited to one user (any case)."""
+        return self._current_index().lookup(start, end, user)
+
+    def warm(self):
+        """Builds the index (and the SQLite import of a large calendar) before the first question."""
+        if os.path.exists(self.path):
+            self._current_index()
+
+    @property
+    def signature(self):
+        return self._signature
+
+
+calendar_store = CalendarStore()
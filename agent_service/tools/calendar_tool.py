@@ -1,20 +1,30 @@
 # tools/calendar_tool.py
 
+import asyncio
 from google.adk.tools import FunctionTool
 from pydantic import BaseModel, Field
-import csv
 import os
 from datetime import datetime
 import logging
 from typing import Optional
+from tools.calendar_store import calendar_store, file_signature
+from tools.memo import memoize
 
 logging.basicConfig(level=logging.INFO)
 
 class CalendarToolArgs(BaseModel):
-    pass  # Currently no arguments, but good to have for potential future use
+    start_date: Optional[str] = Field(default=None, description="First day to check (YYYY-MM-DD), defaults to today.")
+    end_date: Optional[str] = Field(default=None, description="Last day to check (YYYY-MM-DD), defaults to start_date.")
+    user: Optional[str] = Field(default=None, description="Only return meetings for this person.")
 
-def check_calendar(tool_call_id: Optional[str] = None) -> dict:
-    """Checks the calendar for meetings scheduled for today's date.
+async def check_calendar(start_date: Optional[str] = None, end_date: Optional[str] = None, user: Optional[str] = None,
+                   tool_call_id: Optional[str] = None) -> dict:
+    """Checks the calendar for meetings scheduled on a date or within a date range.
+
+    Args:
+        start_date: First day to check in YYYY-MM-DD format. Defaults to today.
+        end_date: Last day to check in YYYY-MM-DD format. Defaults to start_date.
+        user: Only include meetings for this person. Defaults to everyone.
 
     Returns:
         dict: A dictionary with a 'status' key ('success' or 'error') and a 'report'
@@ -22,28 +32,55 @@ def check_calendar(tool_call_id: Optional[str] = None) -> dict:
               if no meetings are found or an error occurs.
     """
     today = datetime.today().strftime("%Y-%m-%d")
-    file_path = os.path.join(os.path.dirname(__file__), "calendar.csv")
-    logging.info(f"[check_calendar] Checking calendar at {file_path} for meetings on {today}")
+    start = start_date or today
+    end = end_date or start
+    logging.info(f"[check_calendar] Checking calendar at {calendar_store.path} for meetings from {start} to {end} (user: {user})")
     try:
-        meetings = []
-        if os.path.exists(file_path):
-            with open(file_path, newline='') as csvfile:
-                reader = csv.DictReader(csvfile)
-                meetings = [row['meeting'] for row in reader if row.get('date') == today]
-        else:
-            logging.warning(f"[check_calendar] Calendar file not found at {file_path}.")
+        for value in (start, end):
+            datetime.strptime(value, "%Y-%m-%d")
+        if end < start:
+            start, end = end, start
+        if not os.path.exists(calendar_store.path):
+            logging.warning(f"[check_calendar] Calendar file not found at {calendar_store.path}.")
             return {"status": "error", "error_message": f"Calendar file not found."}
 
+        # The first lookup after a change reloads the CSV (or re-imports it into SQLite): keep it off the event loop
+        meetings = await asyncio.to_thread(calendar_store.lookup, start, end, user)
+        period = f"on {start}" if start == end else f"from {start} to {end}"
+        if start == end == today:
+            period_label = f"today ({today})"
+        else:
+            period_label = period
+
         if meetings:
-            logging.info(f"[check_calendar] Meetings on {today}: {meetings}")
-            return {"status": "success", "report": f"Meetings on {today}: {', '.join(meetings)}"}
+            logging.info(f"[check_calendar] {len(meetings)} meetings {period}")
+            if start == end:
+                return {"status": "success", "report": f"Meetings {period}: {', '.join(m[1] for m in meetings)}"}
+            return {"status": "success", "report": f"Meetings {period}: " + "; ".join(f"{m[0]}: {m[1]}" for m in meetings)}
         else:
-            logging.info(f"[check_calendar] No meetings found for {today}.")
-            return {"status": "success", "report": f"No meetings scheduled for today ({today})."}
+            logging.info(f"[check_calendar] No meetings found {period}.")
+            return {"status": "success", "report": f"No meetings scheduled for {period_label}."}
 
+    except ValueError as e:
+        logging.error(f"[check_calendar] Invalid date: {e}")
+        return {"status": "error", "error_message": "Dates must use the YYYY-MM-DD format."}
     except Exception as e:
         logging.error(f"[check_calendar] Error reading calendar: {e}")
         return {"status": "error", "error_message": f"Error reading calendar: {str(e)}"}
 
-# ADK function tool
-calendar_tool = FunctionTool(func=check_calendar)
\ No newline at end of file
+def calendar_memo_key(arguments: dict) -> dict:
+    # Omitted dates mean today, so they are resolved before matching calls
+    start = arguments["start_date"] or datetime.today().strftime("%Y-%m-%d")
+    return {**arguments, "start_date": start, "end_date": arguments["end_date"] or start}
+
+def calendar_version():
+    """Memoized reports are dropped when the calendar file changes, and at midnight ("today" moves)."""
+    try:
+        signature = file_signature(calendar_store.path)
+    except OSError:
+        signature = None
+    return signature, datetime.today().date()
+
+# ADK function tool; user names are matched case-insensitively, so calls differing only in case share a result
+calendar_tool = FunctionTool(func=memoize(check_calendar, ttl=float(os.getenv("CALENDAR_MEMO_TTL", "300")),
+                                          normalize=calendar_memo_key, version=calendar_version))
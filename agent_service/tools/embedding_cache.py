@@ -0,0 +1,413 @@
+# agent_service/tools/embedding_cache.py
+"""Embedding cache: a content-hash index plus one append-only vector file per model.
+
+Usage (from agent_service/):
+    python -m tools.embedding_cache stats
+    python -m tools.embedding_cache migrate --delete      # import the old one-file-per-vector cache
+    python -m tools.embedding_cache compact --dtype float16
+
+Each model (namespace) has a directory under EMBEDDING_CACHE_DIR holding `keys.u64`, one 64-bit
+key per row, and `vectors.bin`, the rows as raw float32 (or float16) read through a memory map.
+A key is the first 8 bytes of the SHA-1 of the text.
+
+LangChain's CacheBackedEmbeddings named its files after a UUID derived from that SHA-1, which
+cannot be turned back into a key, so migration hashes the texts of the Chroma collection again
+and picks up the file of each one.
+
+Rows are only ever appended (vectors first, then keys, under a file lock), so a crash leaves at
+worst a partial tail that is ignored, and other processes pick new rows up on their next lookup.
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.INFO)
+load_dotenv()
+
+# Configuration
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float32")  # "float32" or "float16" (half the disk, ~3 digits)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+# Rows appended since the sorted index was built are looked up in a dict until there are this many
+EMBEDDING_CACHE_MERGE_ROWS = 65536
+MIGRATE_BATCH = 4096
+FILE_STORE_UUID_NAMESPACE = uuid.UUID(int=1985)  # langchain.embeddings.cache.NAMESPACE_UUID
+
+DTYPES = {"float32": np.float32, "float16": np.float16}
+KEY_DTYPE = np.dtype("<u8")
+STORE_SUFFIX = ".vectors"
+
+
+def text_key(text: str) -> int:
+    return int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+
+
+def text_keys(texts: Sequence[str]) -> np.ndarray:
+    digests = b"".join([hashlib.sha1(text.encode("utf-8")).digest()[:8] for text in texts])
+    return np.frombuffer(digests, dtype=KEY_DTYPE).copy()
+
+
+def file_store_name(namespace: str, text: str) -> str:
+    """Name of the file CacheBackedEmbeddings.from_bytes_store (default "sha1" key encoder) kept `text`'s vector in."""
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    return namespace + str(uuid.uuid5(FILE_STORE_UUID_NAMESPACE, digest))
+
+
+def store_path(directory: str, namespace: str) -> str:
+    return os.path.join(directory, re.sub(r"[^\w.-]", "_", namespace or "default") + STORE_SUFFIX)
+
+
+class EmbeddingCache:
+    """Vectors of one embedding model, looked up by text in batches.
+
+    `get_many` hashes the texts, finds their rows with a binary search over the sorted keys and
+    gathers the rows from the memory-mapped vector file; misses come back as None. `put_many`
+    appends rows for texts not cached yet. `compact` rewrites the files without duplicate rows,
+    optionally keeping only given texts or converting the dtype. Safe to share between threads
+    and, for readers and appenders, between processes.
+    """
+
+    def __init__(self, namespace: str, directory: str = EMBEDDING_CACHE_DIR, dtype: str = EMBEDDING_CACHE_DTYPE):
+        self.namespace = namespace
+        self.path = store_path(directory, namespace)
+        os.makedirs(self.path, exist_ok=True)
+        self._keys_path = os.path.join(self.path, "keys.u64")
+        self._vectors_path = os.path.join(self.path, "vectors.bin")
+        self._meta_path = os.path.join(self.path, "meta.json")
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        meta = self._read_meta()
+        self.dtype = np.dtype(DTYPES[meta.get("dtype", dtype)])
+        self.dim: Optional[int] = meta.get("dim")
+        self._reload()
+
+    # Files
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(self._meta_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_meta(self, path: str = None):
+        tmp = (path or self._meta_path) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"namespace": self.namespace, "dim": self.dim, "dtype": self.dtype.name, "version": 1}, f)
+        os.replace(tmp, path or self._meta_path)
+
+    @contextmanager
+    def _file_lock(self):
+        with self._lock, open(os.path.join(self.path, "lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _row_bytes(self) -> int:
+        return self.dim * self.dtype.itemsize
+
+    def _stored_rows(self) -> int:
+        """Rows complete in both files; a tail left by an interrupted append is not counted."""
+        if self.dim is None or not os.path.exists(self._keys_path):
+            return 0
+        return min(os.path.getsize(self._keys_path) // KEY_DTYPE.itemsize,
+                   os.path.getsize(self._vectors_path) // self._row_bytes())
+
+    def _reload(self):
+        """(Re)opens the files and rebuilds the sorted index from scratch."""
+        self._inode = os.stat(self._keys_path).st_ino if os.path.exists(self._keys_path) else None
+        self._sorted_keys = np.empty(0, dtype=KEY_DTYPE)
+        self._sorted_rows = np.empty(0, dtype=np.int64)
+        self._pending = {}
+        self._vectors = None
+        self._rows = self._stored_rows()
+        self._merge()
+
+    def _extend(self, rows: int):
+        """Indexes rows [self._rows, rows) appended since the last look."""
+        if rows <= self._rows:
+            return
+        keys = np.fromfile(self._keys_path, dtype=KEY_DTYPE, count=rows - self._rows,
+                           offset=self._rows * KEY_DTYPE.itemsize)
+        for row, key in enumerate(keys.tolist(), start=self._rows):
+            self._pending.setdefault(key, row)
+        self._rows = rows
+        self._vectors = None  # remapped on next read, to cover the new rows
+        if len(self._pending) >= EMBEDDING_CACHE_MERGE_ROWS:
+            self._merge()
+
+    def _merge(self):
+        if not self._rows:
+            return
+        keys = np.fromfile(self._keys_path, dtype=KEY_DTYPE, count=self._rows)
+        # The first row stored for a key wins; later duplicates are left for compaction
+        self._sorted_keys, first = np.unique(keys, return_index=True)
+        self._sorted_rows = first.astype(np.int64)
+        self._pending = {}
+
+    def _refresh(self):
+        """Picks up rows appended by other processes, or a compacted copy swapped in."""
+        inode = os.stat(self._keys_path).st_ino if os.path.exists(self._keys_path) else None
+        if inode != self._inode:
+            meta = self._read_meta()
+            self.dim = meta.get("dim")
+            self.dtype = np.dtype(DTYPES[meta.get("dtype", self.dtype.name)])
+            self._reload()
+            return
+        if self.dim is None:
+            self.dim = self._read_meta().get("dim")  # set by another process's first write
+        self._extend(self._stored_rows())
+
+    def _mapped(self) -> np.ndarray:
+        if self._vectors is None:
+            self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(self._rows, self.dim))
+        return self._vectors
+
+    # Lookups
+
+    def rows_of(self, keys: np.ndarray) -> np.ndarray:
+        """Row of each key, or -1 where the key is not cached."""
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if len(self._sorted_keys):
+            # Searching in key order keeps the binary searches cache-friendly on large batches
+            order = np.argsort(keys)
+            positions = np.empty(len(keys), dtype=np.int64)
+            positions[order] = np.searchsorted(self._sorted_keys, keys[order])
+            positions = np.minimum(positions, len(self._sorted_keys) - 1)
+            found = self._sorted_keys[positions] == keys
+            rows[found] = self._sorted_rows[positions[found]]
+        if self._pending:
+            for index in np.flatnonzero(rows < 0).tolist():
+                rows[index] = self._pending.get(int(keys[index]), -1)
+        return rows
+
+    def get_keys(self, keys: np.ndarray) -> tuple:
+        """(vectors, found): float32 rows for `keys`, zero where `found` is False."""
+        with self._lock:
+            self._refresh()
+            rows = self.rows_of(keys)
+            found = rows >= 0
+            hits = int(found.sum())
+            if hits == len(keys) and hits:
+                # Gathered straight from the map in one copy (float16 rows are widened on the way)
+                vectors = np.asarray(self._mapped()[rows], dtype=np.float32)
+            else:
+                vectors = np.zeros((len(keys), self.dim or 0), dtype=np.float32)
+                if hits:
+                    vectors[found] = self._mapped()[rows[found]]
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return vectors, found
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        vectors, found = self.get_keys(text_keys(texts))
+        return [vector.tolist() if hit else None for vector, hit in zip(vectors, found)]
+
+    # Writes
+
+    def put_keys(self, keys: np.ndarray, vectors) -> int:
+        """Appends the rows whose keys are not cached yet; returns how many were added."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return 0
+        if vectors.ndim != 2 or len(vectors) != len(keys):
+            raise ValueError(f"Expected {len(keys)} vectors, got an array of shape {vectors.shape}")
+        with self._file_lock():
+            self._refresh()
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._write_meta()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"{self.namespace} vectors have {self.dim} dimensions, got {vectors.shape[1]}")
+            _, first = np.unique(keys, return_index=True)  # duplicates within the batch
+            new = np.sort(first[self.rows_of(keys[first]) < 0])
+            if not len(new):
+                return 0
+            # Drop a partial tail left by an interrupted append, then vectors before keys, so a
+            # key never points past the end of the vector file
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(self._rows * self._row_bytes())
+                f.write(vectors[new].astype(self.dtype).tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.truncate(self._rows * KEY_DTYPE.itemsize)
+                f.write(keys[new].astype(KEY_DTYPE).tobytes())
+            if self._inode is None:
+                self._inode = os.stat(self._keys_path).st_ino
+            self._extend(self._rows + len(new))
+        return len(new)
+
+    def put_many(self, texts: Sequence[str], vectors) -> int:
+        return self.put_keys(text_keys(texts), vectors)
+
+    def compact(self, keep: Iterable[str] = None, dtype: str = None) -> dict:
+        """Rewrites the store with one row per key, only for the `keep` texts when given, and in
+        `dtype` when given. The new files are swapped in by renaming the directory; readers in
+        other processes notice on their next lookup."""
+        with self._file_lock():
+            self._refresh()
+            before = self._rows
+            self._merge()
+            rows = self._sorted_rows
+            if keep is not None:
+                rows = rows[np.isin(self._sorted_keys, text_keys(list(keep)))]
+            rows = np.sort(rows)
+            new_dtype = np.dtype(DTYPES[dtype]) if dtype else self.dtype
+            tmp = self.path + ".compacting"
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+            if len(rows):
+                keys = np.fromfile(self._keys_path, dtype=KEY_DTYPE, count=self._rows)[rows]
+                keys.tofile(os.path.join(tmp, "keys.u64"))
+                self._mapped()[rows].astype(new_dtype).tofile(os.path.join(tmp, "vectors.bin"))
+            self.dtype = new_dtype
+            self._write_meta(os.path.join(tmp, "meta.json"))
+            self._vectors = None
+            old = self.path + ".old"
+            shutil.rmtree(old, ignore_errors=True)
+            os.replace(self.path, old)
+            os.replace(tmp, self.path)
+            shutil.rmtree(old, ignore_errors=True)
+            self._reload()
+        logging.info(f"[embedding_cache] Compacted {self.namespace}: {before} -> {self._rows} rows ({self.dtype.name})")
+        return {"rows_before": before, "rows_after": self._rows}
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refresh()
+            size = sum(os.path.getsize(os.path.join(self.path, name)) for name in ("keys.u64", "vectors.bin")
+                       if os.path.exists(os.path.join(self.path, name)))
+            lookups = self.hits + self.misses
+            return {"namespace": self.namespace, "rows": self._rows, "unique": len(self._sorted_keys) + len(self._pending),
+                    "dim": self.dim, "dtype": self.dtype.name, "bytes": size, "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
+
+    def __len__(self) -> int:
+        return self._rows
+
+
+class CachedEmbeddings:
+    """Embeddings in front of an EmbeddingCache: only texts not cached are sent to the model, in
+    one call, and their vectors are stored. Has the `embed_documents`/`embed_query` interface
+    Chroma and the ingestor call, so it drops in where the model's embeddings were used."""
+
+    def __init__(self, embeddings, cache: EmbeddingCache, cache_queries: bool = False):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.cache_queries = cache_queries
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(texts)
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = self.embeddings.embed_documents([texts[index] for index in missing])
+            self.cache.put_many([texts[index] for index in missing], computed)
+            for index, vector in zip(missing, computed):
+                vectors[index] = list(vector)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries rarely repeat exactly; like CacheBackedEmbeddings, they skip the cache by default
+        if not self.cache_queries:
+            return self.embeddings.embed_query(text)
+        return self.embed_documents([text])[0]
+
+
+def cached_embeddings(embeddings, namespace: str):
+    """`embeddings` behind the cache for `namespace`, or as they are when the cache is disabled."""
+    if not EMBEDDING_CACHE_ENABLED:
+        return embeddings
+    return CachedEmbeddings(embeddings, EmbeddingCache(namespace))
+
+
+def corpus_texts() -> Iterator[str]:
+    """Every chunk in the retriever's Chroma collection, the texts the old cache held vectors for."""
+    import chromadb
+    from tools.retriever import COLLECTION_NAME, PERSIST_DIR
+    collection = chromadb.PersistentClient(path=PERSIST_DIR).get_collection(COLLECTION_NAME)
+    offset = 0
+    while True:
+        documents = collection.get(include=["documents"], limit=MIGRATE_BATCH, offset=offset)["documents"]
+        if not documents:
+            return
+        yield from documents
+        offset += len(documents)
+
+
+def migrate_file_store(source: str, namespace: str, cache: EmbeddingCache, texts: Iterable[str],
+                       delete: bool = False) -> dict:
+    """Imports the vectors of `texts` from a LangChain LocalFileStore cache (one JSON file per
+    vector, see `file_store_name`) into `cache`. Files of texts that are not given are left alone."""
+    counts = {"migrated": 0, "missing": 0, "skipped": 0}
+    keys, vectors, done = [], [], []
+    seen = set()
+
+    def flush():
+        counts["migrated"] += cache.put_keys(np.array(keys, dtype=KEY_DTYPE), vectors) if keys else 0
+        if delete:
+            for path in done:
+                os.remove(path)
+        keys.clear()
+        vectors.clear()
+        done.clear()
+
+    for text in texts:
+        name = file_store_name(namespace, text)
+        if name in seen:
+            continue
+        seen.add(name)
+        path = os.path.join(source, name)
+        try:
+            with open(path, "rb") as f:
+                vector = json.loads(f.read())
+        except FileNotFoundError:
+            counts["missing"] += 1
+            continue
+        except ValueError:
+            counts["skipped"] += 1
+            continue
+        keys.append(text_key(text))
+        vectors.append(vector)
+        done.append(path)
+        if len(keys) >= MIGRATE_BATCH:
+            flush()
+    flush()
+    return counts
+
+
+def main():
+    from tools.retriever import EMBEDDING_MODEL
+    parser = argparse.ArgumentParser(description="Inspect, migrate and compact the embedding cache.")
+    parser.add_argument("command", choices=("stats", "migrate", "compact"))
+    parser.add_argument("--namespace", default=EMBEDDING_MODEL, help="Embedding model the vectors belong to")
+    parser.add_argument("--dir", default=EMBEDDING_CACHE_DIR, help="Cache directory")
+    parser.add_argument("--source", help="LocalFileStore directory to migrate, matched against the Chroma collection's texts (default: --dir)")
+    parser.add_argument("--delete", action="store_true", help="Delete migrated LocalFileStore files")
+    parser.add_argument("--dtype", choices=sorted(DTYPES), help="Store vectors in this precision (compact)")
+    args = parser.parse_args()
+
+    cache = EmbeddingCache(args.namespace, directory=args.dir)
+    if args.command == "migrate":
+        counts = migrate_file_store(args.source or args.dir, args.namespace, cache, corpus_texts(), delete=args.delete)
+        print(json.dumps(counts))
+    elif args.command == "compact":
+        print(json.dumps(cache.compact(dtype=args.dtype)))
+    print(json.dumps(cache.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+# agent_service/tools/ingest.py
+"""Incremental ingestion of local files, directories and URLs into the retriever's Chroma collection.
+
+Usage (from agent_service/):
+    python -m tools.ingest docs/ notes.md https://example.com/post --workers 4 --batch-size 64
+
+Chunks get stable ids derived from their source and content hash, so re-running only embeds
+new or changed chunks and deletes the ones that disappeared. Progress is recorded per source
+in a manifest next to the Chroma files, checkpointed every few seconds; an interrupted run
+resumes from the last checkpoint.
+
+Collections built by `python -m tools.retriever` store the same documents under random UUIDs.
+The first ingestion of such a source deletes those chunks, so its passages are not returned twice.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from dotenv import load_dotenv
+
+from tools.retriever import (
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    COLLECTION_NAME,
+    EMBEDDING_MODEL,
+    OLLAMA_SERVER_URL,
+    PERSIST_DIR,
+    BM25_INDEX_PATH,
+    RETRIEVER_HYBRID,
+)
+
+logging.basicConfig(level=logging.INFO)
+load_dotenv()
+
+# Configuration
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+MANIFEST_PATH = os.path.join(PERSIST_DIR, "ingest_manifest.json")
+MANIFEST_SAVE_INTERVAL = 2.0  # seconds; bounds rewrite cost on first ingestion of large corpora
+SUPPORTED_SUFFIXES = {".md", ".markdown", ".txt", ".html", ".htm", ".pdf"}
+
+
+def sha256(data: str) -> str:
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def is_url(source: str) -> bool:
+    return source.startswith("http://") or source.startswith("https://")
+
+
+def expand_sources(inputs: List[str]) -> Iterator[str]:
+    """Yields URLs as given and every supported file under the given paths."""
+    for item in inputs:
+        if is_url(item):
+            yield item
+            continue
+        path = Path(item)
+        if path.is_dir():
+            for file in sorted(path.rglob("*")):
+                if file.is_file() and file.suffix.lower() in SUPPORTED_SUFFIXES:
+                    yield str(file.resolve())
+        elif path.is_file():
+            yield str(path.resolve())
+        else:
+            logging.warning(f"[ingest] Skipping {item}: not a file, directory or URL")
+
+
+def html_to_text(html: str) -> str:
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, "html.parser").get_text(separator="\n")
+
+
+def load_text(source: str) -> str:
+    if is_url(source):
+        import requests
+        response = requests.get(source, timeout=30)
+        response.raise_for_status()
+        return html_to_text(response.text)
+    suffix = Path(source).suffix.lower()
+    if suffix == ".pdf":
+        from pypdf import PdfReader
+        return "\n".join(page.extract_text() or "" for page in PdfReader(source).pages)
+    text = Path(source).read_text(encoding="utf-8", errors="replace")
+    if suffix in (".html", ".htm"):
+        return html_to_text(text)
+    return text
+
+
+def source_fingerprint(source: str) -> str:
+    """Cheap change check for files (size + mtime); URLs are always re-read and compared by content."""
+    if is_url(source):
+        return ""
+    stat = os.stat(source)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def source_key(source: str) -> str:
+    """Prefix of every chunk id of a source."""
+    return sha256(source)[:16]
+
+
+def split_chunks(source: str, text: str) -> Dict[str, Tuple[str, dict]]:
+    """Returns chunk id -> (text, metadata); identical chunks within a source collapse to one id.
+
+    The metadata holds nothing that depends on a chunk's position, since an unchanged chunk keeps
+    its id (and its stored metadata) when text before it is edited.
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    prefix = source_key(source)
+    chunks = {}
+    for chunk in splitter.split_text(text):
+        chunks.setdefault(f"{prefix}-{sha256(chunk)[:32]}", (chunk, {"source": source}))
+    return chunks
+
+
+class Manifest:
+    """Per-source record of what is already in the collection, rewritten atomically after each source."""
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.sources: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.sources = json.load(f)
+
+    def save(self):
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.sources, f)
+        os.replace(tmp_path, self.path)
+
+
+class Ingestor:
+    def __init__(self, batch_size: int = INGEST_BATCH_SIZE, workers: int = INGEST_WORKERS,
+                 collection=None, embeddings=None, manifest: Manifest = None):
+        self.batch_size = batch_size
+        self.workers = workers
+        if embeddings is None:
+            from langchain_ollama import OllamaEmbeddings
+            from tools.embedding_cache import cached_embeddings
+            # Chunks deleted and re-added, or rebuilt into a fresh collection, are not embedded again
+            embeddings = cached_embeddings(OllamaEmbeddings(model=EMBEDDING_MODEL, base_url=OLLAMA_SERVER_URL),
+                                           EMBEDDING_MODEL)
+        self.embeddings = embeddings
+        if collection is None:
+            import chromadb
+            Path(PERSIST_DIR).mkdir(parents=True, exist_ok=True)
+            collection = chromadb.PersistentClient(path=PERSIST_DIR).get_or_create_collection(COLLECTION_NAME)
+        self.collection = collection
+        self.manifest = manifest or Manifest()
+        self.stats = {"sources": 0, "unchanged": 0, "embedded": 0, "deleted": 0, "legacy_deleted": 0, "failed": 0}
+        # Sources are read and split on one pool; their embedding batches all share a second pool,
+        # so both many small files and a few large ones keep every worker busy
+        self._embed_pool = None
+        self._write_lock = threading.Lock()
+        self._saved_at = time.monotonic()
+
+    def _checkpoint(self, force: bool = False):
+        # Called with _write_lock held. Work done after the last checkpoint is redone on resume,
+        # which is safe because chunks are upserted by id
+        if force or time.monotonic() - self._saved_at >= MANIFEST_SAVE_INTERVAL:
+            self.manifest.save()
+            self._saved_at = time.monotonic()
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        """Embeds texts in batches spread over the shared embedding pool."""
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        vectors = []
+        for batch_vectors in self._embed_pool.map(self.embeddings.embed_documents, batches):
+            vectors.extend(batch_vectors)
+        return vectors
+
+    def ingest_source(self, source: str):
+        with self._write_lock:
+            self.stats["sources"] += 1
+            previous = dict(self.manifest.sources.get(source, {}))
+        fingerprint = source_fingerprint(source)
+        if fingerprint and previous.get("fingerprint") == fingerprint:
+            with self._write_lock:
+                self.stats["unchanged"] += 1
+            return
+
+        text = load_text(source)
+        content_hash = sha256(text)
+        if previous.get("content_hash") == content_hash:
+            with self._write_lock:
+                self.manifest.sources[source]["fingerprint"] = fingerprint
+                self._checkpoint()
+                self.stats["unchanged"] += 1
+            return
+
+        chunks = split_chunks(source, text)
+        old_ids = set(previous.get("chunk_ids", []))
+        new_ids = [chunk_id for chunk_id in chunks if chunk_id not in old_ids]
+        stale_ids = sorted(old_ids - set(chunks))
+
+        documents = [chunks[chunk_id][0] for chunk_id in new_ids]
+        embeddings = self._embed(documents) if new_ids else []
+
+        with self._write_lock:
+            legacy_ids = [] if previous else self._legacy_ids(source)
+            if legacy_ids:
+                self.collection.delete(ids=legacy_ids)
+                self.stats["legacy_deleted"] += len(legacy_ids)
+            for start in range(0, len(new_ids), self.batch_size):
+                end = start + self.batch_size
+                self.collection.upsert(
+                    ids=new_ids[start:end],
+                    embeddings=embeddings[start:end],
+                    documents=documents[start:end],
+                    metadatas=[chunks[chunk_id][1] for chunk_id in new_ids[start:end]],
+                )
+            if stale_ids:
+                self.collection.delete(ids=stale_ids)
+
+            self.manifest.sources[source] = {
+                "fingerprint": fingerprint,
+                "content_hash": content_hash,
+                "chunk_ids": sorted(chunks),
+                "ingested_at": time.time(),
+            }
+            self._checkpoint()
+            self.stats["embedded"] += len(new_ids)
+            self.stats["deleted"] += len(stale_ids)
+        logging.info(f"[ingest] {source}: {len(new_ids)} new chunks, {len(stale_ids)} removed"
+                     + (f", {len(legacy_ids)} legacy chunks replaced" if legacy_ids else ""))
+
+    def _legacy_ids(self, source: str) -> List[str]:
+        """Chunks of this source stored under ids this module did not derive (UUIDs from tools.retriever)."""
+        prefix = f"{source_key(source)}-"
+        stored = self.collection.get(where={"source": source}, include=[])["ids"]
+        return [chunk_id for chunk_id in stored if not chunk_id.startswith(prefix)]
+
+    def delete_missing(self, sources: List[str]):
+        """Removes every source that is in the manifest but not in this run's inputs."""
+        for source in sorted(set(self.manifest.sources) - set(sources)):
+            chunk_ids = self.manifest.sources.pop(source).get("chunk_ids", [])
+            if chunk_ids:
+                self.collection.delete(ids=chunk_ids)
+            self._checkpoint()
+            self.stats["deleted"] += len(chunk_ids)
+            logging.info(f"[ingest] {source}: removed ({len(chunk_ids)} chunks)")
+        self._checkpoint(force=True)
+
+    def run(self, inputs: List[str], delete_missing: bool = False) -> dict:
+        started = time.monotonic()
+        sources = list(expand_sources(inputs))
+
+        def ingest(source: str):
+            try:
+                self.ingest_source(source)
+            except Exception as e:
+                with self._write_lock:
+                    self.stats["failed"] += 1
+                logging.error(f"[ingest] Failed to ingest {source}: {e}")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as self._embed_pool, \
+                ThreadPoolExecutor(max_workers=self.workers) as source_pool:
+            list(source_pool.map(ingest, sources))
+        with self._write_lock:
+            self._checkpoint(force=True)
+        if delete_missing:
+            self.delete_missing(sources)
+        if RETRIEVER_HYBRID and (self.stats["embedded"] or self.stats["deleted"] or not os.path.exists(BM25_INDEX_PATH)):
+            from tools.hybrid_search import build_from_collection
+            build_from_collection(self.collection, BM25_INDEX_PATH)
+        self.stats["seconds"] = round(time.monotonic() - started, 2)
+        return self.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally ingest documents into the retriever corpus.")
+    parser.add_argument("inputs", nargs="+", help="Files, directories or URLs to ingest")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Chunks per embedding call")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Concurrent embedding calls")
+    parser.add_argument("--delete-missing", action="store_true",
+                        help="Remove previously ingested sources that are not among the inputs")
+    args = parser.parse_args()
+
+    stats = Ingestor(batch_size=args.batch_size, workers=args.workers).run(args.inputs, args.delete_missing)
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
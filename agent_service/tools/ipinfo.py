@@ -1,8 +1,13 @@
 import requests
 import logging
+from tools.weather_providers import HTTP_TIMEOUT, IpInfoLocationProvider
 
 logging.basicConfig(level=logging.INFO)
 
+# Pooled keep-alive session for synchronous callers; async code should use
+# tools.weather_providers.current_location, which is cached and coalesced.
+_session = requests.Session()
+
 def get_current_location():
     """
     {
@@ -19,7 +24,7 @@ def get_current_location():
     }
     """
     try:
-        response = requests.get("https://ipinfo.io/json")
+        response = _session.get(IpInfoLocationProvider.URL, timeout=(HTTP_TIMEOUT.connect, HTTP_TIMEOUT.read))
         data = response.json()
         return {
             "ip": data.get("ip"),
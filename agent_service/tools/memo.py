@@ -0,0 +1,212 @@
+# tools/memo.py
+import asyncio
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from core.metrics import registry
+
+logging.basicConfig(level=logging.INFO)
+
+# Configuration
+TOOL_MEMO_ENABLED = os.getenv("TOOL_MEMO_ENABLED", "true").lower() == "true"
+TOOL_MEMO_MAX_ENTRIES = int(os.getenv("TOOL_MEMO_MAX_ENTRIES", "2000"))
+# Cross-run lifetime per tool as "tool=seconds,..."; overrides the defaults set where each tool is wrapped
+TOOL_MEMO_TTLS = os.getenv("TOOL_MEMO_TTLS", "")
+
+# Arguments that identify a call rather than describe it
+IGNORED_ARGS = {"tool_call_id", "tool_context"}
+
+tool_memo_total = registry.counter("agent_tool_memo_total", "Tool calls by memo outcome (run_hit, shared_hit, coalesced, miss)",
+                                   ("tool", "result"))
+
+# Results of the tool calls made during the current agent run, shared by its sub-tasks
+_run_results: contextvars.ContextVar[Optional[Dict[tuple, asyncio.Future]]] = contextvars.ContextVar("tool_memo_run", default=None)
+
+
+def parse_ttls(value: str) -> Dict[str, float]:
+    ttls = {}
+    for pair in filter(None, (part.strip() for part in value.split(","))):
+        name, _, seconds = pair.partition("=")
+        ttls[name.strip()] = float(seconds)
+    return ttls
+
+
+def normalize_value(value, fold_case: bool = True):
+    if isinstance(value, str):
+        return " ".join((value.lower() if fold_case else value).split())
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize_value(item, fold_case) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, normalize_value(item, fold_case)) for key, item in value.items()))
+    return value
+
+
+def succeeded(result) -> bool:
+    """Error results are usually transient (a provider timeout), so they are never reused across runs."""
+    return not (isinstance(result, dict) and result.get("status") == "error")
+
+
+@contextmanager
+def run_scope():
+    """Identical tool calls inside this block (one agent run, including its sub-questions) run once."""
+    token = _run_results.set({})
+    try:
+        yield
+    finally:
+        try:
+            _run_results.reset(token)
+        except ValueError:
+            pass  # a streaming generator abandoned by its consumer is closed from another context
+
+
+class ToolMemo:
+    """Memoizes one tool function at two levels.
+
+    - Within a run: an identical call returns the first call's result, and a call still in
+      flight is shared rather than started twice.
+    - Across runs: successful results are kept in an LRU for the tool's TTL.
+
+    Calls are matched on their bound arguments, with defaults filled in and strings
+    whitespace-collapsed and, unless `fold_case` is off, lowercased (`normalize` can add
+    tool-specific rules). Cross-run entries are dropped when `version()` changes, e.g. when
+    the file a tool reads is modified.
+    """
+
+    def __init__(self, func: Callable, ttl: float, normalize: Callable[[dict], dict] = None,
+                 version: Callable[[], Any] = None, fold_case: bool = True, max_entries: int = TOOL_MEMO_MAX_ENTRIES):
+        self.func = func
+        self.name = func.__name__
+        self.ttl = parse_ttls(TOOL_MEMO_TTLS).get(self.name, ttl)
+        self.normalize = normalize
+        self.fold_case = fold_case
+        self.version = version
+        self.max_entries = max_entries
+        self.signature = inspect.signature(func)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (expires_at, result)
+        self._version = None
+        self.counts = {"run_hit": 0, "shared_hit": 0, "coalesced": 0, "miss": 0}
+
+    def key(self, args: tuple, kwargs: dict) -> tuple:
+        bound = self.signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = {name: value for name, value in bound.arguments.items() if name not in IGNORED_ARGS}
+        if self.normalize is not None:
+            arguments = self.normalize(arguments)
+        return tuple(sorted((name, normalize_value(value, self.fold_case)) for name, value in arguments.items()))
+
+    def invalidate(self):
+        self._entries.clear()
+
+    def _count(self, result: str):
+        self.counts[result] += 1
+        tool_memo_total.inc(tool=self.name, result=result)
+
+    def _shared_lookup(self, key: tuple):
+        if self.version is not None:
+            version = self.version()
+            if version != self._version:
+                if self._entries:
+                    logging.info(f"[tool_memo] {self.name} inputs changed, dropping {len(self._entries)} results")
+                self._entries.clear()
+                self._version = version
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _shared_store(self, key: tuple, result):
+        if self.ttl <= 0 or not succeeded(result):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, result)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def call(self, *args, **kwargs):
+        key = self.key(args, kwargs)
+        run_results = _run_results.get()
+        if run_results is not None and key in run_results:
+            future = run_results[key]
+            self._count("run_hit" if future.done() else "coalesced")
+            return await asyncio.shield(future)
+
+        entry = self._shared_lookup(key)
+        if entry is not None:
+            self._count("shared_hit")
+            if run_results is not None:
+                run_results[key] = completed(entry[1])
+            return entry[1]
+
+        self._count("miss")
+        future = asyncio.get_running_loop().create_future()
+        if run_results is not None:
+            run_results[key] = future
+        try:
+            result = self.func(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+        except BaseException as e:
+            if run_results is not None:
+                run_results.pop(key, None)
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # mark as retrieved, in case no other caller was waiting
+            raise
+        future.set_result(result)
+        self._shared_store(key, result)
+        return result
+
+    def stats(self) -> dict:
+        calls = sum(self.counts.values())
+        hits = calls - self.counts["miss"]
+        return {"entries": len(self._entries), "ttl_seconds": self.ttl, **self.counts,
+                "hit_rate": round(hits / calls, 4) if calls else 0.0}
+
+
+def completed(value) -> asyncio.Future:
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(value)
+    return future
+
+
+memos: Dict[str, ToolMemo] = {}
+
+
+def memoize(func: Callable, ttl: float, normalize: Callable[[dict], dict] = None, version: Callable[[], Any] = None,
+            fold_case: bool = True) -> Callable:
+    """Wraps a tool function with a ToolMemo. The wrapper keeps the function's name, docstring and
+    signature, so FunctionTool builds the same declaration for the model."""
+    if not TOOL_MEMO_ENABLED:
+        return func
+    memo = ToolMemo(func, ttl, normalize, version, fold_case)
+    memos[memo.name] = memo
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await memo.call(*args, **kwargs)
+
+    wrapper.memo = memo
+    return wrapper
+
+
+def invalidate(name: str = None):
+    """Drops cross-run results for one tool, or for all of them."""
+    for memo in memos.values():
+        if name is None or memo.name == name:
+            memo.invalidate()
+
+
+def stats() -> dict:
+    return {name: memo.stats() for name, memo in memos.items()}
@@ -1,21 +1,20 @@
 # agent_service/tools/retriever.py
 import os
+import re
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
 import logging
 from pathlib import Path
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain.storage import LocalFileStore
-from langchain.embeddings import CacheBackedEmbeddings
+from typing import Any, Callable, List
+
+import numpy as np
 
 logging.basicConfig(level=logging.INFO)
 load_dotenv()
 
 # Configuration
 PERSIST_DIR = "./chroma_db"
-EMBEDDING_CACHE_DIR = "./embedding_cache"
 COLLECTION_NAME = "lilian-blog"
 EMBEDDING_MODEL = os.getenv("MODEL")
 OLLAMA_SERVER_URL = os.getenv("BASE_URL")
@@ -25,6 +24,13 @@ BLOG_URLS = [
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 100
 k = 3
+RETRIEVER_CACHE_SIZE = int(os.getenv("RETRIEVER_CACHE_SIZE", "1024"))
+BM25_INDEX_PATH = os.path.join(PERSIST_DIR, "bm25_index.json")
+RETRIEVER_HYBRID = os.getenv("RETRIEVER_HYBRID", "true").lower() == "true"
+RETRIEVER_MMR = os.getenv("RETRIEVER_MMR", "true").lower() == "true"
+RETRIEVER_MMR_LAMBDA = float(os.getenv("RETRIEVER_MMR_LAMBDA", "0.5"))
+RETRIEVER_CANDIDATES = int(os.getenv("RETRIEVER_CANDIDATES", "4"))  # candidates fetched per result, per ranker
+RETRIEVER_TOKEN_BUDGET = int(os.getenv("RETRIEVER_TOKEN_BUDGET", "600"))
 
 def is_chroma_db_initialized(persist_dir: str) -> bool:
     """Check if ChromaDB is properly initialized after saving."""
@@ -49,26 +55,28 @@ def is_chroma_db_initialized(persist_dir: str) -> bool:
     return all(os.path.exists(os.path.join(collection_path, f)) for f in required_collection_files)
 
 def initialize_retriever():
+    """Builds (or loads) the Chroma corpus. Offline use only: this may fetch BLOG_URLS and embed everything."""
+    from langchain_community.document_loaders import WebBaseLoader
+    from langchain_chroma import Chroma
+    from langchain_ollama import OllamaEmbeddings
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from tools.embedding_cache import cached_embeddings as with_cache
+
     # Configure Ollama embeddings with correct server URL
     embeddings = OllamaEmbeddings(
         model=EMBEDDING_MODEL,
         base_url=OLLAMA_SERVER_URL
     )
-    
+
     # Create directory if it doesn't exist
     Path(PERSIST_DIR).mkdir(parents=True, exist_ok=True)
 
-    # Create cached embeddings
-    fs = LocalFileStore(EMBEDDING_CACHE_DIR)
-    cached_embeddings = CacheBackedEmbeddings.from_bytes_store(
-        embeddings,
-        fs,
-        namespace=EMBEDDING_MODEL
-    )
+    # Create cached embeddings (see tools/embedding_cache.py)
+    cached_embeddings = with_cache(embeddings, EMBEDDING_MODEL)
 
     # Create directory if it doesn't exist
     Path(PERSIST_DIR).mkdir(parents=True, exist_ok=True)
-    
+
     if is_chroma_db_initialized(PERSIST_DIR):
         try:
             logging.info("Loading existing ChromaDB from persistence directory")
@@ -79,19 +87,19 @@ def initialize_retriever():
             ).as_retriever(search_kwargs={"k": k})
         except Exception as e:
             logging.error(f"Failed to load existing ChromaDB: {e}")
-    
+
     # Create new vectorstore if needed
     logging.info("Creating new ChromaDB vectorstore")
     try:
         loader = WebBaseLoader(BLOG_URLS)
         docs = loader.load()
-        
+
         splitter = RecursiveCharacterTextSplitter(
             chunk_size=CHUNK_SIZE,
             chunk_overlap=CHUNK_OVERLAP
         )
         splits = splitter.split_documents(docs)
-        
+
         # Create and return the vectorstore - persistence is automatic
         vectorstore = Chroma.from_documents(
             documents=splits,
@@ -99,10 +107,178 @@ def initialize_retriever():
             collection_name=COLLECTION_NAME,
             persist_directory=PERSIST_DIR
         )
-        
+
         return vectorstore.as_retriever(search_kwargs={"k": k})
     except Exception as e:
         logging.error(f"Failed to create new ChromaDB: {e}")
         raise
 
-retriever = initialize_retriever()
\ No newline at end of file
+
+def corpus_version():
+    """Ingestion rewrites the collection and its BM25 index, so a change to either file means a new corpus."""
+    return tuple(os.stat(path).st_mtime_ns if os.path.exists(path) else None
+                 for path in (BM25_INDEX_PATH, os.path.join(PERSIST_DIR, "chroma.sqlite3")))
+
+
+class RetrieverService:
+    """Read-only hybrid search over the persisted Chroma collection.
+
+    Opens the collection and its BM25 index lazily (or at startup through `warm`) and never
+    loads or embeds the corpus itself. A query is answered by fusing vector and BM25 rankings
+    with reciprocal rank fusion, optionally diversified with MMR, then packed into a token
+    budget. Queries are embedded in batches, and normalized query -> results are kept in an LRU.
+    When `version()` changes (a new ingestion), the LRU is dropped and the BM25 index reloaded.
+    """
+
+    def __init__(self, cache_size: int = RETRIEVER_CACHE_SIZE, version: Callable[[], Any] = corpus_version):
+        self.cache_size = cache_size
+        self.version = version
+        self._cache: "OrderedDict[tuple, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._collection = None
+        self._bm25 = None
+        self._embeddings = None
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._collection is not None
+
+    def _load(self):
+        if self._collection is not None and self.version() == self._version:
+            return
+        with self._lock:
+            if self._collection is not None:
+                if self.version() == self._version:
+                    return
+                # Results cached for the old corpus may cite chunks that are gone or miss new ones
+                logging.info("[retriever] Corpus changed on disk, dropping cached results and reloading BM25")
+                self._cache.clear()
+                self.reloads += 1
+                if RETRIEVER_HYBRID:
+                    self._bm25 = self._load_bm25(self._collection)
+            else:
+                if not is_chroma_db_initialized(PERSIST_DIR):
+                    raise RuntimeError(f"No persisted Chroma collection in {PERSIST_DIR}; build the corpus first.")
+                import chromadb
+                from langchain_ollama import OllamaEmbeddings
+                self._embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL, base_url=OLLAMA_SERVER_URL)
+                collection = chromadb.PersistentClient(path=PERSIST_DIR).get_collection(COLLECTION_NAME)
+                if RETRIEVER_HYBRID:
+                    self._bm25 = self._load_bm25(collection)
+                self._collection = collection
+                logging.info(f"[retriever] Opened Chroma collection '{COLLECTION_NAME}' from {PERSIST_DIR}")
+            # Read after a rebuild, which rewrites the index file itself
+            self._version = self.version()
+
+    @staticmethod
+    def _load_bm25(collection):
+        from tools.hybrid_search import BM25Index, build_from_collection
+        bm25 = BM25Index.load(BM25_INDEX_PATH)
+        if bm25 is None or bm25.source_count != collection.count():
+            logging.info("[retriever] BM25 index missing or stale, rebuilding from the collection")
+            bm25 = build_from_collection(collection, BM25_INDEX_PATH)
+        return bm25
+
+    def warm(self):
+        """Opens the collection and loads the embedding model so the first query is fast."""
+        self._load()
+        self._embeddings.embed_query("warmup")
+
+    @staticmethod
+    def _cache_key(query: str, k: int) -> tuple:
+        return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split()), k
+
+    def _search(self, query: str, vector: List[float], k: int) -> List[dict]:
+        from tools import hybrid_search
+        n_candidates = max(k * RETRIEVER_CANDIDATES, k)
+        hits = self._collection.query(query_embeddings=[vector], n_results=n_candidates,
+                                      include=["documents", "metadatas", "embeddings"])
+        chunks = {}
+        vectors = {}
+        vector_ranking = hits["ids"][0]
+        for index, chunk_id in enumerate(vector_ranking):
+            chunks[chunk_id] = {"content": hits["documents"][0][index], "metadata": hits["metadatas"][0][index]}
+            vectors[chunk_id] = np.asarray(hits["embeddings"][0][index], dtype=np.float32)
+
+        rankings = [vector_ranking]
+        if self._bm25 is not None:
+            rankings.append([chunk_id for chunk_id, _ in self._bm25.search(query, n_candidates)])
+        candidates = hybrid_search.reciprocal_rank_fusion(rankings)[:n_candidates]
+
+        missing = [chunk_id for chunk_id in candidates if chunk_id not in chunks]
+        if missing:
+            extra = self._collection.get(ids=missing, include=["documents", "metadatas", "embeddings"])
+            for index, chunk_id in enumerate(extra["ids"]):
+                chunks[chunk_id] = {"content": extra["documents"][index], "metadata": extra["metadatas"][index]}
+                vectors[chunk_id] = np.asarray(extra["embeddings"][index], dtype=np.float32)
+
+        if RETRIEVER_MMR:
+            selected = hybrid_search.mmr(np.asarray(vector, dtype=np.float32), candidates, vectors, k,
+                                         RETRIEVER_MMR_LAMBDA)
+        else:
+            selected = candidates[:k]
+        return hybrid_search.pack([chunks[chunk_id] for chunk_id in selected if chunk_id in chunks],
+                                  RETRIEVER_TOKEN_BUDGET)
+
+    def retrieve_many(self, queries: List[str], k: int = k) -> List[List[dict]]:
+        """Top-k passages for every query; uncached queries are embedded together in one call."""
+        self._load()
+        version = self._version
+        results = [None] * len(queries)
+        missing = []
+        with self._lock:
+            for index, query in enumerate(queries):
+                key = self._cache_key(query, k)
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    results[index] = self._cache[key]
+                    self.hits += 1
+                else:
+                    missing.append(index)
+                    self.misses += 1
+
+        if missing:
+            vectors = self._embeddings.embed_documents([queries[index] for index in missing])
+            for index, vector in zip(missing, vectors):
+                results[index] = self._search(queries[index], vector, k)
+            with self._lock:
+                # Not when the corpus changed mid-search: these results may come from the old one
+                if self._version == version:
+                    for index in missing:
+                        self._cache[self._cache_key(queries[index], k)] = results[index]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return results
+
+    def retrieve(self, query: str, k: int = k) -> List[dict]:
+        return self.retrieve_many([query], k)[0]
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "hybrid": self._bm25 is not None,
+            "cached_queries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+        }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_retriever_service() -> RetrieverService:
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = RetrieverService()
+        return _service
+
+
+if __name__ == "__main__":
+    # Build the persisted corpus ahead of time, e.g. `python -m tools.retriever`
+    initialize_retriever()
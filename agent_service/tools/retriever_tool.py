@@ -1,9 +1,12 @@
 # tools/retriever_tool.py
+import asyncio
 import logging
 from google.adk.tools import FunctionTool
 from pydantic import BaseModel, Field
-# from tools.retriever import retriever  # This imports the pre-initialized retriever
+from tools.retriever import corpus_version, get_retriever_service
+from tools.memo import memoize
 from typing import Optional
+import os
 
 logging.basicConfig(level=logging.INFO)
 k_default = 3  # Default number of documents to return
@@ -12,29 +15,24 @@ class RetrieverToolArgs(BaseModel):
     query: str = Field(description="The search query to retrieve information in the blog posts.")
     k: Optional[int] = Field(default=k_default, description="Number of documents to return")
 
-def retrieve_information(query: str, k: Optional[int] = k_default, tool_call_id: Optional[str] = None) -> dict:
+async def retrieve_information(query: str, k: Optional[int] = k_default, tool_call_id: Optional[str] = None) -> dict:
     """
     Searches blog posts about LLM agents, prompt engineering, and adversarial attacks.
     Returns relevant passages based on semantic similarity.
     """
     logging.info(f"[retrieve_information] Searching for: {query} (k={k})")
     try:
-        # # Update search parameters
-        # retriever.search_kwargs["k"] = k
-        # results = retriever.invoke(query)
-        # logging.info(f"[retrieve_information] Retrieved {len(results)} documents")
-        # formatted_results = [{"content": doc.page_content, "metadata": doc.metadata} for doc in results]
-        # return {
-        #     "status": "success",
-        #     "results": formatted_results
-        # }
+        # Loading the index, embedding the query (Ollama) and searching Chroma all block: keep them off the event loop
+        formatted_results = await asyncio.to_thread(lambda: get_retriever_service().retrieve(query, k=k or k_default))
+        logging.info(f"[retrieve_information] Retrieved {len(formatted_results)} documents")
         return {
             "status": "success",
-            "results": "Direct response not from blog"
+            "results": formatted_results
         }
     except Exception as e:
         logging.error(f"[retrieve_information] Error: {e}")
         return {"status": "error", "message": f"Retrieval failed: {str(e)}"}
 
-# ADK function tool
-retriever_tool = FunctionTool(func=retrieve_information)
\ No newline at end of file
+# ADK function tool; memoized results are dropped with the service's own cache when the corpus changes
+retriever_tool = FunctionTool(func=memoize(retrieve_information, ttl=float(os.getenv("RETRIEVER_MEMO_TTL", "3600")),
+                                           version=corpus_version))
\ No newline at end of file
@@ -0,0 +1,208 @@
+# tools/weather_providers.py
+import asyncio
+import logging
+import os
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.INFO)
+load_dotenv()
+
+# Configuration
+WEATHER_PROVIDER = os.getenv("WEATHER_PROVIDER", "mock")  # "mock" or "openweathermap"
+WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+LOCATION_CACHE_TTL = float(os.getenv("LOCATION_CACHE_TTL", "3600"))
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "10000"))  # per cache (weather, locations)
+HTTP_TIMEOUT = httpx.Timeout(float(os.getenv("HTTP_TIMEOUT_SECONDS", "5")), connect=2.0)
+HTTP_LIMITS = httpx.Limits(max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "50")), max_keepalive_connections=20)
+
+# Base mock data in Celsius (expanded for more Indian cities)
+MOCK_WEATHER_CELSIUS = {
+    "newyork": {"condition": "sunny", "temp": 25},
+    "london": {"condition": "cloudy", "temp": 15},
+    "tokyo": {"condition": "light rain", "temp": 18},
+    "chicago": {"condition": "sunny", "temp": 25},
+    "toronto": {"condition": "partly cloudy", "temp": 30},
+    "chennai": {"condition": "rainy", "temp": 35},
+    "bengaluru": {"condition": "sunny", "temp": 30},
+    "newdelhi": {"condition": "cloudy", "temp": 40},
+    "kolkata": {"condition": "sunny", "temp": 38},
+    "mumbai": {"condition": "cloudy", "temp": 32},
+    "vijayapura": {"condition": "pleasant", "temp": 33}, # Added Vijayapura
+    "hyderabad": {"condition": "warm", "temp": 34},
+    "pune": {"condition": "clear", "temp": 31},
+}
+
+
+def normalize_city(city: str) -> str:
+    return city.lower().replace(" ", "")
+
+
+# Keyed by the loop itself: a closed loop's id can be reused by the next one
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+def get_http_client() -> httpx.AsyncClient:
+    """One pooled keep-alive client per event loop (the sync llm_call wrapper runs its own loop)."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+        _clients[loop] = client
+    return client
+
+async def close_http_client():
+    """Closes the running loop's client; call it before a short-lived loop ends."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+async def close_http_clients():
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
+
+
+class FetchAbandoned(Exception):
+    """The call a coalesced lookup was waiting on was cancelled; the waiter fetches again."""
+
+
+class CachedFetcher:
+    """TTL cache with single-flight: concurrent misses for one key share a single upstream call.
+
+    Entries are kept in insertion order, which with one TTL is also expiry order: each insert
+    drops the expired entries at the front, then the oldest ones beyond `max_entries`.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = WEATHER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._values: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, key: str, fetch: Callable[[], Awaitable]):
+        cached = self._values.get(key)
+        if cached and cached[0] > time.monotonic():
+            self.hits += 1
+            return cached[1]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(in_flight)
+            except FetchAbandoned:
+                # The caller that owned the fetch went away; one of its waiters takes over
+                return await self.get(key, fetch)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            # Waiters must not see this caller's cancellation as their own
+            future.set_exception(FetchAbandoned(key))
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark as retrieved, in case no other caller was waiting
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+        # Unknown keys (None) are not cached, so they are looked up again next time
+        if value is not None:
+            self._store(key, value)
+        future.set_result(value)
+        return value
+
+    def _store(self, key: str, value):
+        now = time.monotonic()
+        self._values.pop(key, None)
+        self._values[key] = (now + self.ttl, value)
+        while self._values:
+            oldest_key, (expires_at, _) = next(iter(self._values.items()))
+            if expires_at > now and len(self._values) <= self.max_entries:
+                break
+            del self._values[oldest_key]
+
+    def stats(self) -> dict:
+        return {"entries": len(self._values), "hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
+
+
+class WeatherProvider(ABC):
+    """Current conditions for a city, as {"condition": str, "temp": celsius}, or None if unknown."""
+
+    @abstractmethod
+    async def current(self, city: str) -> Optional[dict]:
+        ...
+
+
+class MockWeatherProvider(WeatherProvider):
+    """Local stand-in backed by the built-in table; used by default and in tests."""
+
+    async def current(self, city: str) -> Optional[dict]:
+        return MOCK_WEATHER_CELSIUS.get(normalize_city(city))
+
+
+class OpenWeatherMapProvider(WeatherProvider):
+    URL = "https://api.openweathermap.org/data/2.5/weather"
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    async def current(self, city: str) -> Optional[dict]:
+        response = await get_http_client().get(self.URL, params={"q": city, "appid": self.api_key, "units": "metric"})
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        data = response.json()
+        return {"condition": data["weather"][0]["description"], "temp": data["main"]["temp"]}
+
+
+class IpInfoLocationProvider:
+    URL = "https://ipinfo.io/json"
+
+    async def current(self) -> dict:
+        response = await get_http_client().get(self.URL)
+        response.raise_for_status()
+        data = response.json()
+        return {
+            "ip": data.get("ip"),
+            "city": data.get("city"),
+            "region": data.get("region"),
+            "country": data.get("country"),
+            "loc": data.get("loc")  # latitude,longitude
+        }
+
+
+def build_weather_provider() -> WeatherProvider:
+    if WEATHER_PROVIDER == "openweathermap":
+        if not WEATHER_API_KEY:
+            raise ValueError("WEATHER_PROVIDER=openweathermap needs WEATHER_API_KEY")
+        return OpenWeatherMapProvider(WEATHER_API_KEY)
+    return MockWeatherProvider()
+
+
+weather_provider = build_weather_provider()
+location_provider = IpInfoLocationProvider()
+weather_cache = CachedFetcher(WEATHER_CACHE_TTL)
+location_cache = CachedFetcher(LOCATION_CACHE_TTL)
+
+
+async def current_weather(city: str) -> Optional[dict]:
+    return await weather_cache.get(normalize_city(city), lambda: weather_provider.current(city))
+
+
+async def current_location() -> dict:
+    return await location_cache.get("self", location_provider.current)
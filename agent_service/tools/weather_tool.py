@@ -3,18 +3,22 @@ from google.adk.tools import FunctionTool
 from pydantic import BaseModel, Field
 import logging
 from dotenv import load_dotenv
-from tools.ipinfo import get_current_location
+from tools.weather_providers import WEATHER_CACHE_TTL, current_weather, current_location, normalize_city
+from tools.memo import memoize
 import os
 from typing import Optional
 
 logging.basicConfig(level=logging.INFO)
 load_dotenv()
 
+# Phrases meaning "where I am"; resolved through the geolocation provider
+CURRENT_LOCATION_ALIASES = {"", "here", "currentlocation", "mylocation", "mycity"}
+
 class WeatherToolArgs(BaseModel):
     city: str = Field(description="The city to get the weather for.")
     unit: Optional[str] = Field(default="celsius", description="The unit of temperature (default is Celsius).")
 
-def get_weather_report(city: str, unit: str = "celsius", tool_call_id: Optional[str] = None) -> dict:
+async def get_weather_report(city: str, unit: str = "celsius", tool_call_id: Optional[str] = None) -> dict:
     """Retrieves the current weather report for a specified city.
 
     Returns:
@@ -23,27 +27,15 @@ def get_weather_report(city: str, unit: str = "celsius", tool_call_id: Optional[
               successful, or an 'error_message' if an error occurred.
     """
     logging.info(f"[get_weather_report] Called for city: {city} (unit: {unit})")
-    city_normalized = city.lower().replace(" ", "")
-
-    # Base mock data in Celsius (expanded for more Indian cities)
-    mock_weather_db_celsius = {
-        "newyork": {"condition": "sunny", "temp": 25},
-        "london": {"condition": "cloudy", "temp": 15},
-        "tokyo": {"condition": "light rain", "temp": 18},
-        "chicago": {"condition": "sunny", "temp": 25},
-        "toronto": {"condition": "partly cloudy", "temp": 30},
-        "chennai": {"condition": "rainy", "temp": 35},
-        "bengaluru": {"condition": "sunny", "temp": 30},
-        "newdelhi": {"condition": "cloudy", "temp": 40},
-        "kolkata": {"condition": "sunny", "temp": 38},
-        "mumbai": {"condition": "cloudy", "temp": 32},
-        "vijayapura": {"condition": "pleasant", "temp": 33}, # Added Vijayapura
-        "hyderabad": {"condition": "warm", "temp": 34},
-        "pune": {"condition": "clear", "temp": 31},
-    }
-
-    if city_normalized in mock_weather_db_celsius:
-        data = mock_weather_db_celsius[city_normalized]
+    try:
+        if city.lower().replace(" ", "") in CURRENT_LOCATION_ALIASES:
+            city = (await current_location()).get("city") or city
+        data = await current_weather(city)
+    except Exception as e:
+        logging.error(f"[get_weather_report] Weather lookup failed for {city}: {e}")
+        return {"status": "error", "error_message": f"Weather information for '{city}' is not available right now."}
+
+    if data:
         temp = data["temp"]
         temp_unit = "°C"
 
@@ -56,5 +48,10 @@ def get_weather_report(city: str, unit: str = "celsius", tool_call_id: Optional[
     else:
         return {"status": "error", "error_message": f"Weather information for '{city}' is not available."}
 
-# ADK function tool
-weather_tool = FunctionTool(func=get_weather_report)
+def weather_memo_key(arguments: dict) -> dict:
+    # "New York", "new york" and "newyork" are the same lookup, and so are "f" and "fahrenheit"
+    fahrenheit = (arguments["unit"] or "").lower() in ["fahrenheit", "f"]
+    return {**arguments, "city": normalize_city(arguments["city"]), "unit": "fahrenheit" if fahrenheit else "celsius"}
+
+# ADK function tool; a report is reused for as long as the weather cache would keep its data
+weather_tool = FunctionTool(func=memoize(get_weather_report, ttl=WEATHER_CACHE_TTL, normalize=weather_memo_key))
@@ -1,10 +1,12 @@
 # chat/app.py
 
+import json
 import streamlit as st
 import requests
 
-# API URL inside Docker
+# API URLs inside Docker; the plain one is the fallback when streaming is unavailable
 API_URL = "http://agent_service:5000/chat"
+STREAM_URL = "http://agent_service:5000/chat/stream"
 
 st.set_page_config(page_title="Simple Chat", page_icon="💬")
 st.title("🧠 Krishi GPT Chat")
@@ -19,6 +21,55 @@ for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):
         st.write(msg["content"])
 
+def read_events(response):
+    """Parses the Server-Sent Events sent by /chat/stream."""
+    for line in response.iter_lines(decode_unicode=True):
+        if line and line.startswith("data:"):
+            yield json.loads(line[len("data:"):].strip())
+
+def plain_reply(prompt):
+    """The whole reply in one response from /chat."""
+    response = requests.post(API_URL, json={"text": prompt}, timeout=(5, 300))
+    response.raise_for_status()
+    return response.json().get("reply", "")
+
+def stream_reply(prompt, status, placeholder):
+    """Renders the reply into `placeholder` as it arrives and writes agent/tool progress into the status box.
+
+    Only the tokens of the agent currently answering are shown (a supervisor's text before a
+    transfer is dropped), and the `final` event's text replaces whatever was streamed. When the
+    stream cannot be opened (an agent service without /chat/stream, a proxy that refuses it), the
+    reply is fetched from /chat instead.
+    """
+    reply, agent = "", None
+    try:
+        response = requests.post(STREAM_URL, json={"text": prompt}, stream=True, timeout=(5, 300))
+        response.raise_for_status()
+    except (requests.ConnectionError, requests.HTTPError) as e:
+        status.write(f"⚠️ Streaming unavailable ({e}), waiting for the full reply")
+        return plain_reply(prompt)
+    with response:
+        for message in read_events(response):
+            kind = message.get("type")
+            if kind == "token":
+                if message.get("agent") != agent:
+                    agent, reply = message.get("agent"), ""
+                reply += message["text"]
+                placeholder.markdown(reply + "▌")
+            elif kind == "transfer":
+                status.write(f"➡️ {message['from']} → {message['to']}")
+            elif kind == "tool_call":
+                status.write(f"🔧 {message['agent']} calling `{message['name']}`")
+            elif kind == "tool_result":
+                status.write(f"✅ `{message['name']}` finished")
+            elif kind == "final":
+                reply = message["text"]
+                placeholder.markdown(reply)
+            elif kind == "error":
+                reply = f"Error: {message.get('detail')}"
+                placeholder.markdown(reply)
+    return reply
+
 # Handle user input
 if prompt := st.chat_input("Type your message..."):
     st.session_state.messages.append({"role": "user", "content": prompt})
@@ -26,14 +77,14 @@ if prompt := st.chat_input("Type your message..."):
         st.write(prompt)
 
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            try:
-                response = requests.post(API_URL, json={"text": prompt})
-                response.raise_for_status()
-                reply = response.json().get("reply", "No reply received.")
-            except Exception as e:
-                reply = f"Error: {e}"
-
-            st.write(reply)
-            st.session_state.messages.append({"role": "assistant", "content": reply})
+        status = st.status("Thinking...")
+        placeholder = st.empty()
+        try:
+            reply = stream_reply(prompt, status, placeholder) or "No reply received."
+        except Exception as e:
+            reply = f"Error: {e}"
+        placeholder.markdown(reply)
+        status.update(label="Done", state="complete")
+
+        st.session_state.messages.append({"role": "assistant", "content": reply})
 
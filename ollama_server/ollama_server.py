@@ -1,31 +1,518 @@
 # ollama_server.py
-import subprocess
-import time
+"""Supervisor for `ollama serve`.
+
+Runs Ollama on an internal port and serves clients through a small HTTP proxy on the public
+one, so it can:
+
+- stream the server's logs as they come (nothing is left to fill a pipe);
+- poll the HTTP API until the server answers instead of sleeping a fixed time;
+- pull, load and pin the configured models before the public port opens, replace the keep_alive
+  clients send for them with the pin's (OLLAMA_PIN_REQUESTS), and re-pin them when an eviction
+  unloads them;
+- restart the server when it crashes or stops answering, with exponential backoff. A planned
+  restart (SIGHUP, or a hung server) first waits for requests in flight to finish; requests
+  arriving during a restart are held until the new server is warm.
+
+Stdlib only, to run on the ollama/ollama image's Python (3.10+).
+"""
+import asyncio
+import json
+import logging
 import os
+import re
+import shutil
+import signal
+import sys
+import time
+import urllib.error
+import urllib.request
 
-OLLAMA_PATH = "/usr/local/bin/ollama"
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
-def start_ollama_server():
-    """Starts the Ollama server as a subprocess."""
-    print("Starting Ollama server...")
-    
-    if not os.path.exists(OLLAMA_PATH):
-        print(f"Error: Ollama binary not found at {OLLAMA_PATH}")
-        return None
+# Configuration
+OLLAMA_PATH = os.getenv("OLLAMA_PATH", "/usr/local/bin/ollama")
+OLLAMA_LISTEN = os.getenv("OLLAMA_LISTEN", "0.0.0.0:11434")  # where clients connect (the proxy)
+OLLAMA_INTERNAL = os.getenv("OLLAMA_INTERNAL", "127.0.0.1:11436")  # where `ollama serve` itself listens
+# Models pulled if missing, loaded before the port opens and kept loaded
+OLLAMA_PRELOAD = os.getenv("OLLAMA_PRELOAD", ",".join(dict.fromkeys(
+    filter(None, (os.getenv("MODEL", "llama3.1:8b"), os.getenv("EMBEDDING_MODEL"))))))
+OLLAMA_PIN_KEEP_ALIVE = os.getenv("OLLAMA_PIN_KEEP_ALIVE", "-1")  # a negative duration never unloads
+# Rewrite the keep_alive of client requests for preloaded models to the pin's; "false" leaves it to
+# the clients (the health check still re-pins a model that was unloaded)
+OLLAMA_PIN_REQUESTS = os.getenv("OLLAMA_PIN_REQUESTS", "true").lower() == "true"
+# Context models are loaded with; must equal the agent service's OLLAMA_NUM_CTX, or its first call reloads the model
+OLLAMA_CONTEXT_LENGTH = os.getenv("OLLAMA_CONTEXT_LENGTH", os.getenv("OLLAMA_NUM_CTX", "4096"))
+OLLAMA_NUM_PARALLEL = os.getenv("OLLAMA_NUM_PARALLEL", "4")  # requests served at once per loaded model
+OLLAMA_MAX_LOADED_MODELS = os.getenv("OLLAMA_MAX_LOADED_MODELS", "2")
+OLLAMA_MAX_QUEUE = os.getenv("OLLAMA_MAX_QUEUE", "512")  # requests Ollama queues before answering 503
+OLLAMA_START_TIMEOUT = float(os.getenv("OLLAMA_START_TIMEOUT", "120"))
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+OLLAMA_HEALTH_FAILURES = int(os.getenv("OLLAMA_HEALTH_FAILURES", "3"))  # failed probes in a row before a restart
+OLLAMA_DRAIN_SECONDS = float(os.getenv("OLLAMA_DRAIN_SECONDS", "60"))
+OLLAMA_HOLD_SECONDS = float(os.getenv("OLLAMA_HOLD_SECONDS", "60"))  # a request arriving mid-restart waits this long
+RESTART_BACKOFF_INITIAL = 1.0
+RESTART_BACKOFF_MAX = 60.0
+STABLE_SECONDS = 60.0  # a server that ran this long resets the backoff
+PROBE_TIMEOUT = 5.0
+STOP_TIMEOUT = 10.0
+STATUS_PATH = b"/supervisor"
+HEAD_LIMIT = 1 << 20
+RELAY_CHUNK = 1 << 16
+# Requests that load a model and set how long it stays loaded
+MODEL_PATHS = {"/api/generate", "/api/chat", "/api/embed", "/api/embeddings"}
+CONTENT_LENGTH_PATTERN = re.compile(rb"(?im)^content-length:[^\r\n]*")
+EXPECT_PATTERN = re.compile(rb"(?im)^expect:[^\r\n]*\r\n")
+CONTINUE_RESPONSE = b"HTTP/1.1 100 Continue\r\n\r\n"
 
-    process = subprocess.Popen([OLLAMA_PATH, "serve"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    time.sleep(5)  # Give some time for the server to initialize
-    return process
+ollama_log = logging.getLogger("ollama")
 
-if __name__ == "__main__":
-    server_process = start_ollama_server()
-    if server_process:
-        print("Ollama server is running.")
+
+def split_address(address: str):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def http(method: str, path: str, body: dict = None, timeout: float = PROBE_TIMEOUT):
+    """(status, parsed JSON or None) of a request to the internal server; (0, None) when unreachable."""
+    host, port = split_address(OLLAMA_INTERNAL)
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(f"http://{host}:{port}{path}", data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            raw = response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        raw, status = e.read(), e.code
+    except (OSError, ValueError):
+        return 0, None
+    try:
+        return status, json.loads(raw) if raw else None
+    except ValueError:
+        return status, None
+
+
+# HTTP/1.1 framing, just enough to know where each request and response ends
+
+def parse_head(head: bytes):
+    lines = head.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    return lines[0], headers
+
+
+async def relay_body(headers: dict, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                     until_eof: bool = False):
+    """Copies one message body from `reader` to `writer` as it arrives (token streams stay streamed)."""
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            size_line = await reader.readuntil(b"\r\n")
+            writer.write(size_line)
+            size = int(size_line.split(b";")[0], 16)
+            if size == 0:
+                while True:  # trailers, then the empty line
+                    line = await reader.readuntil(b"\r\n")
+                    writer.write(line)
+                    if line == b"\r\n":
+                        break
+                await writer.drain()
+                return
+            writer.write(await reader.readexactly(size + 2))
+            await writer.drain()
+    elif "content-length" in headers:
+        remaining = int(headers["content-length"])
+        while remaining:
+            data = await reader.read(min(remaining, RELAY_CHUNK))
+            if not data:
+                raise asyncio.IncompleteReadError(b"", remaining)
+            writer.write(data)
+            remaining -= len(data)
+            await writer.drain()
+    elif until_eof:
+        while data := await reader.read(RELAY_CHUNK):
+            writer.write(data)
+            await writer.drain()
+
+
+async def tunnel(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Copies bytes one way until EOF (a connection upgraded with 101 Switching Protocols)."""
+    try:
+        while data := await reader.read(RELAY_CHUNK):
+            writer.write(data)
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+def simple_response(status: str, body: dict, extra_headers: str = "") -> bytes:
+    payload = json.dumps(body).encode()
+    return (f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+            f"{extra_headers}\r\n").encode() + payload
+
+
+class Supervisor:
+    def __init__(self):
+        self.models = [model.strip() for model in OLLAMA_PRELOAD.split(",") if model.strip()]
+        self.process = None
+        self.ready = asyncio.Event()  # the server is up and the models are loaded
+        self.in_flight = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.restarts = 0
+        self.generation = 0  # bumped per server process; upstream connections to an older one are dropped
+        self.started_at = None
+        self.state = "starting"
+        self._restart_requested = asyncio.Event()
+        self._stopping = False
+        self._proxy = None
+        self._log_task = None
+        self.keep_alive_rewrites = 0
+        self._rewrites_logged = set()  # (model, keep_alive) pairs already reported
+
+    # The Ollama process
+
+    def child_env(self) -> dict:
+        env = dict(os.environ)
+        env.update(OLLAMA_HOST=OLLAMA_INTERNAL, OLLAMA_NUM_PARALLEL=OLLAMA_NUM_PARALLEL,
+                   OLLAMA_MAX_LOADED_MODELS=OLLAMA_MAX_LOADED_MODELS, OLLAMA_MAX_QUEUE=OLLAMA_MAX_QUEUE,
+                   OLLAMA_CONTEXT_LENGTH=OLLAMA_CONTEXT_LENGTH)
+        return env
+
+    async def spawn(self):
+        binary = OLLAMA_PATH if os.path.exists(OLLAMA_PATH) else shutil.which("ollama")
+        if binary is None:
+            raise FileNotFoundError(f"Ollama binary not found at {OLLAMA_PATH}")
+        logging.info(f"[supervisor] Starting {binary} serve on {OLLAMA_INTERNAL} "
+                     f"(parallel {OLLAMA_NUM_PARALLEL}, max loaded models {OLLAMA_MAX_LOADED_MODELS})")
+        self.process = await asyncio.create_subprocess_exec(
+            binary, "serve", env=self.child_env(), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+        self._log_task = asyncio.create_task(self.stream_logs(self.process))
+
+    async def stream_logs(self, process):
+        # Read continuously, so a chatty server never blocks on a full pipe
+        while True:
+            try:
+                line = await process.stdout.readline()
+            except ValueError:  # a line longer than the buffer is passed on in pieces
+                line = await process.stdout.read(RELAY_CHUNK)
+            if not line:
+                return
+            ollama_log.info(f"[ollama] {line.decode(errors='replace').rstrip()}")
+
+    async def wait_until_up(self) -> bool:
+        deadline = time.monotonic() + OLLAMA_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.returncode is not None:
+                return False
+            status, _ = await asyncio.to_thread(http, "GET", "/api/version", timeout=1.0)
+            if status == 200:
+                return True
+            await asyncio.sleep(0.25)
+        return False
+
+    async def stop_process(self):
+        process = self.process
+        if process is None or process.returncode is not None:
+            return
+        process.terminate()
         try:
-            server_process.wait()
-        except KeyboardInterrupt:
-            print("Stopping Ollama server...")
-            server_process.terminate()
+            await asyncio.wait_for(process.wait(), STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logging.warning("[supervisor] Ollama did not stop in time, killing it")
+            process.kill()
+            await process.wait()
+
+    # Models
+
+    async def ensure_pulled(self):
+        _, tags = await asyncio.to_thread(http, "GET", "/api/tags")
+        present = {model.get("name") for model in (tags or {}).get("models", [])}
+        for model in self.models:
+            if model in present or f"{model}:latest" in present:
+                continue
+            logging.info(f"[supervisor] Pulling {model}...")
+            status, body = await asyncio.to_thread(http, "POST", "/api/pull", {"model": model, "stream": False}, None)
+            if status != 200:
+                logging.error(f"[supervisor] Pulling {model} failed: {status} {body}")
+
+    async def pin(self, model: str) -> bool:
+        """Loads `model` and keeps it loaded. Embedding-only models cannot generate, so they are
+        loaded through /api/embed instead."""
+        started = time.monotonic()
+        status, body = await asyncio.to_thread(http, "POST", "/api/generate",
+                                               {"model": model, "keep_alive": OLLAMA_PIN_KEEP_ALIVE,
+                                                "options": {"num_ctx": int(OLLAMA_CONTEXT_LENGTH)}}, None)
+        if status == 400 and "generate" in str(body):
+            status, body = await asyncio.to_thread(http, "POST", "/api/embed",
+                                                   {"model": model, "input": "warmup", "keep_alive": OLLAMA_PIN_KEEP_ALIVE},
+                                                   None)
+        if status != 200:
+            logging.error(f"[supervisor] Loading {model} failed: {status} {body}")
+            return False
+        logging.info(f"[supervisor] {model} loaded in {time.monotonic() - started:.1f}s (keep_alive={OLLAMA_PIN_KEEP_ALIVE})")
+        return True
+
+    def is_pinned(self, model) -> bool:
+        return isinstance(model, str) and any(
+            model in (name, f"{name}:latest") or name == f"{model}:latest" for name in self.models)
+
+    def keep_pinned(self, head: bytes, body: bytes):
+        """(head, body) of a client request, with the keep_alive of a pinned model replaced by the
+        pin's. Ollama applies every request's keep_alive (its default when there is none), so the
+        client's would otherwise give the model an expiry until the next health check re-pins it.
+        Each replaced value is logged once per model."""
+        if not OLLAMA_PIN_REQUESTS:
+            return head, body
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return head, body
+        if not isinstance(payload, dict) or not self.is_pinned(payload.get("model")) \
+                or payload.get("keep_alive") == OLLAMA_PIN_KEEP_ALIVE:
+            return head, body
+        requested = (payload["model"], str(payload.get("keep_alive", "default")))
+        if requested not in self._rewrites_logged:
+            self._rewrites_logged.add(requested)
+            logging.info(f"[supervisor] Requests for {requested[0]} ask keep_alive={requested[1]}; sending "
+                         f"{OLLAMA_PIN_KEEP_ALIVE} to keep it pinned (OLLAMA_PIN_REQUESTS=false keeps the client's)")
+        self.keep_alive_rewrites += 1
+        payload["keep_alive"] = OLLAMA_PIN_KEEP_ALIVE
+        body = json.dumps(payload).encode()
+        return CONTENT_LENGTH_PATTERN.sub(b"Content-Length: %d" % len(body), head, count=1), body
+
+    async def unpinned(self) -> list:
+        """Configured models that are not loaded, or loaded with an expiry (a request that did not
+        pass through the proxy replaced the pin). Pinned models report an expiry centuries away."""
+        status, running = await asyncio.to_thread(http, "GET", "/api/ps")
+        if status != 200:
+            return []
+        expiries = {model.get("name"): model.get("expires_at", "") for model in (running or {}).get("models", [])}
+        horizon = time.gmtime().tm_year + 10
+        missing = []
+        for model in self.models:
+            expires_at = expiries.get(model) or expiries.get(f"{model}:latest")
+            if not expires_at or not expires_at[:4].isdigit() or int(expires_at[:4]) < horizon:
+                missing.append(model)
+        return missing
+
+    # Lifecycle
+
+    async def start_server(self) -> bool:
+        await self.spawn()
+        self.generation += 1
+        if not await self.wait_until_up():
+            logging.error("[supervisor] Ollama did not come up")
+            await self.stop_process()
+            return False
+        await self.ensure_pulled()
+        for model in self.models:
+            await self.pin(model)
+        self.started_at = time.monotonic()
+        self.state = "ready"
+        self.ready.set()
+        logging.info(f"[supervisor] Ollama ready with {', '.join(self.models) or 'no preloaded models'}")
+        return True
+
+    async def drain(self):
+        """Holds new requests and waits for those in flight, up to OLLAMA_DRAIN_SECONDS."""
+        self.ready.clear()
+        self.state = "draining"
+        if self.in_flight:
+            logging.info(f"[supervisor] Draining {self.in_flight} requests in flight")
+            try:
+                await asyncio.wait_for(self.idle.wait(), OLLAMA_DRAIN_SECONDS)
+            except asyncio.TimeoutError:
+                logging.warning(f"[supervisor] {self.in_flight} requests still running after {OLLAMA_DRAIN_SECONDS:.0f}s")
+
+    async def watch(self) -> str:
+        """Returns why the running server has to be replaced: "crashed", "hung" or "requested"."""
+        failures = 0
+        exited = asyncio.create_task(self.process.wait())
+        requested = asyncio.create_task(self._restart_requested.wait())
+        try:
+            while True:
+                done, _ = await asyncio.wait({exited, requested}, timeout=OLLAMA_HEALTH_INTERVAL)
+                if exited in done:
+                    return "crashed"
+                if requested in done:
+                    self._restart_requested.clear()
+                    return "requested"
+                status, _ = await asyncio.to_thread(http, "GET", "/api/version")
+                failures = 0 if status == 200 else failures + 1
+                if failures >= OLLAMA_HEALTH_FAILURES:
+                    return "hung"
+                if status == 200:
+                    for model in await self.unpinned():
+                        logging.info(f"[supervisor] {model} is no longer pinned, loading it again")
+                        await self.pin(model)
+        finally:
+            exited.cancel()
+            requested.cancel()
+
+    async def run(self):
+        host, port = split_address(OLLAMA_LISTEN)
+        backoff = RESTART_BACKOFF_INITIAL
+        while not self._stopping:
+            try:
+                started = await self.start_server()
+            except FileNotFoundError as e:
+                logging.error(f"[supervisor] {e}")
+                return 1
+            if started:
+                if self._proxy is None and not self._stopping:
+                    # Clients only see the port once the models are warm
+                    self._proxy = await asyncio.start_server(self.handle, host, port, limit=HEAD_LIMIT)
+                    logging.info(f"[supervisor] Serving on {OLLAMA_LISTEN}")
+                reason = await self.watch()
+                if self._stopping:
+                    break
+                if time.monotonic() - self.started_at >= STABLE_SECONDS:
+                    backoff = RESTART_BACKOFF_INITIAL
+                if reason == "crashed":
+                    self.ready.clear()
+                    logging.error(f"[supervisor] Ollama exited with code {self.process.returncode}")
+                else:
+                    logging.warning(f"[supervisor] Restarting Ollama ({reason})")
+                    await self.drain()
+                    await self.stop_process()
+                    if reason == "requested":
+                        backoff = 0.0
+            self.state = "restarting"
+            self.restarts += 1
+            if backoff:
+                logging.info(f"[supervisor] Restarting in {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+            backoff = min(max(backoff * 2, RESTART_BACKOFF_INITIAL), RESTART_BACKOFF_MAX)
+        return 0
+
+    async def shutdown(self):
+        self._stopping = True
+        if self._proxy is not None:
+            self._proxy.close()
+        await self.drain()
+        self.state = "stopped"
+        await self.stop_process()
+        self._restart_requested.set()  # wakes watch()
+
+    def request_restart(self):
+        logging.info("[supervisor] Restart requested")
+        self._restart_requested.set()
+
+    def status(self) -> dict:
+        return {"state": self.state, "pid": self.process.pid if self.process else None, "restarts": self.restarts,
+                "in_flight": self.in_flight, "models": self.models, "keep_alive_rewrites": self.keep_alive_rewrites,
+                "uptime_seconds": round(time.monotonic() - self.started_at, 1) if self.started_at and self.ready.is_set() else 0}
+
+    # Proxy
+
+    def _begin(self):
+        self.in_flight += 1
+        self.idle.clear()
+
+    def _end(self):
+        self.in_flight -= 1
+        if not self.in_flight:
+            self.idle.set()
+
+    async def handle(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter):
+        upstream = None
+        try:
+            while True:
+                try:
+                    head = await client_reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                request_line, headers = parse_head(head)
+                # The proxy answers the client's 100-continue itself once it is ready to read the body;
+                # forwarding the header would leave both waiting on Ollama for it
+                expect_continue = headers.pop("expect", "").lower() == "100-continue"
+                if expect_continue:
+                    head = EXPECT_PATTERN.sub(b"", head, count=1)
+                if request_line.split(" ")[1:2] == [STATUS_PATH.decode()]:
+                    client_writer.write(simple_response("200 OK", self.status()))
+                    await client_writer.drain()
+                    continue
+                if not self.ready.is_set():
+                    try:
+                        await asyncio.wait_for(self.ready.wait(), OLLAMA_HOLD_SECONDS)
+                    except asyncio.TimeoutError:
+                        client_writer.write(simple_response("503 Service Unavailable", {"error": f"ollama is {self.state}"},
+                                                            f"Retry-After: {int(RESTART_BACKOFF_MAX)}\r\nConnection: close\r\n"))
+                        await client_writer.drain()
+                        return
+                self._begin()
+                try:
+                    if upstream is not None and upstream[2] != self.generation:
+                        upstream[1].close()
+                        upstream = None
+                    if upstream is None:
+                        upstream = (*await asyncio.open_connection(*split_address(OLLAMA_INTERNAL), limit=HEAD_LIMIT),
+                                    self.generation)
+                    upstream_reader, upstream_writer, _ = upstream
+                    if expect_continue:
+                        client_writer.write(CONTINUE_RESPONSE)
+                        await client_writer.drain()
+                    path = request_line.split(" ")[1:2]
+                    if path and path[0] in MODEL_PATHS and "content-length" in headers:
+                        body = await client_reader.readexactly(int(headers["content-length"]))
+                        upstream_writer.write(b"".join(self.keep_pinned(head, body)))
+                    else:
+                        upstream_writer.write(head)
+                        await relay_body(headers, client_reader, upstream_writer)
+                    while True:
+                        response_head = await upstream_reader.readuntil(b"\r\n\r\n")
+                        client_writer.write(response_head)
+                        status_line, response_headers = parse_head(response_head)
+                        status = int(status_line.split(" ")[1])
+                        # Interim responses (103 Early Hints...) come before the real one to the same request
+                        if status >= 200 or status == 101:
+                            break
+                        await client_writer.drain()
+                    if status == 101:
+                        await client_writer.drain()
+                        await asyncio.gather(tunnel(client_reader, upstream[1]), tunnel(upstream_reader, client_writer))
+                        return
+                    if request_line.startswith("HEAD ") or status in (204, 304):
+                        await client_writer.drain()
+                    else:
+                        await relay_body(response_headers, upstream_reader, client_writer, until_eof=True)
+                finally:
+                    self._end()
+                if "close" in (headers.get("connection", "").lower(), response_headers.get("connection", "").lower()):
+                    return
+                if "content-length" not in response_headers and "chunked" not in response_headers.get("transfer-encoding", ""):
+                    return  # the body ran until the server closed
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError, IndexError) as e:
+            logging.debug(f"[supervisor] Connection ended: {e!r}")
+        finally:
+            if upstream is not None:
+                upstream[1].close()
+            client_writer.close()
+
+
+async def main() -> int:
+    supervisor = Supervisor()
+    loop = asyncio.get_running_loop()
+    run = asyncio.create_task(supervisor.run())
+    stopping = []
+
+    def stop():
+        if not stopping:
+            stopping.append(asyncio.create_task(supervisor.shutdown()))
+
+    loop.add_signal_handler(signal.SIGTERM, stop)
+    loop.add_signal_handler(signal.SIGINT, stop)
+    loop.add_signal_handler(signal.SIGHUP, supervisor.request_restart)
+    code = await run
+    if stopping:
+        await stopping[0]
     else:
-        print("Failed to start Ollama server.")
+        await supervisor.stop_process()
+    return code
+
 
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,6 @@
+# ollama_server/tests/conftest.py
+import os
+import sys
+
+# The supervisor is a single script, imported here as a module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
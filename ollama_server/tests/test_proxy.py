@@ -0,0 +1,207 @@
+# ollama_server/tests/test_proxy.py
+import asyncio
+import json
+
+import ollama_server
+from ollama_server import Supervisor, parse_head
+
+MODEL = "llama3.1:8b"
+
+
+class FakeOllama:
+    """Keep-alive HTTP/1.1 server standing in for `ollama serve`; records every request it gets."""
+
+    def __init__(self):
+        self.requests = []
+        self.release = asyncio.Event()  # lets /slow answer and /api/stream finish
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, headers = parse_head(head)
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                path = request_line.split(" ")[1]
+                self.requests.append((path, headers, body))
+                if path == "/api/stream":
+                    writer.write(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n")
+                    for token in (b'{"token":"Hel"}\n', b'{"token":"lo"}\n'):
+                        writer.write(b"%x\r\n%s\r\n" % (len(token), token))
+                        await writer.drain()
+                        await self.release.wait()
+                    writer.write(b"0\r\n\r\n")
+                    continue
+                if path == "/slow":
+                    await self.release.wait()
+                if path == "/early":
+                    writer.write(b"HTTP/1.1 103 Early Hints\r\nLink: </style.css>\r\n\r\n")
+                payload = json.dumps({"path": path, "body": json.loads(body) if body else None}).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                             % (len(payload), payload))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def start(monkeypatch):
+    """A fake Ollama, and a supervisor proxying to it as if it had started the server."""
+    fake = FakeOllama()
+    upstream = await asyncio.start_server(fake.handle, "127.0.0.1", 0)
+    monkeypatch.setattr(ollama_server, "OLLAMA_INTERNAL", f"127.0.0.1:{upstream.sockets[0].getsockname()[1]}")
+    monkeypatch.setattr(ollama_server, "OLLAMA_PRELOAD", MODEL)
+    supervisor = Supervisor()
+    supervisor.state = "ready"
+    supervisor.ready.set()
+    proxy = await asyncio.start_server(supervisor.handle, "127.0.0.1", 0)
+    reader, writer = await asyncio.open_connection("127.0.0.1", proxy.sockets[0].getsockname()[1])
+    return fake, supervisor, (reader, writer), (upstream, proxy)
+
+
+def request(method: str, path: str, body: dict = None) -> bytes:
+    data = json.dumps(body).encode() if body is not None else b""
+    return f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+
+
+async def read_response(reader) -> tuple:
+    status_line, headers = parse_head(await reader.readuntil(b"\r\n\r\n"))
+    return int(status_line.split(" ")[1]), json.loads(await reader.readexactly(int(headers["content-length"])))
+
+
+async def stop(servers, writer):
+    writer.close()
+    for server in servers:
+        server.close()
+
+
+def test_requests_are_proxied_on_one_connection_with_the_pin_kept(monkeypatch):
+    async def main():
+        fake, supervisor, (reader, writer), servers = await start(monkeypatch)
+        writer.write(request("POST", "/api/chat", {"model": MODEL, "keep_alive": "30m", "messages": []}))
+        chat = await read_response(reader)
+        writer.write(request("GET", "/api/tags"))
+        tags = await read_response(reader)
+        await stop(servers, writer)
+        return fake, supervisor, chat, tags
+
+    fake, supervisor, chat, tags = asyncio.run(main())
+    assert chat == (200, {"path": "/api/chat", "body": {"model": MODEL, "keep_alive": "-1", "messages": []}})
+    assert int(fake.requests[0][1]["content-length"]) == len(fake.requests[0][2])
+    assert tags[0] == 200 and tags[1]["path"] == "/api/tags"
+    assert supervisor.status()["keep_alive_rewrites"] == 1 and supervisor.in_flight == 0
+
+
+def test_client_keep_alive_is_kept_when_pinning_requests_is_off(monkeypatch):
+    monkeypatch.setattr(ollama_server, "OLLAMA_PIN_REQUESTS", False)
+
+    async def main():
+        fake, supervisor, (reader, writer), servers = await start(monkeypatch)
+        writer.write(request("POST", "/api/generate", {"model": MODEL, "keep_alive": "30m"}))
+        response = await read_response(reader)
+        await stop(servers, writer)
+        return response
+
+    assert asyncio.run(main())[1]["body"]["keep_alive"] == "30m"
+
+
+def test_expect_continue_and_interim_responses_keep_the_connection(monkeypatch):
+    async def main():
+        fake, supervisor, (reader, writer), servers = await start(monkeypatch)
+        body = json.dumps({"model": MODEL, "input": "hi"}).encode()
+        writer.write(f"POST /api/embed HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n"
+                     f"Expect: 100-continue\r\n\r\n".encode())
+        interim = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 2)
+        writer.write(body)
+        embed = await read_response(reader)
+
+        writer.write(request("GET", "/early"))
+        hints = await reader.readuntil(b"\r\n\r\n")
+        early = await read_response(reader)
+        writer.write(request("GET", "/api/version"))
+        after = await read_response(reader)
+        await stop(servers, writer)
+        return fake, interim, embed, hints, early, after
+
+    fake, interim, embed, hints, early, after = asyncio.run(main())
+    assert interim == b"HTTP/1.1 100 Continue\r\n\r\n"
+    assert embed[0] == 200 and "expect" not in fake.requests[0][1]
+    assert hints.startswith(b"HTTP/1.1 103 Early Hints")
+    assert early == (200, {"path": "/early", "body": None})
+    assert after[1]["path"] == "/api/version"
+
+
+def test_token_streams_are_relayed_as_they_arrive(monkeypatch):
+    async def main():
+        fake, supervisor, (reader, writer), servers = await start(monkeypatch)
+        writer.write(request("POST", "/api/stream", {"model": "other"}))
+        await reader.readuntil(b"\r\n\r\n")
+        # The first chunk arrives while the server is still holding the rest
+        first = await asyncio.wait_for(reader.readuntil(b"\r\n"), 2) + await reader.readuntil(b"\r\n")
+        fake.release.set()
+        rest = b""
+        while not rest.endswith(b"0\r\n\r\n"):
+            rest += await reader.read(1024)
+        await stop(servers, writer)
+        return first, rest
+
+    first, rest = asyncio.run(main())
+    assert first == b'10\r\n{"token":"Hel"}\n\r\n'
+    assert rest == b'f\r\n{"token":"lo"}\n\r\n0\r\n\r\n'
+
+
+def test_requests_are_held_during_a_restart(monkeypatch):
+    async def main():
+        fake, supervisor, (reader, writer), servers = await start(monkeypatch)
+        supervisor.ready.clear()
+        supervisor.state = "restarting"
+        writer.write(request("GET", "/api/tags"))
+        response = asyncio.create_task(read_response(reader))
+        await asyncio.sleep(0.2)
+        held = not response.done() and not fake.requests
+        supervisor.ready.set()
+        result = await asyncio.wait_for(response, 2)
+        await stop(servers, writer)
+        return held, result
+
+    held, result = asyncio.run(main())
+    assert held
+    assert result[0] == 200
+
+
+def test_a_held_request_times_out_with_503(monkeypatch):
+    monkeypatch.setattr(ollama_server, "OLLAMA_HOLD_SECONDS", 0.1)
+
+    async def main():
+        fake, supervisor, (reader, writer), servers = await start(monkeypatch)
+        supervisor.ready.clear()
+        supervisor.state = "restarting"
+        writer.write(request("GET", "/api/tags"))
+        response = await read_response(reader)
+        await stop(servers, writer)
+        return response
+
+    assert asyncio.run(main()) == (503, {"error": "ollama is restarting"})
+
+
+def test_drain_waits_for_requests_in_flight(monkeypatch):
+    async def main():
+        fake, supervisor, (reader, writer), servers = await start(monkeypatch)
+        writer.write(request("GET", "/slow"))
+        response = asyncio.create_task(read_response(reader))
+        while not fake.requests:
+            await asyncio.sleep(0.01)
+        drain = asyncio.create_task(supervisor.drain())
+        await asyncio.sleep(0.2)
+        waiting = not drain.done() and supervisor.in_flight == 1 and supervisor.state == "draining"
+        fake.release.set()
+        await asyncio.wait_for(drain, 2)
+        result = await response
+        await stop(servers, writer)
+        return waiting, result, supervisor
+
+    waiting, result, supervisor = asyncio.run(main())
+    assert waiting
+    assert result[0] == 200
+    # New requests wait for the next server
+    assert supervisor.in_flight == 0 and not supervisor.ready.is_set()